@@ -48,8 +48,10 @@ class CargoModel(BaseModel):
             }
 
             if "delivery_data" in cargo_data:
-                cargo_data["delivery_data"] =  BriefDeliveryModel.from_grpc_message(cargo_data["delivery_data"])
+                cargo_data["delivery"] = BriefDeliveryModel.from_grpc_message(
+                    cargo_data.pop("delivery_data")
+                )
 
-            return CargoData(**cargo_data)
+            return cls(**cargo_data)
         except ValidationError:
             return None
\ No newline at end of file
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ValidationError
 
-from models.item_models import ItemModel
+from api.v1.models.item_models import ItemModel
 from grpc_build.payment_service_pb2 import CostRuleData
 from google.protobuf.json_format import ParseDict
 
@@ -10,4 +10,4 @@ class CostRuleModel(BaseModel):
     data: ItemModel
 
     def to_CostRuleData(self) -> CostRuleData:
-        return ParseDict(self.model_dump(), CostRuleData)
+        return ParseDict(self.model_dump(), CostRuleData())
@@ -24,4 +24,4 @@ class DecimalModel(BaseModel):
             return None
 
     def to_DecimalData(self) -> DecimalData:
-        return ParseDict(self.model_dump(), DecimalData)
+        return ParseDict(self.model_dump(), DecimalData())
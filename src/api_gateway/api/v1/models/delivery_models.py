@@ -16,7 +16,7 @@ class BriefDeliveryModel(BaseModel):
                 desc.name: value for desc, value in grpc_message.ListFields()
             }
 
-            return BriefDeliveryData(**delivery_data)
+            return cls(**delivery_data)
         except ValidationError:
             return None
 
@@ -8,5 +8,13 @@ class ItemModel(BaseModel):
     field: str
     value: str
 
+    @classmethod
+    def from_query(cls, item: str) -> "ItemModel":
+        # Query items are written as field:value
+        field, separator, value = item.partition(":")
+        if not separator or not field:
+            raise ValueError(item)
+        return cls(field=field, value=value)
+
     def to_ItemData(self) -> ItemData:
-        return ParseDict(self.model_dump(), ItemData)
+        return ParseDict(self.model_dump(), ItemData())
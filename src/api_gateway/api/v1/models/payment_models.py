@@ -2,7 +2,7 @@ from pydantic import BaseModel, ValidationError
 
 from api.v1.models.cost_rule_models import CostRuleModel
 from grpc_build.payment_service_pb2 import PaymentInfoData
-from models.decimal_models import DecimalModel
+from api.v1.models.decimal_models import DecimalModel
 from google.protobuf.json_format import MessageToDict
 
 
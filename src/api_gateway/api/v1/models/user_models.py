@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional
 from asyncpg import Record
+from google.protobuf.timestamp_pb2 import Timestamp
 from pydantic import UUID4, BaseModel, EmailStr, ValidationError
 
 from api.v1.models.group_models import GroupModel
@@ -11,6 +12,7 @@ from grpc_build.user_service_pb2 import (
     CreateUserData,
     UpdateUserData,
     BriefUserData,
+    ImportUsersResult,
 )
 
 class BriefUserModel(BaseModel):
@@ -44,14 +46,44 @@ class CreateUserModel(BaseModel):
     
     def to_CreateUserData(self) -> CreateUserData:
         res = self.model_dump(exclude_none=True)
-        res["id"] = str(res["id"])
         if "email" in res:
             res["email"] = str(res["email"])
+
+        if "birth" in res:
+            birth = Timestamp()
+            birth.FromDatetime(res["birth"])
+            res["birth"] = birth
         
         res["groups_ids"] = [str(group_id) for group_id in res["groups_ids"]]
         
         return CreateUserData(**res)
 
+class ImportUserErrorModel(BaseModel):
+    row: int
+    message: str
+
+
+class ImportUsersResultModel(BaseModel):
+    imported: int
+    errors: list[ImportUserErrorModel]
+
+    @classmethod
+    def from_grpc_message(
+        cls,
+        grpc_message: ImportUsersResult,
+        errors: list[ImportUserErrorModel] | None = None,
+    ):
+        # Rows rejected by the gateway are merged with the rows rejected by the service
+        errors = (errors or []) + [
+            ImportUserErrorModel(row=error.row, message=error.message)
+            for error in grpc_message.errors
+        ]
+        return ImportUsersResultModel(
+            imported=grpc_message.imported,
+            errors=sorted(errors, key=lambda error: error.row),
+        )
+
+
 class UpdateUserModel(BaseModel):
     username: Optional[str] = None
     password: Optional[str] = None
@@ -3,11 +3,11 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import UUID4
 
 from lib.http_tools import make_http_error
+from lib.token_verifier import TokenVerifier
 from api.v1.models.token_models import TokenModel
 from grpc_build.account_service_pb2 import (
     AuthRequest,
     AuthResponse,
-    CheckPermissionsRequest,
     CheckPermissionsResponse,
     LogoutRequest,
     LogoutResponse,
@@ -44,9 +44,9 @@ def get_refresh_token(refresh_token: str = Form(...), grant_type: str = Form(...
 # TODO Remove returning user_id from JWT token
 def check_permission(permission: str):
     async def check_permissions_wrap(access_token=Depends(oauth2_scheme)) -> str:
-        account_stub: AccountServiceStub = app.state.account_stub
-        resp: CheckPermissionsResponse = await account_stub.CheckPermissions(
-            CheckPermissionsRequest(access_token=access_token, permission=permission)
+        token_verifier: TokenVerifier = app.state.token_verifier
+        resp: CheckPermissionsResponse = await token_verifier.check_permissions(
+            access_token, permission
         )
         if resp.code == 200:
             return
@@ -94,6 +94,8 @@ async def logout(token: str = Depends(oauth2_scheme)):
     resp: LogoutResponse = await account_stub.Logout(LogoutRequest(access_token=token))
 
     if resp.code == 200:
+        token_verifier: TokenVerifier = app.state.token_verifier
+        token_verifier.revoke(token)
         return {"message": "Success logout"}
     else:
         make_http_error(resp)
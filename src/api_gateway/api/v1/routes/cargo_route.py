@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Query, status
+from fastapi import APIRouter, Body, Query, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4
 
 from api.v1.models.cargo_models import CargoModel, CreateCargoModel, UpdateCargoModel
@@ -6,8 +7,9 @@ from api.v1.routes.account_route import check_permission
 from grpc_build.cargo_service_pb2 import (
     CreateCargoRequest,
     CreateCargoResponse,
-    GetCargoRequest,
     GetCargoResponse,
+    BatchGetCargosRequest,
+    BatchGetCargosResponse,
     GetUserCargosRequest,
     GetUserCargosResponse,
     UpdateCargoRequest,
@@ -16,9 +18,10 @@ from grpc_build.cargo_service_pb2 import (
 
 from grpc_build.cargo_service_pb2_grpc import CargoServiceStub
 from lib.http_tools import make_http_error
+from lib.ndjson import ndjson_response
 from context import app
 
-from api.v1.routes.responses.cargo_responses import get_cargo_responses, create_cargo_responses, update_cargo_responses, get_user_cargos_responses
+from api.v1.routes.responses.cargo_responses import get_cargo_responses, create_cargo_responses, update_cargo_responses, get_user_cargos_responses, batch_get_cargos_responses
 
 
 router = APIRouter(prefix="/api/v1/cargo", tags=["cargo"])
@@ -49,13 +52,71 @@ async def create_cargo(cargo: CreateCargoModel):
     dependencies=[check_permission("READ_CARGO")],
     responses=get_user_cargos_responses
 )
-async def get_user_cargos(page: int = Query(...), user_id: UUID4 = Query(...)):
+async def get_user_cargos(
+    response: Response,
+    user_id: UUID4 = Query(...),
+    page: int = Query(0),
+    cursor: str | None = Query(None),
+):
     cargo_stub: CargoServiceStub = app.state.cargo_stub
-    resp: GetUserCargosResponse = cargo_stub.GetUserCargos(
-        GetUserCargosRequest(page=page, user_id=str(user_id))
+    resp: GetUserCargosResponse = await app.state.read_coalescer.do(
+        "GET /api/v1/cargo/user_cargos",
+        {"user_id": str(user_id), "page": page, "cursor": cursor},
+        "READ_CARGO",
+        lambda: cargo_stub.GetUserCargos(
+            GetUserCargosRequest(page=page, user_id=str(user_id), cursor=cursor)
+        ),
     )
     if resp.code == 200:
-        return [CargoModel.from_grpc_message(cargo_data) for cargo_data in resp.arr]
+        # The next page is requested with this cursor, its cost does not grow with depth
+        if resp.HasField("next_cursor"):
+            response.headers["X-Next-Cursor"] = resp.next_cursor
+        return [
+            CargoModel.from_grpc_message(cargo_data)
+            for cargo_data in resp.arr.cargo_data
+        ]
+    else:
+        make_http_error(resp)
+
+
+@router.get(
+    "/user_cargos/stream",
+    dependencies=[check_permission("READ_CARGO")],
+    responses=get_user_cargos_responses,
+    response_class=StreamingResponse,
+)
+async def stream_user_cargos(
+    user_id: UUID4 = Query(...), cursor: str | None = Query(None)
+):
+    cargo_stub: CargoServiceStub = app.state.cargo_stub
+    return await ndjson_response(
+        cargo_stub.StreamUserCargos(
+            GetUserCargosRequest(user_id=str(user_id), cursor=cursor)
+        ),
+        lambda resp: (
+            CargoModel.from_grpc_message(cargo_data).model_dump_json()
+            for cargo_data in resp.arr.cargo_data
+        ),
+    )
+
+
+@router.post(
+    "/batch_get",
+    response_model=list[CargoModel],
+    dependencies=[check_permission("READ_CARGO")],
+    responses=batch_get_cargos_responses,
+)
+async def batch_get_cargos(ids: list[UUID4] = Body(..., embed=True)):
+    # Found cargos in the order of ids, missing ones are left out
+    cargo_stub: CargoServiceStub = app.state.cargo_stub
+    resp: BatchGetCargosResponse = await cargo_stub.BatchGetCargos(
+        BatchGetCargosRequest(cargo_ids=[str(cargo_id) for cargo_id in ids])
+    )
+    if resp.code == 200:
+        return [
+            CargoModel.from_grpc_message(cargo_data)
+            for cargo_data in resp.arr.cargo_data
+        ]
     else:
         make_http_error(resp)
 
@@ -67,8 +128,12 @@ async def get_user_cargos(page: int = Query(...), user_id: UUID4 = Query(...)):
     responses=get_cargo_responses
 )
 async def get_cargo(cargo_id: UUID4):
-    cargo_stub: CargoServiceStub = app.state.cargo_stub
-    resp: GetCargoResponse = cargo_stub.GetCargo(GetCargoRequest(cargo_id=str(cargo_id)))
+    resp: GetCargoResponse = await app.state.read_coalescer.do(
+        "GET /api/v1/cargo/{cargo_id}",
+        {"cargo_id": str(cargo_id)},
+        "READ_CARGO",
+        lambda: app.state.cargo_loader.load(str(cargo_id)),
+    )
     if resp.code == 200:
         return CargoModel.from_grpc_message(resp.cargo_data)
     else:
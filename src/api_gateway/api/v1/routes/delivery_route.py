@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Query, status
+from fastapi import APIRouter, Body, Query, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import UUID4
 from api.v1.models.delivery_models import (
     CreateDeliveryModel,
@@ -8,9 +9,11 @@ from api.v1.models.delivery_models import (
 )
 from api.v1.routes.account_route import check_permission
 from lib.http_tools import make_http_error
+from lib.ndjson import ndjson_response
 from grpc_build.delivery_service_pb2 import (
     GetDeliveryResponse,
-    GetDeliveryRequest,
+    BatchGetDeliveriesRequest,
+    BatchGetDeliveriesResponse,
     CreateDeliveryRequest,
     CreateDeliveryResponse,
     UpdateDeliveryRequest,
@@ -24,6 +27,7 @@ from api.v1.routes.responses.delivery_responses import (
     create_delivery_responses,
     update_delivery_responses,
     search_deliveries_responses,
+    batch_get_deliveries_responses,
 )
 from grpc_build.delivery_service_pb2_grpc import DeliveryServiceStub
 from context import app
@@ -40,20 +44,88 @@ router = APIRouter(prefix="/api/v1/delivery", tags=["delivery"])
     responses=search_deliveries_responses,
 )
 async def search_deliveries(
-    page: int = Query(...),
+    response: Response,
+    page: int = Query(0),
+    cursor: str | None = Query(None),
     sender_id: UUID4 | None = Query(None),
     receiver_id: UUID4 | None = Query(None),
 ):
     delivery_stub: DeliveryServiceStub = app.state.delivery_stub
-    resp: SearchDeliveriesResponse = delivery_stub.SearchDeliveries(
-        SearchDeliveriesRequest(
-            page=page,
-            searching_delivery_data=SearchDeliveryModel(
-                sender_id=sender_id, receiver_id=receiver_id
-            ).to_SearchDeliveryData(),
-        )
+    resp: SearchDeliveriesResponse = await app.state.read_coalescer.do(
+        "GET /api/v1/delivery/search",
+        {
+            "page": page,
+            "cursor": cursor,
+            "sender_id": sender_id and str(sender_id),
+            "receiver_id": receiver_id and str(receiver_id),
+        },
+        "READ_DELIVERY",
+        lambda: delivery_stub.SearchDeliveries(
+            SearchDeliveriesRequest(
+                page=page,
+                searching_delivery_data=SearchDeliveryModel(
+                    sender_id=sender_id, receiver_id=receiver_id
+                ).to_SearchDeliveryData(),
+                cursor=cursor,
+            )
+        ),
+    )
+
+    if resp.code == 200:
+        # The next page is requested with this cursor, its cost does not grow with depth
+        if resp.HasField("next_cursor"):
+            response.headers["X-Next-Cursor"] = resp.next_cursor
+        return [
+            DeliveryModel.from_grpc_message(delivery)
+            for delivery in resp.deliveries.arr
+        ]
+    else:
+        make_http_error(resp)
+
+
+@router.get(
+    "/search/stream",
+    dependencies=[check_permission("READ_DELIVERY")],
+    responses=search_deliveries_responses,
+    response_class=StreamingResponse,
+)
+async def stream_deliveries(
+    cursor: str | None = Query(None),
+    sender_id: UUID4 | None = Query(None),
+    receiver_id: UUID4 | None = Query(None),
+):
+    delivery_stub: DeliveryServiceStub = app.state.delivery_stub
+    return await ndjson_response(
+        delivery_stub.StreamDeliveries(
+            SearchDeliveriesRequest(
+                searching_delivery_data=SearchDeliveryModel(
+                    sender_id=sender_id, receiver_id=receiver_id
+                ).to_SearchDeliveryData(),
+                cursor=cursor,
+            )
+        ),
+        lambda resp: (
+            DeliveryModel.from_grpc_message(delivery).model_dump_json(
+                exclude_unset=True
+            )
+            for delivery in resp.deliveries.arr
+        ),
     )
 
+
+@router.post(
+    "/batch_get",
+    response_model=list[DeliveryModel],
+    dependencies=[check_permission("READ_DELIVERY")],
+    response_model_exclude_unset=True,
+    responses=batch_get_deliveries_responses,
+)
+async def batch_get_deliveries(ids: list[UUID4] = Body(..., embed=True)):
+    # Found deliveries in the order of ids, missing ones are left out
+    delivery_stub: DeliveryServiceStub = app.state.delivery_stub
+    resp: BatchGetDeliveriesResponse = await delivery_stub.BatchGetDeliveries(
+        BatchGetDeliveriesRequest(delivery_ids=[str(delivery_id) for delivery_id in ids])
+    )
     if resp.code == 200:
         return [
             DeliveryModel.from_grpc_message(delivery)
@@ -71,9 +143,11 @@ async def search_deliveries(
     responses=get_delivery_responses
 )
 async def get_delivery(delivery_id: UUID4):
-    delivery_stub: DeliveryServiceStub = app.state.delivery_stub
-    resp: GetDeliveryResponse = delivery_stub.GetDelivery(
-        GetDeliveryRequest(delivery_id=str(delivery_id))
+    resp: GetDeliveryResponse = await app.state.read_coalescer.do(
+        "GET /api/v1/delivery/{delivery_id}",
+        {"delivery_id": str(delivery_id)},
+        "READ_DELIVERY",
+        lambda: app.state.delivery_loader.load(str(delivery_id)),
     )
     if resp.code == 200:
         return DeliveryModel.from_grpc_message(resp.delivery_data)
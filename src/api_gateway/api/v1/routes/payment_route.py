@@ -4,6 +4,7 @@ from api.v1.models.payment_models import PaymentInfoModel, PaymentRuleModel
 from api.v1.routes.account_route import check_permission
 from api.v1.models.item_models import ItemModel
 from lib.http_tools import make_http_error
+from lib.ndjson import ndjson_response
 from grpc_build.payment_service_pb2 import (
     AcceptPaymentRequest,
     AcceptPaymentResponse,
@@ -16,7 +17,8 @@ from grpc_build.payment_service_pb2 import (
 )
 from grpc_build.payment_service_pb2_grpc import PaymentServiceStub
 from context import app
-from fastapi import APIRouter, Body, Query, status
+from fastapi import APIRouter, Body, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 
 from api.v1.routes.responses.payment_responses import (
     make_payment_responses,
@@ -28,6 +30,16 @@ from api.v1.routes.responses.payment_responses import (
 router = APIRouter(prefix="/api/v1/payment", tags=["payment"])
 
 
+def parse_search_items(search_items: list[str]) -> list[ItemModel]:
+    try:
+        return [ItemModel.from_query(search_item) for search_item in search_items]
+    except ValueError as ex:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Search item must be field:value, got {ex.args[0]}",
+        )
+
+
 @router.get(
     "/",
     response_model=PaymentInfoModel,
@@ -65,21 +77,56 @@ async def accept_payment(body=Body(...)):
     responses=search_payments_responses,
 )
 async def search_payments(
-    page: int = Query(...), search_items: list[ItemModel] = Query(...)
+    response: Response,
+    search_items: list[str] = Query(...),
+    page: int = Query(0),
+    cursor: str | None = Query(None),
 ):
     payment_stub: PaymentServiceStub = app.state.payment_stub
     resp: SearchPaymentsResponse = await payment_stub.SearchPayments(
         SearchPaymentsRequest(
             page=page,
-            search_strings=[search_item.to_ItemData() for search_item in search_items],
+            search_strings=[
+                search_item.to_ItemData()
+                for search_item in parse_search_items(search_items)
+            ],
+            cursor=cursor,
         )
     )
     if resp.code == 200:
-        return [json.loads(payment) for payment in resp.payments]
+        # The next page is requested with this cursor, its cost does not grow with depth
+        if resp.HasField("next_cursor"):
+            response.headers["X-Next-Cursor"] = resp.next_cursor
+        return [json.loads(payment) for payment in resp.payments.arr]
     else:
         make_http_error(resp)
 
 
+@router.get(
+    "/search/stream",
+    dependencies=[check_permission("READ_PAYMENT")],
+    responses=search_payments_responses,
+    response_class=StreamingResponse,
+)
+async def stream_payments(
+    search_items: list[str] = Query(...), cursor: str | None = Query(None)
+):
+    payment_stub: PaymentServiceStub = app.state.payment_stub
+    # Receipts are already JSON documents and are written as they are
+    return await ndjson_response(
+        payment_stub.StreamPayments(
+            SearchPaymentsRequest(
+                search_strings=[
+                    search_item.to_ItemData()
+                    for search_item in parse_search_items(search_items)
+                ],
+                cursor=cursor,
+            )
+        ),
+        lambda resp: resp.payments.arr,
+    )
+
+
 @router.post(
     "/rule",
     dependencies=[check_permission("CREATE_PAYMENT_RULE")],
@@ -91,7 +138,7 @@ async def add_payment_rule(payment_rule: PaymentRuleModel):
 
     resp: AddPaymentRuleResponse = await payment_stub.AddPaymentRule(
         AddPaymentRuleRequest(
-            payment_rule.cost.to_DecimalData(),
+            cost=payment_rule.cost.to_DecimalData(),
             cost_rules=[rule.to_CostRuleData() for rule in payment_rule.cost_rules],
         )
     )
@@ -1,5 +1,6 @@
 from api.v1.routes.responses.responses_parts.server_responses_parts import (
     internal_error_response,
+    batch_get_too_large_response,
 )
 from api.v1.routes.responses.responses_parts.account_responses_parts import (
     check_permission_error_response,
@@ -36,3 +37,10 @@ search_deliveries_responses = {
     **check_permission_error_response,
     **check_permission_failed_response,
 }
+
+batch_get_deliveries_responses = {
+    **check_permission_error_response,
+    **check_permission_failed_response,
+    **internal_error_response,
+    **batch_get_too_large_response,
+}
@@ -3,3 +3,7 @@ from api.v1.routes.responses.responses_parts.content.error_contents import error
 internal_error_response = {
     500: {**error_content, "description": "Internal server error"}
 }
+
+batch_get_too_large_response = {
+    413: {**error_content, "description": "Batch get has too many ids"}
+}
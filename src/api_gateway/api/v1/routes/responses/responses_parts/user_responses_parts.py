@@ -13,3 +13,11 @@ user_already_exists_response = {
 user_created_response = {
     201: {**user_model_content, "description": "User successfully created"}
 }
+
+import_too_large_response = {
+    413: {**error_content, "description": "Import has too many rows"}
+}
+
+unsupported_import_format_response = {
+    415: {**error_content, "description": "Import file is not CSV or NDJSON"}
+}
@@ -1,5 +1,6 @@
 from api.v1.routes.responses.responses_parts.server_responses_parts import (
     internal_error_response,
+    batch_get_too_large_response,
 )
 from api.v1.routes.responses.responses_parts.account_responses_parts import (
     check_permission_error_response,
@@ -9,6 +10,8 @@ from api.v1.routes.responses.responses_parts.user_responses_parts import (
     user_already_exists_response,
     user_created_response,
     user_not_found_response,
+    import_too_large_response,
+    unsupported_import_format_response,
 )
 
 get_user_responses = {
@@ -61,3 +64,24 @@ search_users_responses = {
     **check_permission_failed_response,
     **internal_error_response,
 }
+
+suggest_usernames_responses = {
+    **check_permission_error_response,
+    **check_permission_failed_response,
+    **internal_error_response,
+}
+
+import_users_responses = {
+    **check_permission_error_response,
+    **check_permission_failed_response,
+    **internal_error_response,
+    **import_too_large_response,
+    **unsupported_import_format_response,
+}
+
+batch_get_users_responses = {
+    **check_permission_error_response,
+    **check_permission_failed_response,
+    **internal_error_response,
+    **batch_get_too_large_response,
+}
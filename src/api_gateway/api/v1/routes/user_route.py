@@ -1,13 +1,32 @@
-from fastapi import APIRouter, Body, Depends, Query, status
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import UUID4
+from starlette.concurrency import iterate_in_threadpool
 from lib.http_tools import make_http_error
+from lib.ndjson import ndjson_response
+from lib.user_import import read_csv_users, read_ndjson_users
 from api.v1.routes.account_route import check_permission
-from api.v1.models.user_models import BriefUserModel, CreateUserModel, UpdateUserModel, UserModel
+from api.v1.models.user_models import (
+    BriefUserModel,
+    CreateUserModel,
+    ImportUserErrorModel,
+    ImportUsersResultModel,
+    UpdateUserModel,
+    UserModel,
+)
 
 from grpc_build.user_service_pb2_grpc import UserServiceStub
 from grpc_build.user_service_pb2 import (
-    GetUserDataRequest,
     GetUserDataResponse,
     CreateUserRequest,
     CreateUserResponse,
@@ -22,6 +41,13 @@ from grpc_build.user_service_pb2 import (
     GetUserDataByUsernameRequest,
     SearchUsersRequest,
     SearchUsersResponse,
+    SuggestUsernamesRequest,
+    SuggestUsernamesResponse,
+    ImportUsersRequest,
+    ImportUsersResponse,
+    ImportUserRow,
+    BatchGetUsersRequest,
+    BatchGetUsersResponse,
 )
 
 from api.v1.routes.responses.user_responses import (
@@ -32,6 +58,9 @@ from api.v1.routes.responses.user_responses import (
     create_user_responses,
     search_users_responses,
     find_user_responses,
+    suggest_usernames_responses,
+    import_users_responses,
+    batch_get_users_responses,
 )
 
 
@@ -40,28 +69,34 @@ from context import app
 
 router = APIRouter(prefix="/api/v1/user", tags=["user"])
 
+# Rows sent to the user service in one message of the import stream
+IMPORT_USERS_BATCH_SIZE = 500
 
-# GET /users/{user_id} - Получить пользователя по ID (требует аутентификации)
+
+# GET /users/suggest_usernames - Подсказки username по префиксу (требует аутентификации)
+# Declared before /{user_id}, otherwise the path is matched as a user id
 @router.get(
-    "/{user_id}",
-    response_model=UserModel,
+    "/suggest_usernames",
+    response_model=list[str],
     dependencies=[check_permission("READ_USER")],
-    response_model_exclude_unset=True,
-    responses=get_user_responses,
+    responses=suggest_usernames_responses,
 )
-async def get_user(user_id: UUID4):
+async def suggest_usernames(
+    prefix: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)
+):
     user_stub: UserServiceStub = app.state.user_stub
-    resp: GetUserDataResponse = await user_stub.GetUserData(
-        GetUserDataRequest(user_id=str(user_id))
+    resp: SuggestUsernamesResponse = await user_stub.SuggestUsernames(
+        SuggestUsernamesRequest(prefix=prefix, limit=limit)
     )
 
     if resp.code == 200:
-        return UserModel.from_grpc_message(resp.user_data)
+        return list(resp.usernames.arr)
     else:
         make_http_error(resp)
 
 
 # GET /users/find_user - Получить пользователя по username (требует аутентификации)
+# Declared before /{user_id}, otherwise the path is matched as a user id
 @router.get(
     "/find_user",
     response_model=UserModel,
@@ -71,8 +106,35 @@ async def get_user(user_id: UUID4):
 )
 async def get_user_by_username(username: str = Query(...)):
     user_stub: UserServiceStub = app.state.user_stub
-    resp: GetUserDataByUsernameResponse = await user_stub.GetUserDataByUsername(
-        GetUserDataByUsernameRequest(username=username)
+    resp: GetUserDataByUsernameResponse = await app.state.read_coalescer.do(
+        "GET /api/v1/user/find_user",
+        {"username": username},
+        "READ_USER",
+        lambda: user_stub.GetUserDataByUsername(
+            GetUserDataByUsernameRequest(username=username)
+        ),
+    )
+
+    if resp.code == 200:
+        return UserModel.from_grpc_message(resp.user_data)
+    else:
+        make_http_error(resp)
+
+
+# GET /users/{user_id} - Получить пользователя по ID (требует аутентификации)
+@router.get(
+    "/{user_id}",
+    response_model=UserModel,
+    dependencies=[check_permission("READ_USER")],
+    response_model_exclude_unset=True,
+    responses=get_user_responses,
+)
+async def get_user(user_id: UUID4):
+    resp: GetUserDataResponse = await app.state.read_coalescer.do(
+        "GET /api/v1/user/{user_id}",
+        {"user_id": str(user_id)},
+        "READ_USER",
+        lambda: app.state.user_loader.load(str(user_id)),
     )
 
     if resp.code == 200:
@@ -90,21 +152,75 @@ async def get_user_by_username(username: str = Query(...)):
     responses=search_users_responses,
 )
 async def search_users_by_first_name_last_name(
+    response: Response,
     first_name: str | None = Body(None),
     second_name: str | None = Body(None),
-    page: int = Body(...),
+    page: int = Body(0),
+    cursor: str | None = Body(None),
 ):
     user_stub: UserServiceStub = app.state.user_stub
     resp: SearchUsersResponse = await user_stub.SearchUsers(
-        SearchUsersRequest(page=page, first_name=first_name, second_name=second_name)
+        SearchUsersRequest(
+            page=page, first_name=first_name, second_name=second_name, cursor=cursor
+        )
     )
 
     if resp.code == 200:
+        # Results are ordered by relevance, the next page is requested with this cursor
+        if resp.HasField("next_cursor"):
+            response.headers["X-Next-Cursor"] = resp.next_cursor
         return [BriefUserModel.from_grpc_message(user) for user in resp.users.arr]
     else:
         make_http_error(resp)
 
 
+# POST /users/search_users/stream - Все найденные пользователи в формате NDJSON (требует аутентификации)
+@router.post(
+    "/search_users/stream",
+    dependencies=[check_permission("READ_USER")],
+    responses=search_users_responses,
+    response_class=StreamingResponse,
+)
+async def stream_users_by_first_name_last_name(
+    first_name: str | None = Body(None),
+    second_name: str | None = Body(None),
+    cursor: str | None = Body(None),
+):
+    user_stub: UserServiceStub = app.state.user_stub
+    return await ndjson_response(
+        user_stub.StreamUsers(
+            SearchUsersRequest(
+                first_name=first_name, second_name=second_name, cursor=cursor
+            )
+        ),
+        lambda resp: (
+            BriefUserModel.from_grpc_message(user).model_dump_json(exclude_unset=True)
+            for user in resp.users.arr
+        ),
+    )
+
+
+# POST /users/batch_get - Получить пользователей по списку ID (требует аутентификации)
+@router.post(
+    "/batch_get",
+    response_model=list[UserModel],
+    dependencies=[check_permission("READ_USER")],
+    response_model_exclude_unset=True,
+    responses=batch_get_users_responses,
+)
+async def batch_get_users(ids: list[UUID4] = Body(..., embed=True)):
+    # Found users in the order of ids, missing or deactivated ones are left out
+    user_stub: UserServiceStub = app.state.user_stub
+    resp: BatchGetUsersResponse = await user_stub.BatchGetUsers(
+        BatchGetUsersRequest(user_ids=[str(user_id) for user_id in ids])
+    )
+
+    if resp.code == 200:
+        return [UserModel.from_grpc_message(user) for user in resp.users.arr]
+    else:
+        make_http_error(resp)
+
+
 # POST /users - Создать нового пользователя (требует аутентификации)
 @router.post(
     "/",
@@ -129,6 +245,59 @@ async def create_user(user: CreateUserModel):
         make_http_error(resp)
 
 
+# POST /users/import - Создать пользователей из CSV или NDJSON файла (требует аутентификации)
+@router.post(
+    "/import",
+    response_model=ImportUsersResultModel,
+    dependencies=[check_permission("CREATE_USER")],
+    responses=import_users_responses,
+)
+async def import_users(file: UploadFile = File(...)):
+    filename = file.filename or ""
+    if filename.endswith(".csv") or file.content_type == "text/csv":
+        read_users = read_csv_users
+    elif filename.endswith((".ndjson", ".jsonl")) or file.content_type in (
+        "application/x-ndjson",
+        "application/jsonl",
+    ):
+        read_users = read_ndjson_users
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Import file must be CSV or NDJSON",
+        )
+
+    gateway_errors = []
+
+    def read_batches():
+        rows = []
+        for row, user, error in read_users(file.file):
+            if user is None:
+                gateway_errors.append(ImportUserErrorModel(row=row, message=error))
+                continue
+
+            rows.append(ImportUserRow(row=row, user_data=user.to_CreateUserData()))
+            if len(rows) == IMPORT_USERS_BATCH_SIZE:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+    # Rows are streamed to the service in batches while the file is read,
+    # reading and validation run in a worker thread to keep the event loop free
+    async def import_requests():
+        async for rows in iterate_in_threadpool(read_batches()):
+            yield ImportUsersRequest(rows=rows)
+
+    user_stub: UserServiceStub = app.state.user_stub
+    resp: ImportUsersResponse = await user_stub.ImportUsers(import_requests())
+
+    if resp.code == 200:
+        return ImportUsersResultModel.from_grpc_message(resp.result, gateway_errors)
+    else:
+        make_http_error(resp)
+
+
 @router.put(
     "/{user_id}",
     response_model=UserModel,
@@ -160,7 +329,7 @@ async def delete_user(user_id: UUID4):
     user_stub: UserServiceStub = app.state.user_stub
 
     resp: DeactivateUserResponse = await user_stub.DeactivateUser(
-        DeactivateUserRequest(user_id=user_id)
+        DeactivateUserRequest(user_id=str(user_id))
     )
 
     if resp.code == 200:
@@ -178,8 +347,8 @@ async def delete_user(user_id: UUID4):
 async def activate_user(user_id: UUID4):
     user_stub: UserServiceStub = app.state.user_stub
 
-    resp: ReactivateUserRequest = await user_stub.DeactivateUser(
-        ReactivateUserResponse(user_id=user_id)
+    resp: ReactivateUserResponse = await user_stub.ReactivateUser(
+        ReactivateUserRequest(user_id=str(user_id))
     )
 
     if resp.code == 200:
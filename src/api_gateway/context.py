@@ -7,6 +7,10 @@ from grpc_build.delivery_service_pb2_grpc import DeliveryServiceStub
 from grpc_build.cargo_service_pb2_grpc import CargoServiceStub
 from grpc_build.user_service_pb2_grpc import UserServiceStub
 from grpc_build.account_service_pb2_grpc import AccountServiceStub
+from lib.token_verifier import TokenVerifier
+from lib.permission_cache import PermissionCache
+from lib.batch_loader import cargo_loader, delivery_loader, user_loader
+from lib.read_coalescer import ReadCoalescer
 
 # TODO Add secure channel
 async def get_channel(service_name: str, default_port: int):
@@ -24,6 +28,17 @@ async def disconnect_from_grpc_account(app: FastAPI):
     await app.state.account_grpc_channel.close()
 
 
+async def connect_token_verifier(app: FastAPI):
+    app.state.token_verifier = TokenVerifier(
+        app.state.account_stub, PermissionCache()
+    )
+    await app.state.token_verifier.connect()
+
+
+async def disconnect_token_verifier(app: FastAPI):
+    await app.state.token_verifier.disconnect()
+
+
 async def connect_to_grpc_user(app: FastAPI):
     app.state.user_grpc_channel = await get_channel("USER", 50052)
     app.state.user_stub = UserServiceStub(app.state.user_grpc_channel)
@@ -58,18 +73,47 @@ async def connect_to_grpc_payment(app: FastAPI):
 async def disconnect_from_grpc_payment(app: FastAPI):
     await app.state.payment_grpc_channel.close()
 
+
+async def connect_batch_loaders(app: FastAPI):
+    # Concurrent single id lookups of handlers share one batch get per window
+    app.state.user_loader = user_loader(app.state.user_stub)
+    app.state.cargo_loader = cargo_loader(app.state.cargo_stub)
+    app.state.delivery_loader = delivery_loader(app.state.delivery_stub)
+
+
+async def disconnect_batch_loaders(app: FastAPI):
+    await app.state.delivery_loader.disconnect()
+    await app.state.cargo_loader.disconnect()
+    await app.state.user_loader.disconnect()
+
+
+async def connect_read_coalescer(app: FastAPI):
+    app.state.read_coalescer = ReadCoalescer()
+    await app.state.read_coalescer.connect()
+
+
+async def disconnect_read_coalescer(app: FastAPI):
+    await app.state.read_coalescer.disconnect()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await connect_to_grpc_account(app)
+    await connect_token_verifier(app)
     await connect_to_grpc_user(app)
     await connect_to_grpc_cargo(app)
     await connect_to_grpc_delivery(app)
     await connect_to_grpc_payment(app)
+    await connect_batch_loaders(app)
+    await connect_read_coalescer(app)
     yield
+    await disconnect_read_coalescer(app)
+    await disconnect_batch_loaders(app)
     await disconnect_from_grpc_payment(app)
     await disconnect_from_grpc_delivery(app)
     await disconnect_from_grpc_cargo(app)
     await disconnect_from_grpc_user(app)
+    await disconnect_token_verifier(app)
     await disconnect_from_grpc_account(app)
 
 
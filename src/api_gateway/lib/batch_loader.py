@@ -0,0 +1,164 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from grpc_build.user_service_pb2 import (
+    BatchGetUsersRequest,
+    BatchGetUsersResponse,
+    GetUserDataResponse,
+)
+from grpc_build.user_service_pb2_grpc import UserServiceStub
+from grpc_build.cargo_service_pb2 import (
+    BatchGetCargosRequest,
+    BatchGetCargosResponse,
+    GetCargoResponse,
+)
+from grpc_build.cargo_service_pb2_grpc import CargoServiceStub
+from grpc_build.delivery_service_pb2 import (
+    BatchGetDeliveriesRequest,
+    BatchGetDeliveriesResponse,
+    GetDeliveryResponse,
+)
+from grpc_build.delivery_service_pb2_grpc import DeliveryServiceStub
+
+
+# Single id lookups arriving within the window are sent as one batch get,
+# a batch is sent at once when it reaches the max size
+BATCH_LOADER_WINDOW = float(os.environ.get("BATCH_LOADER_WINDOW", "0.002"))
+BATCH_LOADER_MAX_SIZE = int(os.environ.get("BATCH_LOADER_MAX_SIZE", "100"))
+
+
+T = TypeVar("T")
+
+
+class BatchLoader(Generic[T]):
+    def __init__(
+        self,
+        load_batch: Callable[[list[str]], Awaitable[dict[str, T]]],
+        window: float = BATCH_LOADER_WINDOW,
+        max_size: int = BATCH_LOADER_MAX_SIZE,
+    ):
+        self._load_batch = load_batch
+        self._window = window
+        self._max_size = max_size
+
+        # Keys of the batch being collected, the same key is loaded once per batch
+        self._pending: dict[str, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: str) -> T:
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self._max_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(
+                    self._window, self._dispatch
+                )
+        # The future is shared, a cancelled caller must not cancel it for the others
+        return await asyncio.shield(future)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        pending, self._pending = self._pending, {}
+        task = asyncio.create_task(self._run(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending: dict[str, asyncio.Future]):
+        try:
+            results = await self._load_batch(list(pending))
+        except Exception as ex:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ex)
+            return
+
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(results[key])
+
+    async def disconnect(self):
+        if self._pending:
+            self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+# Loaders answer with the response of the single get RPC, so routes keep their checks
+
+
+def user_loader(user_stub: UserServiceStub) -> BatchLoader[GetUserDataResponse]:
+    async def load_batch(user_ids: list[str]) -> dict[str, GetUserDataResponse]:
+        resp: BatchGetUsersResponse = await user_stub.BatchGetUsers(
+            BatchGetUsersRequest(user_ids=user_ids)
+        )
+        if resp.code != 200:
+            failed = GetUserDataResponse(code=resp.code, message=resp.message)
+            return {user_id: failed for user_id in user_ids}
+
+        found = {user.id: user for user in resp.users.arr}
+        return {
+            user_id: (
+                GetUserDataResponse(code=200, user_data=found[user_id])
+                if user_id in found
+                else GetUserDataResponse(
+                    code=404, message="User not found or deactivated"
+                )
+            )
+            for user_id in user_ids
+        }
+
+    return BatchLoader(load_batch)
+
+
+def cargo_loader(cargo_stub: CargoServiceStub) -> BatchLoader[GetCargoResponse]:
+    async def load_batch(cargo_ids: list[str]) -> dict[str, GetCargoResponse]:
+        resp: BatchGetCargosResponse = await cargo_stub.BatchGetCargos(
+            BatchGetCargosRequest(cargo_ids=cargo_ids)
+        )
+        if resp.code != 200:
+            failed = GetCargoResponse(code=resp.code, message=resp.message)
+            return {cargo_id: failed for cargo_id in cargo_ids}
+
+        found = {cargo.id: cargo for cargo in resp.arr.cargo_data}
+        return {
+            cargo_id: (
+                GetCargoResponse(code=200, cargo_data=found[cargo_id])
+                if cargo_id in found
+                else GetCargoResponse(code=404, message="Cargo not found")
+            )
+            for cargo_id in cargo_ids
+        }
+
+    return BatchLoader(load_batch)
+
+
+def delivery_loader(
+    delivery_stub: DeliveryServiceStub,
+) -> BatchLoader[GetDeliveryResponse]:
+    async def load_batch(delivery_ids: list[str]) -> dict[str, GetDeliveryResponse]:
+        resp: BatchGetDeliveriesResponse = await delivery_stub.BatchGetDeliveries(
+            BatchGetDeliveriesRequest(delivery_ids=delivery_ids)
+        )
+        if resp.code != 200:
+            failed = GetDeliveryResponse(code=resp.code, message=resp.message)
+            return {delivery_id: failed for delivery_id in delivery_ids}
+
+        found = {delivery.id: delivery for delivery in resp.deliveries.arr}
+        return {
+            delivery_id: (
+                GetDeliveryResponse(code=200, delivery_data=found[delivery_id])
+                if delivery_id in found
+                else GetDeliveryResponse(code=404, message="Delivery not found")
+            )
+            for delivery_id in delivery_ids
+        }
+
+    return BatchLoader(load_batch)
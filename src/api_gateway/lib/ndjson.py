@@ -0,0 +1,38 @@
+from typing import Callable, Iterable
+
+import grpc
+from fastapi.responses import StreamingResponse
+
+from lib.http_tools import make_http_error
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class StreamInterruptedError(Exception):
+    pass
+
+
+async def ndjson_response(
+    call: grpc.aio.UnaryStreamCall, to_lines: Callable[[object], Iterable[str]]
+) -> StreamingResponse:
+    # The first message decides the status code, rows are written as they arrive,
+    # one JSON document per line, so no whole result is held by the gateway
+    first = await call.read()
+    if first is not grpc.aio.EOF and first.code != 200:
+        make_http_error(first)
+
+    async def lines():
+        try:
+            resp = first
+            while resp is not grpc.aio.EOF:
+                if resp.code != 200:
+                    # Headers are already sent, the response is cut instead
+                    raise StreamInterruptedError(resp.message)
+                for line in to_lines(resp):
+                    yield line + "\n"
+                resp = await call.read()
+        finally:
+            call.cancel()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,56 @@
+import os
+import time
+from collections import OrderedDict
+
+from grpc_build.account_service_pb2 import CheckPermissionsResponse
+
+
+PERMISSION_CACHE_SIZE = int(os.environ.get("PERMISSION_CACHE_SIZE", "10000"))
+PERMISSION_CACHE_TTL = float(os.environ.get("PERMISSION_CACHE_TTL", "60"))
+
+
+class PermissionCache:
+    def __init__(
+        self, max_size: int = PERMISSION_CACHE_SIZE, max_ttl: float = PERMISSION_CACHE_TTL
+    ):
+        self._max_size = max_size
+        self._max_ttl = max_ttl
+        # token hash -> (expiration time, permission -> decision)
+        self._entries: OrderedDict[
+            str, tuple[float, dict[str, CheckPermissionsResponse]]
+        ] = OrderedDict()
+
+    def get(self, token_hash: str, permission: str) -> CheckPermissionsResponse | None:
+        entry = self._entries.get(token_hash)
+        if entry is None:
+            return None
+
+        expires_at, decisions = entry
+        if expires_at <= time.time():
+            del self._entries[token_hash]
+            return None
+
+        self._entries.move_to_end(token_hash)
+        return decisions.get(permission)
+
+    def put(
+        self,
+        token_hash: str,
+        permission: str,
+        decision: CheckPermissionsResponse,
+        token_expires_at: float,
+    ):
+        entry = self._entries.get(token_hash)
+        if entry is None:
+            entry = (min(token_expires_at, time.time() + self._max_ttl), {})
+            self._entries[token_hash] = entry
+        else:
+            self._entries.move_to_end(token_hash)
+
+        entry[1][permission] = decision
+
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token_hash: str):
+        self._entries.pop(token_hash, None)
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable
+
+from common.concurrency.single_flight import SingleFlight
+
+
+# Coalescing stats are printed and reset with this interval, 0 disables them
+READ_COALESCING_STATS_INTERVAL = float(
+    os.environ.get("READ_COALESCING_STATS_INTERVAL", "60")
+)
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.upstream_calls = 0
+
+
+class ReadCoalescer:
+    # Identical reads in flight at the same time share one upstream call,
+    # nothing is kept after the call completes
+    def __init__(self, stats_interval: float = READ_COALESCING_STATS_INTERVAL):
+        self._single_flight = SingleFlight()
+        self._stats_interval = stats_interval
+        self._stats: dict[str, RouteStats] = {}
+        self._stats_task: asyncio.Task | None = None
+
+    async def connect(self):
+        if self._stats_interval > 0:
+            self._stats_task = asyncio.create_task(self._print_stats())
+
+    async def disconnect(self):
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            try:
+                await self._stats_task
+            except asyncio.CancelledError:
+                pass
+
+    async def do(
+        self,
+        route: str,
+        params: dict,
+        permission: str,
+        func: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        # Responses of a route depend only on its params once the permission passed,
+        # so callers checked for the same permission can share them
+        key = json.dumps([route, permission, params], sort_keys=True, default=str)
+
+        stats = self._stats.get(route)
+        if stats is None:
+            stats = self._stats[route] = RouteStats()
+        stats.requests += 1
+
+        async def call():
+            # Runs only for the caller starting the flight
+            stats.upstream_calls += 1
+            return await func()
+
+        return await self._single_flight.do(key, call)
+
+    def stats(self) -> dict:
+        return {
+            route: {
+                "requests": stats.requests,
+                "upstream_calls": stats.upstream_calls,
+                "coalescing_ratio": (
+                    1 - stats.upstream_calls / stats.requests if stats.requests else 0.0
+                ),
+            }
+            for route, stats in self._stats.items()
+        }
+
+    def reset_stats(self):
+        self._stats = {}
+
+    async def _print_stats(self):
+        while True:
+            await asyncio.sleep(self._stats_interval)
+            stats = self.stats()
+            self.reset_stats()
+            for route, route_stats in stats.items():
+                print(f"Read coalescing : {route} {json.dumps(route_stats)}")
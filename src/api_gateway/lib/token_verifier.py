@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import grpc
+from jose import JWTError, jwt
+
+from grpc_build.account_service_pb2 import (
+    CheckPermissionsResponse,
+    GetJwksRequest,
+    GetJwksResponse,
+    GetPermissionRegistryRequest,
+    GetPermissionRegistryResponse,
+    GetRevokedTokensRequest,
+    GetRevokedTokensResponse,
+)
+from grpc_build.account_service_pb2_grpc import AccountServiceStub
+from lib.permission_cache import PermissionCache
+from common.permissions.permission_registry import PermissionRegistry
+
+
+ALGORITHM = "RS256"
+# Refresh tokens carry the same claims, only the type tells them apart
+ACCESS_TOKEN_TYPE = "access"
+
+JWKS_REFRESH_INTERVAL = float(os.environ.get("JWKS_REFRESH_INTERVAL", "300"))
+REVOCATION_SYNC_INTERVAL = float(os.environ.get("REVOCATION_SYNC_INTERVAL", "1"))
+
+# Minimal pause between key set or registry reloads caused by tokens with unknown kid or pv
+JWKS_MIN_RELOAD_INTERVAL = 10
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        account_stub: AccountServiceStub,
+        permission_cache: PermissionCache | None = None,
+        jwks_refresh_interval: float = JWKS_REFRESH_INTERVAL,
+        revocation_sync_interval: float = REVOCATION_SYNC_INTERVAL,
+    ):
+        self._account_stub = account_stub
+        self._permission_cache = permission_cache
+        self._jwks_refresh_interval = jwks_refresh_interval
+        self._revocation_sync_interval = revocation_sync_interval
+
+        self._keys: dict[str, dict] = {}
+        self._keys_loaded_at = 0.0
+
+        # Older registries stay, tokens issued with them are valid until expiration
+        self._permission_registries: dict[str, PermissionRegistry] = {}
+        self._permission_registry_loaded_at = 0.0
+
+        self._revoked_tokens: dict[str, int] = {}
+        self._revocation_cursor = ""
+
+        self._sync_task: asyncio.Task | None = None
+
+    async def connect(self):
+        await self.load_keys()
+        await self.load_permission_registry()
+        await self.sync_revoked_tokens()
+        self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def disconnect(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def load_keys(self):
+        resp: GetJwksResponse = await self._account_stub.GetJwks(GetJwksRequest())
+        if resp.code == 200:
+            self._keys = {key["kid"]: key for key in json.loads(resp.jwks)["keys"]}
+        self._keys_loaded_at = time.monotonic()
+
+    async def load_permission_registry(self):
+        resp: GetPermissionRegistryResponse = (
+            await self._account_stub.GetPermissionRegistry(
+                GetPermissionRegistryRequest()
+            )
+        )
+        if resp.code == 200:
+            self._permission_registries[resp.registry.version] = PermissionRegistry(
+                resp.registry.names
+            )
+        self._permission_registry_loaded_at = time.monotonic()
+
+    async def sync_revoked_tokens(self):
+        # Pages are read until the feed is drained, so a burst of revocations
+        # does not leave the gateway behind
+        while True:
+            resp: GetRevokedTokensResponse = await self._account_stub.GetRevokedTokens(
+                GetRevokedTokensRequest(cursor=self._revocation_cursor)
+            )
+            if resp.code != 200:
+                print(f"Can not sync revoked tokens : {resp.message}")
+                return
+
+            for revoked_token in resp.tokens:
+                self._revoke(revoked_token.token_hash, revoked_token.expires_at)
+            self._revocation_cursor = resp.cursor
+
+            if not resp.has_more:
+                return
+
+    def _revoke(self, revoked_hash: str, expires_at: int):
+        self._revoked_tokens[revoked_hash] = expires_at
+        if self._permission_cache is not None:
+            self._permission_cache.invalidate(revoked_hash)
+
+    def revoke(self, access_token: str):
+        try:
+            expires_at = jwt.get_unverified_claims(access_token)["exp"]
+        except (JWTError, KeyError):
+            return
+        self._revoke(token_hash(access_token), expires_at)
+
+    def _remove_expired_revoked_tokens(self):
+        now = time.time()
+        self._revoked_tokens = {
+            revoked_hash: expires_at
+            for revoked_hash, expires_at in self._revoked_tokens.items()
+            if expires_at > now
+        }
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self._revocation_sync_interval)
+            try:
+                await self.sync_revoked_tokens()
+
+                if time.monotonic() - self._keys_loaded_at >= self._jwks_refresh_interval:
+                    await self.load_keys()
+                    await self.load_permission_registry()
+                    self._remove_expired_revoked_tokens()
+            except grpc.aio.AioRpcError as ex:
+                print(f"Can not sync tokens with account service : {ex}")
+            except Exception as ex:
+                # The task must survive, a stopped sync leaves revoked tokens accepted
+                print(f"Error : {ex}, args : {ex.args}")
+
+    async def check_permissions(
+        self, access_token: str, permission: str
+    ) -> CheckPermissionsResponse:
+        access_token_hash = token_hash(access_token)
+
+        if access_token_hash in self._revoked_tokens:
+            return CheckPermissionsResponse(code=403, message="Access token in blacklist")
+
+        if self._permission_cache is not None:
+            decision = self._permission_cache.get(access_token_hash, permission)
+            if decision is not None:
+                return decision
+
+        try:
+            key_id = jwt.get_unverified_header(access_token).get("kid")
+
+            if (
+                key_id not in self._keys
+                and time.monotonic() - self._keys_loaded_at >= JWKS_MIN_RELOAD_INTERVAL
+            ):
+                await self.load_keys()
+
+            key = self._keys.get(key_id)
+            if key is None:
+                return CheckPermissionsResponse(code=401, message="Invalid access token")
+
+            payload = jwt.decode(access_token, key, algorithms=[ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            return CheckPermissionsResponse(code=401, message="Access token expired")
+        except JWTError:
+            return CheckPermissionsResponse(code=401, message="Invalid access token")
+
+        if payload.get("typ") != ACCESS_TOKEN_TYPE:
+            return CheckPermissionsResponse(code=401, message="Invalid access token")
+
+        permission_registry = self._permission_registries.get(payload.get("pv"))
+        if (
+            permission_registry is None
+            and time.monotonic() - self._permission_registry_loaded_at
+            >= JWKS_MIN_RELOAD_INTERVAL
+        ):
+            await self.load_permission_registry()
+            permission_registry = self._permission_registries.get(payload.get("pv"))
+
+        if permission_registry is None:
+            return CheckPermissionsResponse(code=401, message="Outdated access token")
+
+        if permission_registry.has_permission(
+            permission_registry.decode(payload.get("perm", "")), permission
+        ):
+            decision = CheckPermissionsResponse(code=200, user_id=payload.get("sub"))
+        else:
+            decision = CheckPermissionsResponse(code=403, message="Access denied")
+
+        if self._permission_cache is not None:
+            self._permission_cache.put(
+                access_token_hash, permission, decision, payload["exp"]
+            )
+
+        return decision
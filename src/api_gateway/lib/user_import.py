@@ -0,0 +1,75 @@
+import csv
+import json
+from typing import BinaryIO, Iterator
+
+from pydantic import ValidationError
+
+from api.v1.models.user_models import CreateUserModel
+
+
+# Groups of a CSV row are written in one column
+CSV_GROUPS_SEPARATOR = ";"
+
+
+def _validation_error_message(ex: ValidationError) -> str:
+    messages = []
+    for error in ex.errors():
+        if error["loc"]:
+            messages.append(
+                f"{".".join(str(loc) for loc in error["loc"])}: {error["msg"]}"
+            )
+        else:
+            messages.append(error["msg"])
+    return "; ".join(messages)
+
+
+def _validate_user(data) -> tuple[CreateUserModel | None, str | None]:
+    try:
+        return CreateUserModel.model_validate(data), None
+    except ValidationError as ex:
+        return None, _validation_error_message(ex)
+
+
+def _decode_lines(file: BinaryIO) -> Iterator[str]:
+    # Decoded line by line, so a bad byte fails its own line and not a whole buffer
+    for line in file:
+        yield line.decode("utf-8")
+
+
+# Readers yield (row, user, error), rows are numbered by file lines
+
+
+def read_csv_users(
+    file: BinaryIO,
+) -> Iterator[tuple[int, CreateUserModel | None, str | None]]:
+    reader = csv.DictReader(_decode_lines(file))
+    try:
+        for record in reader:
+            data = {
+                key: value
+                for key, value in record.items()
+                if key is not None and value
+            }
+            if "groups_ids" in data:
+                data["groups_ids"] = [
+                    group_id.strip()
+                    for group_id in data["groups_ids"].split(CSV_GROUPS_SEPARATOR)
+                    if group_id.strip()
+                ]
+            yield reader.line_num, *_validate_user(data)
+    except (csv.Error, UnicodeDecodeError) as ex:
+        yield reader.line_num + 1, None, f"Can not read file : {ex}"
+
+
+def read_ndjson_users(
+    file: BinaryIO,
+) -> Iterator[tuple[int, CreateUserModel | None, str | None]]:
+    for line_num, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as ex:
+            yield line_num, None, f"Invalid JSON : {ex}"
+            continue
+        yield line_num, *_validate_user(data)
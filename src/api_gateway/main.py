@@ -7,12 +7,14 @@ from api.v1.routes.account_route import router as account_router_v1
 from api.v1.routes.user_route import router as user_router_v1
 from api.v1.routes.cargo_route import router as cargo_router_v1
 from api.v1.routes.delivery_route import router as delivery_router_v1
+from api.v1.routes.payment_route import router as payment_router_v1
 
 
 app.include_router(account_router_v1)
 app.include_router(user_router_v1)
 app.include_router(cargo_router_v1)
 app.include_router(delivery_router_v1)
+app.include_router(payment_router_v1)
 
 # Запуск сервера
 # http://localhost:8000/openapi.json swagger
@@ -0,0 +1,21 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one execution of the first caller's function
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+
+        # A cancelled caller must not cancel the call shared with the others
+        return await asyncio.shield(task)
@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# Rounds of passwords hashed by hash_many, a lower cost is raised to BCRYPT_ROUNDS
+# by verify_and_update on the first login of the user
+IMPORT_BCRYPT_ROUNDS = int(os.environ.get("IMPORT_BCRYPT_ROUNDS", str(BCRYPT_ROUNDS)))
+
+PASSWORD_HASHER_WORKERS = int(
+    os.environ.get("PASSWORD_HASHER_WORKERS", str(os.cpu_count() or 1))
+)
+# Requests waiting for a free worker, after that callers get PasswordHasherOverloadedError
+PASSWORD_HASHER_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASHER_QUEUE_SIZE", "64"))
+PASSWORD_HASHER_QUEUE_TIMEOUT = float(
+    os.environ.get("PASSWORD_HASHER_QUEUE_TIMEOUT", "5")
+)
+# Passwords sent to a worker at once by hash_many
+PASSWORD_HASHER_BATCH_SIZE = 8
+
+# Hashes with less rounds than configured are reported as outdated by verify_and_update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+import_pwd_context = CryptContext(
+    schemes=["bcrypt"], bcrypt__default_rounds=IMPORT_BCRYPT_ROUNDS
+)
+
+
+def _warm_up():
+    pass
+
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _hash_passwords(passwords: list[str]) -> list[str]:
+    return [import_pwd_context.hash(password) for password in passwords]
+
+
+def _verify_and_update_password(
+    password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasherOverloadedError(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASHER_WORKERS,
+        queue_size: int = PASSWORD_HASHER_QUEUE_SIZE,
+        queue_timeout: float = PASSWORD_HASHER_QUEUE_TIMEOUT,
+    ):
+        self._workers = workers
+        self._queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(workers + queue_size)
+        self._executor: ProcessPoolExecutor | None = None
+
+    async def connect(self):
+        # Forking a process with running gRPC threads is unsafe, so workers are spawned
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(self._executor, _warm_up)
+                for _ in range(self._workers)
+            ]
+        )
+
+    async def disconnect(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def _run(self, func, *args):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._queue_timeout)
+        except TimeoutError:
+            raise PasswordHasherOverloadedError("Password hasher queue is full")
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, func, *args
+            )
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash_password, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> tuple[bool, str | None]:
+        return await self._run(_verify_and_update_password, password, hashed_password)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        # Bulk hashing waits for slots instead of failing and keeps at most one batch
+        # per worker in flight, so single requests are queued behind a batch at most
+        batches = [
+            passwords[ind : ind + PASSWORD_HASHER_BATCH_SIZE]
+            for ind in range(0, len(passwords), PASSWORD_HASHER_BATCH_SIZE)
+        ]
+        hashed_batches: list[list[str]] = [[] for _ in batches]
+        batch_indices = iter(range(len(batches)))
+        loop = asyncio.get_running_loop()
+
+        async def hash_batches():
+            for ind in batch_indices:
+                async with self._slots:
+                    hashed_batches[ind] = await loop.run_in_executor(
+                        self._executor, _hash_passwords, batches[ind]
+                    )
+
+        await asyncio.gather(*[hash_batches() for _ in range(self._workers)])
+        return [hashed for batch in hashed_batches for hashed in batch]
@@ -0,0 +1,61 @@
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+
+
+MONGO_URL = (
+    f"mongodb://"
+    f"{os.environ.get("MONGO_HOST", "localhost")}"
+    ":"
+    f"{os.environ.get("MONGO_PORT", "27017")}"
+)
+MONGO_DB = os.environ.get("MONGO_DB", "company")
+
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "20"))
+
+# Documents fetched by one round trip of a streamed find
+MONGO_CURSOR_BATCH_SIZE = int(os.environ.get("MONGO_CURSOR_BATCH_SIZE", "500"))
+
+
+class MongoClient:
+    # One client per process, its connection pool is shared by all repositories
+    def __init__(
+        self,
+        connection_string: str = MONGO_URL,
+        database: str = MONGO_DB,
+        min_pool_size: int = MONGO_MIN_POOL_SIZE,
+        max_pool_size: int = MONGO_MAX_POOL_SIZE,
+    ):
+        self._connection_string = connection_string
+        self._database = database
+        self._min_pool_size = min_pool_size
+        self._max_pool_size = max_pool_size
+        self._client: AsyncIOMotorClient | None = None
+
+    async def connect(self):
+        self._client = AsyncIOMotorClient(
+            self._connection_string,
+            minPoolSize=self._min_pool_size,
+            maxPoolSize=self._max_pool_size,
+        )
+        # Connects before the service accepts requests instead of on the first query
+        await self._client.admin.command("ping")
+
+    async def disconnect(self):
+        self._client.close()
+        self._client = None
+
+    def __del__(self):
+        if self._client is not None:
+            self._client.close()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    def get_collection(self, name: str) -> AsyncIOMotorCollection:
+        return self._client[self._database][name]
@@ -0,0 +1,256 @@
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+
+DATABASE_URL = (
+    f"postgresql://"
+    f"{os.environ.get("POSTGRES_USER", "postgres")}"
+    ":"
+    f"{os.environ.get("POSTGRES_PASSWORD", "postgres")}"
+    "@"
+    f"{os.environ.get("POSTGRES_HOST", "localhost")}"
+    ":"
+    f"{os.environ.get("POSTGRES_PORT", "5432")}"
+    "/"
+    f"{os.environ.get("POSTGRES_DB", "company")}"
+)
+
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "5"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "20"))
+# Idle connections are closed after this time and reopened cold, 0 keeps them warm
+DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME = float(
+    os.environ.get("DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME", "0")
+)
+
+# Prepared statements kept by every connection, queries built from optional fields
+# have many variants, so the asyncpg default of 100 is too small
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "1024"))
+
+# Rows fetched by one round trip of a server side cursor
+DB_CURSOR_PREFETCH = int(os.environ.get("DB_CURSOR_PREFETCH", "500"))
+# A cursor holds its connection while the client reads, so streams get only a part
+# of the pool and wait for each other, other queries keep the rest
+DB_MAX_CURSORS = int(os.environ.get("DB_MAX_CURSORS", "5"))
+# Seconds, a cursor statement running longer or a client not reading for longer
+# ends the stream and frees the connection
+DB_CURSOR_STATEMENT_TIMEOUT = float(os.environ.get("DB_CURSOR_STATEMENT_TIMEOUT", "30"))
+DB_CURSOR_IDLE_TIMEOUT = float(os.environ.get("DB_CURSOR_IDLE_TIMEOUT", "30"))
+
+# Pool stats are printed and reset with this interval, 0 disables them
+DB_POOL_STATS_INTERVAL = float(os.environ.get("DB_POOL_STATS_INTERVAL", "60"))
+DB_POOL_STATS_TOP_STATEMENTS = 5
+
+
+class PoolStats:
+    def __init__(self):
+        self.acquire_count = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        # Query -> [count, total time, max time]
+        self.statements: dict[str, list] = {}
+
+    def add_acquire(self, wait: float):
+        self.acquire_count += 1
+        self.acquire_wait_total += wait
+        self.acquire_wait_max = max(self.acquire_wait_max, wait)
+
+    def add_statement(self, query: str, duration: float):
+        timing = self.statements.get(query)
+        if timing is None:
+            self.statements[query] = [1, duration, duration]
+        else:
+            timing[0] += 1
+            timing[1] += duration
+            timing[2] = max(timing[2], duration)
+
+
+class PostgresPool:
+    # One pool per process, shared by all repositories of the service
+    def __init__(
+        self,
+        connection_string: str = DATABASE_URL,
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+        statement_cache_size: int = DB_STATEMENT_CACHE_SIZE,
+        stats_interval: float = DB_POOL_STATS_INTERVAL,
+        max_cursors: int = DB_MAX_CURSORS,
+    ):
+        self._connection_string = connection_string
+        self._min_size = min_size
+        self._max_size = max_size
+        self._statement_cache_size = statement_cache_size
+        self._stats_interval = stats_interval
+        self._pool: asyncpg.Pool | None = None
+        # At least one connection is always left to other queries
+        self._cursor_slots = asyncio.Semaphore(max(1, min(max_cursors, max_size - 1)))
+
+        self._stats = PoolStats()
+        self._waiting = 0
+        self._stats_task: asyncio.Task | None = None
+
+    @staticmethod
+    async def _init_connection(conn: asyncpg.Connection):
+        # json values are decoded by asyncpg straight into python objects
+        await conn.set_type_codec(
+            "json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+    async def connect(self):
+        self._pool = await asyncpg.create_pool(
+            self._connection_string,
+            min_size=self._min_size,
+            max_size=self._max_size,
+            max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+            statement_cache_size=self._statement_cache_size,
+            init=self._init_connection,
+        )
+        if self._stats_interval > 0:
+            self._stats_task = asyncio.create_task(self._print_stats())
+
+    async def disconnect(self):
+        if self._stats_task is not None:
+            self._stats_task.cancel()
+            try:
+                await self._stats_task
+            except asyncio.CancelledError:
+                pass
+        await self._pool.close()
+        self._pool = None
+
+    def __del__(self):
+        if self._pool is not None:
+            self._pool.terminate()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def warm_up(self, queries: list[tuple[str, tuple]]):
+        # Runs read only queries on every idle connection before the service accepts
+        # requests, so first requests find them prepared and the catalog cached
+        connections = [await self._pool.acquire() for _ in range(self._min_size)]
+        try:
+            await asyncio.gather(
+                *[
+                    self._warm_up_connection(conn, queries)
+                    for conn in connections
+                ]
+            )
+        finally:
+            for conn in connections:
+                await self._pool.release(conn)
+
+    @staticmethod
+    async def _warm_up_connection(
+        conn: asyncpg.Connection, queries: list[tuple[str, tuple]]
+    ):
+        for query, args in queries:
+            await conn.fetch(query, *args)
+
+    @asynccontextmanager
+    async def acquire(self):
+        started_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            conn = await self._pool.acquire()
+        finally:
+            self._waiting -= 1
+        self._stats.add_acquire(time.perf_counter() - started_at)
+
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.acquire() as conn:
+            conn: asyncpg.Connection
+            async with conn.transaction():
+                yield conn
+
+    async def _run(self, method: str, query: str, args: tuple):
+        async with self.acquire() as conn:
+            started_at = time.perf_counter()
+            try:
+                return await getattr(conn, method)(query, *args)
+            finally:
+                self._stats.add_statement(query, time.perf_counter() - started_at)
+
+    async def fetch(self, query: str, *args) -> list[asyncpg.Record]:
+        return await self._run("fetch", query, args)
+
+    async def fetchrow(self, query: str, *args) -> asyncpg.Record | None:
+        return await self._run("fetchrow", query, args)
+
+    async def fetchval(self, query: str, *args):
+        return await self._run("fetchval", query, args)
+
+    async def execute(self, query: str, *args) -> str:
+        return await self._run("execute", query, args)
+
+    async def cursor(self, query: str, *args, prefetch: int = DB_CURSOR_PREFETCH):
+        # Rows are read by a server side cursor, prefetch rows per round trip, so the
+        # result is never held in memory at once. A cursor lives in a transaction,
+        # the connection is held until the iteration ends or is closed.
+        async with self._cursor_slots, self.acquire() as conn:
+            conn: asyncpg.Connection
+            async with conn.transaction(readonly=True):
+                # Postgres ends the session of a stalled stream, the pool replaces it
+                await conn.execute(
+                    f"SET LOCAL statement_timeout = {int(DB_CURSOR_STATEMENT_TIMEOUT * 1000)}; "
+                    f"SET LOCAL idle_in_transaction_session_timeout = {int(DB_CURSOR_IDLE_TIMEOUT * 1000)}"
+                )
+                async for record in conn.cursor(query, *args, prefetch=prefetch):
+                    yield record
+
+    def stats(self) -> dict:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiting": self._waiting,
+            "min_size": self._min_size,
+            "max_size": self._max_size,
+            "acquire_count": self._stats.acquire_count,
+            "acquire_wait_avg": (
+                self._stats.acquire_wait_total / self._stats.acquire_count
+                if self._stats.acquire_count
+                else 0.0
+            ),
+            "acquire_wait_max": self._stats.acquire_wait_max,
+            "statements": {
+                query: {"count": count, "total": total, "max": max_time}
+                for query, (count, total, max_time) in self._stats.statements.items()
+            },
+        }
+
+    def reset_stats(self):
+        self._stats = PoolStats()
+
+    async def _print_stats(self):
+        while True:
+            await asyncio.sleep(self._stats_interval)
+            stats = self.stats()
+            self.reset_stats()
+
+            statements = sorted(
+                stats.pop("statements").items(),
+                key=lambda item: item[1]["total"],
+                reverse=True,
+            )
+            print(f"Postgres pool stats : {json.dumps(stats)}")
+            for query, timing in statements[:DB_POOL_STATS_TOP_STATEMENTS]:
+                print(
+                    f"Postgres statement : count {timing["count"]}, total {timing["total"]:.3f}s, max {timing["max"]:.3f}s, {" ".join(query.split())[:120]}"
+                )
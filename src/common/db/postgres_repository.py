@@ -0,0 +1,54 @@
+from common.db.postgres_pool import PostgresPool
+
+
+# Matches no row, used as an argument of warm up queries
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+def affected_rows(status: str) -> int:
+    # Status of execute() ends with the row count, as in "UPDATE 1"
+    return int(status.split(" ")[-1])
+
+
+class PostgresRepository:
+    # Single statements run in autocommit on a pool connection, one round trip each,
+    # and reuse the statement prepared by the connection before.
+    # Only writes made of several statements open a transaction.
+
+    # Hot read only queries with arguments, run on the pool connections at startup
+    _warm_up_queries: list[tuple[str, tuple]] = []
+
+    def __init__(self, db_pool: PostgresPool):
+        self._db_pool = db_pool
+
+    async def connect(self):
+        if self._warm_up_queries:
+            await self._db_pool.warm_up(self._warm_up_queries)
+
+    async def disconnect(self):
+        pass
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def _fetch(self, query: str, *args):
+        return await self._db_pool.fetch(query, *args)
+
+    async def _fetchrow(self, query: str, *args):
+        return await self._db_pool.fetchrow(query, *args)
+
+    async def _fetchval(self, query: str, *args):
+        return await self._db_pool.fetchval(query, *args)
+
+    async def _execute(self, query: str, *args) -> str:
+        return await self._db_pool.execute(query, *args)
+
+    def _cursor(self, query: str, *args):
+        return self._db_pool.cursor(query, *args)
+
+    def _transaction(self):
+        return self._db_pool.transaction()
@@ -0,0 +1,49 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+
+# Keyset pagination cursors are the sort key of the last returned row,
+# opaque to clients and passed back as is for the next page
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(values: list) -> str:
+    return (
+        base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode())
+        .decode()
+        .rstrip("=")
+    )
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+    except (ValueError, UnicodeDecodeError) as ex:
+        raise InvalidCursorError(cursor) from ex
+    if not isinstance(values, list):
+        raise InvalidCursorError(cursor)
+    return values
+
+
+# Rows paged by creation time, the id breaks ties between equal timestamps
+
+
+def encode_created_at_cursor(created_at: datetime, row_id) -> str:
+    return encode_cursor([created_at.isoformat(), str(row_id)])
+
+
+def decode_created_at_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    values = decode_cursor(cursor)
+    if len(values) != 2 or not all(isinstance(value, str) for value in values):
+        raise InvalidCursorError(cursor)
+    try:
+        return datetime.fromisoformat(values[0]), uuid.UUID(values[1])
+    except ValueError as ex:
+        raise InvalidCursorError(cursor) from ex
@@ -0,0 +1,21 @@
+import os
+from typing import AsyncIterable, AsyncIterator, TypeVar
+
+
+T = TypeVar("T")
+
+# Rows sent in one message of a server streaming list RPC
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "100"))
+
+
+async def batched(
+    items: AsyncIterable[T], size: int = STREAM_BATCH_SIZE
+) -> AsyncIterator[list[T]]:
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
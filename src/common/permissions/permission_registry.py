@@ -0,0 +1,34 @@
+import base64
+import hashlib
+
+
+class PermissionRegistry:
+    # Maps permission names to bit positions of the token permissions bitset.
+    # Positions follow the order of names, so the version changes with any change of the list
+    def __init__(self, names: list[str]):
+        self.names = list(names)
+        self.version = hashlib.sha256("\n".join(self.names).encode()).hexdigest()[:16]
+        self._bits = {name: bit for bit, name in enumerate(self.names)}
+
+    def __contains__(self, permission: str) -> bool:
+        return permission in self._bits
+
+    def encode(self, permissions: set[str]) -> str:
+        mask = 0
+        for permission in permissions:
+            mask |= 1 << self._bits[permission]
+        encoded = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+        return base64.urlsafe_b64encode(encoded).decode().rstrip("=")
+
+    def decode(self, encoded: str) -> int:
+        return int.from_bytes(
+            base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)), "little"
+        )
+
+    def decode_names(self, encoded: str) -> set[str]:
+        mask = self.decode(encoded)
+        return {name for bit, name in enumerate(self.names) if mask >> bit & 1}
+
+    def has_permission(self, mask: int, permission: str) -> bool:
+        bit = self._bits.get(permission)
+        return bit is not None and bool(mask >> bit & 1)
@@ -0,0 +1,96 @@
+-- Compares a 10k row account_group change with the statement-level triggers
+-- and with the previous row-level triggers running a dynamic UPDATE per row.
+-- Runs in one transaction that is rolled back, the database is left unchanged.
+--
+-- psql -h localhost -U postgres -d company -f src/postgres/benchmarks/membership_change_benchmark.sql
+
+\set ON_ERROR_STOP on
+\timing off
+
+BEGIN;
+
+INSERT INTO company.public.account (username, password, first_name, second_name)
+SELECT 'membership_benchmark_' || n, 'password', 'first_name', 'second_name'
+FROM generate_series(1, 10000) AS n;
+
+INSERT INTO company.public.group (name, description)
+SELECT 'membership_benchmark_' || n, 'membership benchmark'
+FROM generate_series(1, 10) AS n;
+
+-- Every account gets one of the 10 groups
+CREATE TEMP TABLE benchmark_membership ON COMMIT DROP AS
+SELECT benchmark_account.id AS account_id, benchmark_group.id AS group_id
+FROM (
+    SELECT id, row_number() OVER (ORDER BY id) % 10 + 1 AS n
+    FROM company.public.account WHERE username LIKE 'membership\_benchmark\_%'
+) AS benchmark_account
+JOIN (
+    SELECT id, row_number() OVER (ORDER BY id) AS n
+    FROM company.public.group WHERE name LIKE 'membership\_benchmark\_%'
+) AS benchmark_group USING (n);
+
+
+\echo 'Statement-level triggers'
+\timing on
+
+INSERT INTO company.public.account_group (account_id, group_id)
+SELECT account_id, group_id FROM benchmark_membership;
+
+DELETE FROM company.public.account_group
+WHERE account_id IN (SELECT account_id FROM benchmark_membership);
+
+\timing off
+
+
+-- Previous triggers, they exist only inside this transaction
+CREATE FUNCTION company.public.benchmark_update_related_timestamps(target_table text, target_column text, old_id uuid, new_id uuid)
+RETURNS void AS $$
+BEGIN
+    EXECUTE format(
+        'UPDATE company.public.%I SET updated_at = NOW() WHERE %I = $1 OR %I = $2',
+        target_table, target_column, target_column
+    ) USING old_id, new_id;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION company.public.benchmark_account_group_trigger_update_related_timestamps()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM company.public.benchmark_update_related_timestamps('account', 'id', OLD.account_id, NEW.account_id);
+    PERFORM company.public.benchmark_update_related_timestamps('group', 'id', OLD.group_id, NEW.group_id);
+
+    IF TG_OP = 'INSERT' THEN
+        NEW.created_at := NOW();
+        NEW.updated_at := NOW();
+    ELSIF TG_OP = 'UPDATE' THEN
+        NEW.updated_at := NOW();
+    ELSIF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER trigger_set_timestamps_account_group ON company.public.account_group;
+DROP TRIGGER trigger_update_related_timestamps_account_group_insert ON company.public.account_group;
+DROP TRIGGER trigger_update_related_timestamps_account_group_update ON company.public.account_group;
+DROP TRIGGER trigger_update_related_timestamps_account_group_delete ON company.public.account_group;
+
+CREATE TRIGGER trigger_set_timestamps_account_group
+BEFORE INSERT OR UPDATE OR DELETE ON company.public.account_group
+FOR EACH ROW
+EXECUTE FUNCTION company.public.benchmark_account_group_trigger_update_related_timestamps();
+
+
+\echo 'Row-level triggers'
+\timing on
+
+INSERT INTO company.public.account_group (account_id, group_id)
+SELECT account_id, group_id FROM benchmark_membership;
+
+DELETE FROM company.public.account_group
+WHERE account_id IN (SELECT account_id FROM benchmark_membership);
+
+\timing off
+
+ROLLBACK;
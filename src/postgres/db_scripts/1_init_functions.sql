@@ -11,46 +11,59 @@ begin
 end;
 $$ language plpgsql;
 
-create or replace function update_related_timestamps(target_table text, target_column text, old_id uuid, new_id uuid)
-returns void as $$
+-- Statement-level, parent rows of all changed links are touched once per statement.
+-- Transition tables exist only for the events of the trigger, so each event has its own branch.
+create or replace function group_permission_update_related_timestamps()
+returns trigger as $$
 begin
-    EXECUTE format(
-        'UPDATE company.public.%I SET updated_at = NOW() WHERE %I = $1 OR %I = $2',
-        target_table, target_column, target_column
-    ) USING old_id, new_id;
+    IF TG_OP = 'INSERT' THEN
+        UPDATE company.public.permission SET updated_at = NOW()
+        WHERE id IN (SELECT permission_id FROM new_rows);
+        UPDATE company.public.group SET updated_at = NOW()
+        WHERE id IN (SELECT group_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE company.public.permission SET updated_at = NOW()
+        WHERE id IN (SELECT permission_id FROM new_rows UNION SELECT permission_id FROM old_rows);
+        UPDATE company.public.group SET updated_at = NOW()
+        WHERE id IN (SELECT group_id FROM new_rows UNION SELECT group_id FROM old_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE company.public.permission SET updated_at = NOW()
+        WHERE id IN (SELECT permission_id FROM old_rows);
+        UPDATE company.public.group SET updated_at = NOW()
+        WHERE id IN (SELECT group_id FROM old_rows);
+    END IF;
+    return null;
 end;
 $$ language plpgsql;
 
-
-
-create or replace function group_permission_trigger_update_related_timestamps()
+create or replace function account_group_update_related_timestamps()
 returns trigger as $$
 begin
-    perform update_related_timestamps('permission', 'id', OLD.permission_id, NEW.permission_id);
-    perform update_related_timestamps('group', 'id', OLD.group_id, NEW.group_id);
-    
     IF TG_OP = 'INSERT' THEN
-        NEW.created_at := NOW();
-        NEW.updated_at := NOW();
+        UPDATE company.public.account SET updated_at = NOW()
+        WHERE id IN (SELECT account_id FROM new_rows);
+        UPDATE company.public.group SET updated_at = NOW()
+        WHERE id IN (SELECT group_id FROM new_rows);
     ELSIF TG_OP = 'UPDATE' THEN
-        NEW.updated_at := NOW();
+        UPDATE company.public.account SET updated_at = NOW()
+        WHERE id IN (SELECT account_id FROM new_rows UNION SELECT account_id FROM old_rows);
+        UPDATE company.public.group SET updated_at = NOW()
+        WHERE id IN (SELECT group_id FROM new_rows UNION SELECT group_id FROM old_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE company.public.account SET updated_at = NOW()
+        WHERE id IN (SELECT account_id FROM old_rows);
+        UPDATE company.public.group SET updated_at = NOW()
+        WHERE id IN (SELECT group_id FROM old_rows);
     END IF;
-    return new;
+    return null;
 end;
 $$ language plpgsql;
 
-create or replace function account_group_trigger_update_related_timestamps()
+create or replace function notify_group_permission_changed()
 returns trigger as $$
 begin
-    perform update_related_timestamps('account', 'id', OLD.account_id, NEW.account_id);
-    perform update_related_timestamps('group', 'id', OLD.group_id, NEW.group_id);
-
-    IF TG_OP = 'INSERT' THEN
-        NEW.created_at := NOW();
-        NEW.updated_at := NOW();
-    ELSIF TG_OP = 'UPDATE' THEN
-        NEW.updated_at := NOW();
-    END IF;
-    return new;
+    -- Listeners reload the whole mapping, so the payload is empty
+    perform pg_notify('group_permission_changed', '');
+    return null;
 end;
 $$ language plpgsql;
\ No newline at end of file
@@ -10,7 +10,6 @@ create table if not exists company.public.account (
     birth timestamptz,
     email text,
     phone text,
-    refresh_token text,
     is_active boolean not null default TRUE,
     created_at timestamptz not null default NOW(),
     updated_at timestamptz not null default NOW()
@@ -1,9 +1,55 @@
 CREATE TRIGGER trigger_set_timestamps_group_permission
-BEFORE INSERT OR UPDATE OR DELETE ON company.public.group_permission
+BEFORE INSERT OR UPDATE ON company.public.group_permission
 FOR EACH ROW
-EXECUTE FUNCTION group_permission_trigger_update_related_timestamps();
+EXECUTE FUNCTION set_timestamps();
+
+CREATE TRIGGER trigger_update_related_timestamps_group_permission_insert
+AFTER INSERT ON company.public.group_permission
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION group_permission_update_related_timestamps();
+
+CREATE TRIGGER trigger_update_related_timestamps_group_permission_update
+AFTER UPDATE ON company.public.group_permission
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION group_permission_update_related_timestamps();
+
+CREATE TRIGGER trigger_update_related_timestamps_group_permission_delete
+AFTER DELETE ON company.public.group_permission
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION group_permission_update_related_timestamps();
 
 CREATE TRIGGER trigger_set_timestamps_account_group
-BEFORE INSERT OR UPDATE OR DELETE ON company.public.account_group
+BEFORE INSERT OR UPDATE ON company.public.account_group
 FOR EACH ROW
-EXECUTE FUNCTION account_group_trigger_update_related_timestamps();
\ No newline at end of file
+EXECUTE FUNCTION set_timestamps();
+
+CREATE TRIGGER trigger_update_related_timestamps_account_group_insert
+AFTER INSERT ON company.public.account_group
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION account_group_update_related_timestamps();
+
+CREATE TRIGGER trigger_update_related_timestamps_account_group_update
+AFTER UPDATE ON company.public.account_group
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION account_group_update_related_timestamps();
+
+CREATE TRIGGER trigger_update_related_timestamps_account_group_delete
+AFTER DELETE ON company.public.account_group
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+EXECUTE FUNCTION account_group_update_related_timestamps();
+
+CREATE TRIGGER trigger_notify_group_permission_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON company.public.group_permission
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_group_permission_changed();
+
+CREATE TRIGGER trigger_notify_permission_changed
+AFTER UPDATE OR DELETE OR TRUNCATE ON company.public.permission
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_group_permission_changed();
\ No newline at end of file
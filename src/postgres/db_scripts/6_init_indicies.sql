@@ -1,7 +1,21 @@
 CREATE INDEX idx_account_first_name_last_name ON company.public.account(first_name, second_name);
 
-CREATE INDEX idx_cargo_creator_id ON company.public.cargo(creator_id);
+-- Substring and fuzzy name search of active accounts
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX idx_account_first_name_trgm ON company.public.account USING gin (first_name gin_trgm_ops) WHERE is_active = TRUE;
+CREATE INDEX idx_account_second_name_trgm ON company.public.account USING gin (second_name gin_trgm_ops) WHERE is_active = TRUE;
 
-CREATE INDEX idx_delivery_sender_id ON company.public.delivery(sender_id);
-CREATE INDEX idx_delivery_receiver_id ON company.public.delivery(receiver_id);
+-- Username prefix suggestions and incremental sync of the in-memory username index
+CREATE INDEX idx_account_username_pattern ON company.public.account(username text_pattern_ops) WHERE is_active = TRUE;
+CREATE INDEX idx_account_updated_at ON company.public.account(updated_at);
+
+-- Lists are paged by (created_at, id) keyset, so the filter and the order come from one index
+CREATE INDEX idx_cargo_creator_id_created_at ON company.public.cargo(creator_id, created_at, id);
+
+CREATE INDEX idx_delivery_created_at ON company.public.delivery(created_at, id);
+CREATE INDEX idx_delivery_sender_id_created_at ON company.public.delivery(sender_id, created_at, id);
+CREATE INDEX idx_delivery_receiver_id_created_at ON company.public.delivery(receiver_id, created_at, id);
 CREATE INDEX idx_delivery_cargo_id ON company.public.delivery(cargo_id);
+
+
+CREATE INDEX idx_account_group_account_id ON company.public.account_group(account_id);
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import uuid
 from datetime import datetime, timedelta, timezone
 import grpc
 from grpc_build.account_service_pb2 import (
@@ -11,6 +12,14 @@ from grpc_build.account_service_pb2 import (
     CheckPermissionsResponse,
     LogoutRequest,
     LogoutResponse,
+    GetJwksRequest,
+    GetJwksResponse,
+    GetRevokedTokensRequest,
+    GetRevokedTokensResponse,
+    RevokedToken,
+    GetPermissionRegistryRequest,
+    GetPermissionRegistryResponse,
+    PermissionRegistry as PermissionRegistryMessage,
 )
 from grpc_build.account_service_pb2_grpc import (
     add_AccountServiceServicer_to_server,
@@ -18,69 +27,189 @@ from grpc_build.account_service_pb2_grpc import (
 )
 from grpc import ServicerContext
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 import asyncio
 from repositories.user_repository import UserRepository
-
-from clients.redis.tokens_client import TokensClient
+from common.db.postgres_pool import PostgresPool
+from repositories.group_permission_index import GroupPermissionIndex
+
+from clients.redis.tokens_client import (
+    REVOKED_TOKENS_FEED_BATCH_SIZE,
+    TokensClient,
+    token_expiration,
+    token_hash,
+)
+from clients.redis.session_store import RedisSessionStore
+from clients.memory.session_store import MemorySessionStore
+from common.crypto.password_hasher import PasswordHasher, PasswordHasherOverloadedError
+from common.permissions.permission_registry import PermissionRegistry
+from lib.jwt_keys import (
+    ACCESS_TOKEN_TYPE,
+    ALGORITHM,
+    REFRESH_TOKEN_TYPE,
+    JwtKeys,
+    load_jwt_keys,
+)
 
 
-SECRET_KEY = os.environ.get(
-    "JWT_SECRET_KEY",
-    "0797ea423ef4f93f83f556b7414055a58a0ea1e979828c9e7d77dbcb24b50b622b8b33c0735bc939a6cbe87961a7d1a21aae7add625e72e2506f05c18159cbdf029a27a4f9c930ffd773d1f531cdfa331ea7bc89212b17f2202e385527f465f2d636196c5ee386a17399ec17fc36a15675cc4ec2e649a4d72ff3cecb90771af47efb9dc047f00532917ecdd4cba73f6a6173a90516361610e7da11a70e28ef959d4883f8f2c306dca59cecc5d2e19a0112f8513fdb52f62d8ae9245f7ae991e7b7af6a9847d86c2f3624c3d6a3248b460637f32edae8abb6b3019e70e399e9ac64e7d7713876fdf6f282d10ca35079343bd298654d2d661a686c5dfb349d2fe7",
+JWT_PRIVATE_KEY_PATH = os.environ.get(
+    "JWT_PRIVATE_KEY_PATH", "./keys/jwt_private_key.pem"
 )
 
-ALGORITHM = "HS256"
+# "redis" for deployments, "memory" keeps sessions in the process for local runs
+SESSION_STORE = os.environ.get("SESSION_STORE", "redis")
+
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-
-def create_jwt_token(data: dict, expires_delta: timedelta):
+def create_jwt_token(jwt_keys: JwtKeys, data: dict, expires_delta: timedelta):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
-
-def create_token(user_id: str, permissions: set[str], refresh_token: bool = False):
+    return jwt.encode(
+        to_encode,
+        jwt_keys.private_key,
+        algorithm=ALGORITHM,
+        headers={"kid": jwt_keys.key_id},
+    )
+
+
+def create_token(
+    jwt_keys: JwtKeys,
+    user_id: str,
+    session_id: str,
+    permissions: set[str],
+    permission_registry: PermissionRegistry,
+    refresh_token: bool = False,
+):
+    # Permissions are packed into a bitset, names are resolved by the registry version
+    claims = {
+        "sub": user_id,
+        "sid": session_id,
+        "perm": permission_registry.encode(permissions),
+        "pv": permission_registry.version,
+        "typ": REFRESH_TOKEN_TYPE if refresh_token else ACCESS_TOKEN_TYPE,
+    }
     if refresh_token:
         return create_jwt_token(
-            {"sub": user_id, "permissions": [*permissions]},
-            timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+            jwt_keys, claims, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
         )
     else:
         return create_jwt_token(
-            {"sub": user_id, "permissions": [*permissions]},
-            timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+            jwt_keys, claims, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         )
 
 
 class AccountService(AccountServiceServicer):
-    def __init__(self, user_rep: UserRepository, tokens_clt: TokensClient):
+    def __init__(
+        self,
+        user_rep: UserRepository,
+        tokens_clt: TokensClient,
+        session_store: RedisSessionStore | MemorySessionStore,
+        password_hasher: PasswordHasher,
+        group_permission_index: GroupPermissionIndex,
+        jwt_keys: JwtKeys,
+    ):
         super().__init__()
         self._user_rep = user_rep
         self._tokens_clt = tokens_clt
+        self._session_store = session_store
+        self._password_hasher = password_hasher
+        self._group_permission_index = group_permission_index
+        self._jwt_keys = jwt_keys
+        self._permission_registry: PermissionRegistry | None = None
+        # Older registries stay, tokens issued with them are valid until expiration,
+        # also the ones issued by other replicas before this one reloaded
+        self._permission_registries: dict[str, PermissionRegistry] = {}
+        # Versions a reload did not find, read again only after the registry changes
+        self._missing_permission_registry_versions: set[str] = set()
+        self._permission_registry_lock = asyncio.Lock()
+
+    async def load_permission_registry(self):
+        self._permission_registry = PermissionRegistry(
+            await self._user_rep.get_permission_names()
+        )
+        if self._permission_registry.version not in self._permission_registries:
+            self._permission_registries[self._permission_registry.version] = (
+                self._permission_registry
+            )
+            self._missing_permission_registry_versions.clear()
+
+    async def _get_token_permission_registry(
+        self, version: str | None
+    ) -> PermissionRegistry | None:
+        # A token with an unknown pv can be issued by a replica with a newer registry,
+        # so the registry is read again once before the token is rejected
+        permission_registry = self._permission_registries.get(version)
+        if permission_registry is not None:
+            return permission_registry
+
+        async with self._permission_registry_lock:
+            permission_registry = self._permission_registries.get(version)
+            if (
+                permission_registry is None
+                and version not in self._missing_permission_registry_versions
+            ):
+                await self.load_permission_registry()
+                permission_registry = self._permission_registries.get(version)
+                if permission_registry is None:
+                    self._missing_permission_registry_versions.add(version)
+        return permission_registry
+
+    async def _get_permission_registry(self, permissions: set[str]) -> PermissionRegistry:
+        # Permissions added after start are not in the registry yet
+        if any(permission not in self._permission_registry for permission in permissions):
+            await self.load_permission_registry()
+        return self._permission_registry
 
     async def Auth(
         self, request: AuthRequest, context: ServicerContext
     ) -> AuthResponse:
         try:
-            user = await self._user_rep.get_user_by_username(request.username)
+            user = await self._user_rep.get_auth_user(request.username)
             if user is not None:
-                if pwd_context.verify(request.password, user.password):
-                    permissions = await self._user_rep.get_permissions(user.username)
+                is_valid_password, updated_password = (
+                    await self._password_hasher.verify_and_update(
+                        request.password, user.password
+                    )
+                )
+                if is_valid_password:
+                    if updated_password is not None:  # Hash cost parameters changed
+                        await self._user_rep.update_password(
+                            str(user.id), updated_password
+                        )
 
-                    access_token = create_token(str(user.id), permissions)
-                    refresh_token = create_token(str(user.id), permissions, True)
+                    permissions = self._group_permission_index.get_permissions(
+                        user.group_ids
+                    )
+                    permission_registry = await self._get_permission_registry(
+                        permissions
+                    )
+
+                    session_id = uuid.uuid4().hex
+
+                    access_token = create_token(
+                        self._jwt_keys,
+                        str(user.id), session_id, permissions, permission_registry
+                    )
+                    refresh_token = create_token(
+                        self._jwt_keys,
+                        str(user.id),
+                        session_id,
+                        permissions,
+                        permission_registry,
+                        True,
+                    )
 
                     await self._tokens_clt.update_tokens_pair(
                         access_token, refresh_token
                     )
 
-                    await self._user_rep.update_refresh_token(
-                        str(user.id), refresh_token
+                    await self._session_store.create(
+                        str(user.id),
+                        session_id,
+                        token_hash(refresh_token),
+                        token_expiration(refresh_token),
                     )
 
                     return AuthResponse(
@@ -93,6 +222,8 @@ class AccountService(AccountServiceServicer):
                     return AuthResponse(code=401, message="Incorrect login or password")
             else:
                 return AuthResponse(code=404, message="User with this login not found")
+        except PasswordHasherOverloadedError:
+            return AuthResponse(code=503, message="Too many login attempts, try later")
         except Exception as ex:
             return AuthResponse(code=500, message=f"Error : {ex}, args : {ex.args}")
 
@@ -101,36 +232,63 @@ class AccountService(AccountServiceServicer):
     ) -> RefreshResponse:
         old_refresh_token = request.refresh_token
         try:
-            payload = jwt.decode(old_refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = jwt.decode(
+                old_refresh_token, self._jwt_keys.public_key, algorithms=[ALGORITHM]
+            )
+            if payload.get("typ") != REFRESH_TOKEN_TYPE:
+                return RefreshResponse(code=401, message="Invalid refresh token")
 
             user_id: str = payload.get("sub")
-            permissions: list[str] = payload.get("permissions")
+            session_id: str | None = payload.get("sid")
 
             user = await self._user_rep.get_user_by_id(user_id)
 
-            if (
-                user is None
-                or user.refresh_token is None
-                or user.refresh_token != old_refresh_token
-            ):
+            if user is None or session_id is None:
                 return RefreshResponse(code=401, message="Incorrect refresh token")
+
+            token_registry = await self._get_token_permission_registry(
+                payload.get("pv")
+            )
+            if token_registry is not None:
+                permissions = token_registry.decode_names(payload.get("perm"))
             else:
+                # Bit positions of the old registry are unknown, so read them again
+                permissions = self._group_permission_index.get_permissions(
+                    await self._user_rep.get_group_ids(user_id)
+                )
+            permission_registry = await self._get_permission_registry(permissions)
 
-                await self._tokens_clt.block_old_tokens_pair(old_refresh_token)
+            access_token = create_token(
+                self._jwt_keys, user_id, session_id, permissions, permission_registry
+            )
+            refresh_token = create_token(
+                self._jwt_keys,
+                user_id,
+                session_id,
+                permissions,
+                permission_registry,
+                True,
+            )
 
-                access_token = create_token(user_id, permissions)
-                refresh_token = create_token(user_id, permissions, True)
+            if not await self._session_store.rotate(
+                user_id,
+                session_id,
+                token_hash(old_refresh_token),
+                token_hash(refresh_token),
+                token_expiration(refresh_token),
+            ):
+                return RefreshResponse(code=401, message="Incorrect refresh token")
 
-                await self._tokens_clt.update_tokens_pair(access_token, refresh_token)
+            await self._tokens_clt.block_old_tokens_pair(old_refresh_token)
 
-                await self._user_rep.update_refresh_token(user_id, refresh_token)
+            await self._tokens_clt.update_tokens_pair(access_token, refresh_token)
 
-                return AuthResponse(
-                    code=200,
-                    tokens=TokenPair(
-                        access_token=access_token, refresh_token=refresh_token
-                    ),
-                )
+            return AuthResponse(
+                code=200,
+                tokens=TokenPair(
+                    access_token=access_token, refresh_token=refresh_token
+                ),
+            )
         except jwt.ExpiredSignatureError:
             return RefreshResponse(code=401, message="Refresh token expired")
         except JWTError:
@@ -150,13 +308,29 @@ class AccountService(AccountServiceServicer):
             else:
                 try:
                     payload = jwt.decode(
-                        access_token, SECRET_KEY, algorithms=[ALGORITHM]
+                        access_token,
+                        self._jwt_keys.public_key,
+                        algorithms=[ALGORITHM],
                     )
+                    if payload.get("typ") != ACCESS_TOKEN_TYPE:
+                        return CheckPermissionsResponse(
+                            code=401, message="Invalid access token"
+                        )
 
-                    permissions: list[str] = payload.get("permissions")
                     user_id = payload.get("sub")
 
-                    if request.permission in permissions:
+                    permission_registry = await self._get_token_permission_registry(
+                        payload.get("pv")
+                    )
+                    if permission_registry is None:
+                        return CheckPermissionsResponse(
+                            code=401, message="Outdated access token"
+                        )
+
+                    if permission_registry.has_permission(
+                        permission_registry.decode(payload.get("perm")),
+                        request.permission,
+                    ):
                         return CheckPermissionsResponse(code=200, user_id=user_id)
                     else:
                         return CheckPermissionsResponse(
@@ -180,22 +354,25 @@ class AccountService(AccountServiceServicer):
         try:
             payload = jwt.decode(
                 access_token,
-                SECRET_KEY,
+                self._jwt_keys.public_key,
                 algorithms=[ALGORITHM],
                 options={"verify_exp": False},
             )
+            if payload.get("typ") != ACCESS_TOKEN_TYPE:
+                return LogoutResponse(code=401, message="Invalid access token")
 
             user_id: str = payload.get("sub")
+            session_id: str | None = payload.get("sid")
 
-            user = await self._user_rep.get_user_by_id(user_id)
-            if not user:
-                return LogoutResponse(code=404, message="User not found")
-
-            refresh_token = user.refresh_token
-
-            await self._tokens_clt.block_old_tokens_pair(refresh_token)
+            refresh_token_hash = None
+            if session_id is not None:
+                refresh_token_hash = await self._session_store.remove(
+                    user_id, session_id
+                )
+            if refresh_token_hash is None:
+                return LogoutResponse(code=404, message="Session not found")
 
-            await self._user_rep.remove_user_refresh_token(user_id)
+            await self._tokens_clt.block_tokens_pair(refresh_token_hash)
 
             return LogoutResponse(code=200)
         except JWTError:
@@ -203,16 +380,75 @@ class AccountService(AccountServiceServicer):
         except Exception as ex:
             return LogoutResponse(code=500, message=f"Error : {ex}, args : {ex.args}")
 
+    async def GetJwks(
+        self, request: GetJwksRequest, context: ServicerContext
+    ) -> GetJwksResponse:
+        return GetJwksResponse(code=200, jwks=self._jwt_keys.jwks)
+
+    async def GetPermissionRegistry(
+        self, request: GetPermissionRegistryRequest, context: ServicerContext
+    ) -> GetPermissionRegistryResponse:
+        try:
+            await self.load_permission_registry()
+            return GetPermissionRegistryResponse(
+                code=200,
+                registry=PermissionRegistryMessage(
+                    version=self._permission_registry.version,
+                    names=self._permission_registry.names,
+                ),
+            )
+        except Exception as ex:
+            return GetPermissionRegistryResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
+    async def GetRevokedTokens(
+        self, request: GetRevokedTokensRequest, context: ServicerContext
+    ) -> GetRevokedTokensResponse:
+        try:
+            cursor, revoked_tokens = await self._tokens_clt.get_revoked_tokens(
+                request.cursor
+            )
+
+            return GetRevokedTokensResponse(
+                code=200,
+                cursor=cursor,
+                tokens=[
+                    RevokedToken(token_hash=token_hash, expires_at=expires_at)
+                    for token_hash, expires_at in revoked_tokens
+                ],
+                has_more=len(revoked_tokens) == REVOKED_TOKENS_FEED_BATCH_SIZE,
+            )
+        except Exception as ex:
+            return GetRevokedTokensResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
 
 async def serve():
+    # Loaded here and not on import, process pool workers import this module again
+    jwt_keys = load_jwt_keys(JWT_PRIVATE_KEY_PATH)
 
     server = grpc.aio.server()
 
-    async with UserRepository() as user_rep, TokensClient() as tokens_clt:
+    if SESSION_STORE == "memory":
+        session_store = MemorySessionStore()
+    else:
+        session_store = RedisSessionStore()
+
+    async with PostgresPool() as db_pool, UserRepository(db_pool) as user_rep, TokensClient() as tokens_clt, session_store, PasswordHasher() as password_hasher, GroupPermissionIndex() as group_permission_index:
 
-        add_AccountServiceServicer_to_server(
-            AccountService(user_rep, tokens_clt), server
+        account_service = AccountService(
+            user_rep,
+            tokens_clt,
+            session_store,
+            password_hasher,
+            group_permission_index,
+            jwt_keys,
         )
+        await account_service.load_permission_registry()
+
+        add_AccountServiceServicer_to_server(account_service, server)
         server.add_insecure_port(
             f"[::]:{os.environ.get("ACCOUNT_SERVICE_PORT", 50051)}"
         )
@@ -0,0 +1,151 @@
+# Latency of CheckPermissions calls served by the same event loop while logins hash passwords
+# Run from the account service directory: python -m benchmarks.check_permissions_during_logins_benchmark
+import asyncio
+import statistics
+import time
+import uuid
+
+from grpc_build.account_service_pb2 import CheckPermissionsRequest
+
+from account_service import AccountService, create_token
+from clients.memory.session_store import MemorySessionStore
+from clients.redis.tokens_client import TokensClient
+from common.crypto.password_hasher import PasswordHasher, pwd_context
+from common.permissions.permission_registry import PermissionRegistry
+from lib.jwt_keys import JwtKeys, generate_private_key
+
+
+CONCURRENT_LOGINS = 8
+LOGINS_COUNT = 64
+CHECKS_PER_SECOND = 500
+
+PASSWORD = "benchmark-password"
+PERMISSION_NAMES = ["GET_USER", "CREATE_USER", "UPDATE_USER", "DELETE_USER"]
+
+
+class BenchmarkUserRepository:
+    # Only the permission names are read by CheckPermissions
+    async def get_permission_names(self) -> list[str]:
+        return PERMISSION_NAMES
+
+
+async def inline_login(hashed_password: str):
+    # Auth reads the user before the hash, the loop can switch there
+    await asyncio.sleep(0)
+    pwd_context.verify_and_update(PASSWORD, hashed_password)
+
+
+async def pooled_login(password_hasher: PasswordHasher, hashed_password: str):
+    await password_hasher.verify_and_update(PASSWORD, hashed_password)
+
+
+async def measure_checks(
+    account_service: AccountService, access_token: str, stop: asyncio.Future
+) -> list[float]:
+    # No token is revoked, so the blacklist is answered by the in-memory filter
+    # and a check costs the token decode and the permission lookup.
+    # Checks arrive at a fixed rate and are timed from their arrival, so the time
+    # spent waiting for a loop blocked by a login is counted
+    request = CheckPermissionsRequest(
+        access_token=access_token, permission=PERMISSION_NAMES[0]
+    )
+    interval = 1 / CHECKS_PER_SECOND
+
+    async def check(arrived_at: float) -> float:
+        resp = await account_service.CheckPermissions(request, None)
+        if resp.code != 200:
+            raise RuntimeError(f"CheckPermissions failed : {resp.message}")
+        return time.perf_counter() - arrived_at
+
+    # Every check is a task of its own, as concurrent requests are,
+    # checks arrived before the logins ended are served after the loop is freed
+    checks = []
+    arrived_at = time.perf_counter() + interval
+    while not stop.done() or arrived_at <= stop.result():
+        await asyncio.sleep(max(0.0, arrived_at - time.perf_counter()))
+        # All checks arrived while the loop was blocked start at once
+        now = time.perf_counter()
+        while arrived_at <= now:
+            checks.append(asyncio.create_task(check(arrived_at)))
+            arrived_at += interval
+    return await asyncio.gather(*checks)
+
+
+async def run_logins(login, *args):
+    slots = asyncio.Semaphore(CONCURRENT_LOGINS)
+
+    async def limited_login():
+        async with slots:
+            await login(*args)
+
+    await asyncio.gather(*[limited_login() for _ in range(LOGINS_COUNT)])
+
+
+def print_latencies(title: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"  {title}, median : {statistics.median(latencies) * 1e3:.2f} ms")
+    print(f"  {title}, p99    : {p99 * 1e3:.2f} ms")
+    print(f"  {title}, max    : {latencies[-1] * 1e3:.2f} ms")
+
+
+async def measure(
+    name: str, account_service: AccountService, access_token: str, login, *args
+):
+    stop = asyncio.get_running_loop().create_future()
+    checks = asyncio.create_task(measure_checks(account_service, access_token, stop))
+
+    started_at = time.perf_counter()
+    await run_logins(login, *args)
+    elapsed = time.perf_counter() - started_at
+
+    stop.set_result(time.perf_counter())
+    latencies = await checks
+
+    print(f"{name}")
+    print(f"  Logins per second                : {LOGINS_COUNT / elapsed:.1f}")
+    print(f"  Checks served                    : {len(latencies)}")
+    print_latencies("CheckPermissions latency", latencies)
+
+
+async def main():
+    hashed_password = pwd_context.hash(PASSWORD)
+    jwt_keys = JwtKeys(generate_private_key())
+
+    async with PasswordHasher() as password_hasher:
+        account_service = AccountService(
+            BenchmarkUserRepository(),
+            TokensClient(),
+            MemorySessionStore(),
+            password_hasher,
+            None,
+            jwt_keys,
+        )
+        await account_service.load_permission_registry()
+        access_token = create_token(
+            jwt_keys,
+            str(uuid.uuid4()),
+            uuid.uuid4().hex,
+            set(PERMISSION_NAMES),
+            PermissionRegistry(PERMISSION_NAMES),
+        )
+
+        await measure(
+            "bcrypt on the event loop",
+            account_service,
+            access_token,
+            inline_login,
+            hashed_password,
+        )
+        await measure(
+            "bcrypt in the process pool",
+            account_service,
+            access_token,
+            pooled_login,
+            password_hasher,
+            hashed_password,
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+# Lookup cost of the revoked tokens filter filled with 1M revoked tokens
+# Run from the account service directory: python -m benchmarks.revoked_tokens_filter_benchmark
+import hashlib
+import time
+import uuid
+
+from lib.bloom_filter import RotatingBloomFilter
+
+
+REVOKED_TOKENS_COUNT = 1_000_000
+LOOKUPS_COUNT = 200_000
+
+
+def random_token_hash() -> str:
+    return hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+
+
+def measure_lookups(revoked_tokens_filter: RotatingBloomFilter, token_hashes: list[str]):
+    hits = 0
+    started_at = time.perf_counter()
+    for revoked_token_hash in token_hashes:
+        if revoked_token_hash in revoked_tokens_filter:
+            hits += 1
+    elapsed = time.perf_counter() - started_at
+    return elapsed / len(token_hashes), hits
+
+
+if __name__ == "__main__":
+    revoked_tokens_filter = RotatingBloomFilter(capacity=REVOKED_TOKENS_COUNT)
+
+    revoked_hashes = [random_token_hash() for _ in range(REVOKED_TOKENS_COUNT)]
+    started_at = time.perf_counter()
+    for revoked_hash in revoked_hashes:
+        revoked_tokens_filter.add(revoked_hash)
+    insert_time = time.perf_counter() - started_at
+
+    valid_hashes = [random_token_hash() for _ in range(LOOKUPS_COUNT)]
+
+    valid_lookup_time, false_positives = measure_lookups(
+        revoked_tokens_filter, valid_hashes
+    )
+    revoked_lookup_time, _ = measure_lookups(
+        revoked_tokens_filter, revoked_hashes[:LOOKUPS_COUNT]
+    )
+
+    print(f"Revoked tokens                : {REVOKED_TOKENS_COUNT}")
+    print(f"Insert, per token             : {insert_time / REVOKED_TOKENS_COUNT * 1e6:.2f} us")
+    print(f"Lookup of valid token         : {valid_lookup_time * 1e6:.2f} us")
+    print(f"Lookup of revoked token       : {revoked_lookup_time * 1e6:.2f} us")
+    print(f"False positive rate           : {false_positives / LOOKUPS_COUNT:.5f}")
+    print(
+        "Valid tokens reaching Redis   : "
+        f"{false_positives} of {LOOKUPS_COUNT}, instead of every lookup"
+    )
@@ -0,0 +1,68 @@
+import time
+
+
+# Sessions are kept by a single process and lost on restart, for local runs only
+class MemorySessionStore:
+    def __init__(self):
+        # (user id, session id) -> (refresh token hash, expiration time)
+        self._sessions: dict[tuple[str, str], tuple[str, int]] = {}
+        self._next_cleanup_size = 1024
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        self._sessions.clear()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    def _get(self, key: tuple[str, str]) -> str | None:
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+
+        refresh_token_hash, expires_at = session
+        if expires_at <= time.time():
+            del self._sessions[key]
+            return None
+        return refresh_token_hash
+
+    def _remove_expired_sessions(self):
+        now = time.time()
+        self._sessions = {
+            key: session
+            for key, session in self._sessions.items()
+            if session[1] > now
+        }
+        self._next_cleanup_size = max(1024, len(self._sessions) * 2)
+
+    async def create(
+        self, user_id: str, session_id: str, refresh_token_hash: str, expires_at: int
+    ):
+        if len(self._sessions) >= self._next_cleanup_size:
+            self._remove_expired_sessions()
+        self._sessions[(user_id, session_id)] = (refresh_token_hash, expires_at)
+
+    async def rotate(
+        self,
+        user_id: str,
+        session_id: str,
+        old_refresh_token_hash: str,
+        refresh_token_hash: str,
+        expires_at: int,
+    ) -> bool:
+        key = (user_id, session_id)
+        if self._get(key) != old_refresh_token_hash:
+            return False
+        self._sessions[key] = (refresh_token_hash, expires_at)
+        return True
+
+    async def remove(self, user_id: str, session_id: str) -> str | None:
+        refresh_token_hash = self._get((user_id, session_id))
+        self._sessions.pop((user_id, session_id), None)
+        return refresh_token_hash
@@ -0,0 +1,71 @@
+import redis.asyncio
+
+from clients.redis.tokens_client import REDIS_URL
+
+
+SESSION_PREFIX = "session:"
+
+# Replaces the refresh token hash only if it is still the one being rotated,
+# so one refresh token can not be used twice by concurrent requests
+ROTATE_SESSION_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    redis.call("SET", KEYS[1], ARGV[2], "EXAT", ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def session_key(user_id: str, session_id: str) -> str:
+    return f"{SESSION_PREFIX}{user_id}:{session_id}"
+
+
+class RedisSessionStore:
+    def __init__(self, redis_url: str = REDIS_URL, redis_db: str = "1"):
+        self._redis_url = f"{redis_url}/{redis_db}"
+        self._redis_client: redis.asyncio.Redis | None = None
+        self._rotate_session = None
+
+    async def connect(self):
+        self._redis_client = redis.asyncio.from_url(
+            self._redis_url, decode_responses=True
+        )
+        self._rotate_session = self._redis_client.register_script(
+            ROTATE_SESSION_SCRIPT
+        )
+
+    async def disconnect(self):
+        await self._redis_client.aclose()
+        self._redis_client = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def create(
+        self, user_id: str, session_id: str, refresh_token_hash: str, expires_at: int
+    ):
+        await self._redis_client.set(
+            session_key(user_id, session_id), refresh_token_hash, exat=expires_at
+        )
+
+    async def rotate(
+        self,
+        user_id: str,
+        session_id: str,
+        old_refresh_token_hash: str,
+        refresh_token_hash: str,
+        expires_at: int,
+    ) -> bool:
+        return bool(
+            await self._rotate_session(
+                keys=[session_key(user_id, session_id)],
+                args=[old_refresh_token_hash, refresh_token_hash, expires_at],
+            )
+        )
+
+    async def remove(self, user_id: str, session_id: str) -> str | None:
+        return await self._redis_client.getdel(session_key(user_id, session_id))
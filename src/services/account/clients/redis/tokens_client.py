@@ -1,41 +1,177 @@
+import asyncio
+import hashlib
+import os
+import time
+
+import redis.asyncio
+from jose import jwt
+
+from lib.bloom_filter import RotatingBloomFilter
+
+
+REDIS_URL = (
+    f"redis://"
+    f"{os.environ.get("REDIS_HOST", "localhost")}"
+    f":"
+    f"{os.environ.get("REDIS_PORT", "6379")}"
+)
+
+# Revoked access tokens older than this are already expired, so the feed can drop them
+REVOKED_TOKENS_FEED_RETENTION = int(
+    os.environ.get("REVOKED_TOKENS_FEED_RETENTION", "1800")
+)
+REVOKED_TOKENS_FEED_BATCH_SIZE = int(
+    os.environ.get("REVOKED_TOKENS_FEED_BATCH_SIZE", "1000")
+)
+REVOKED_TOKENS_FILTER_SYNC_INTERVAL = float(
+    os.environ.get("REVOKED_TOKENS_FILTER_SYNC_INTERVAL", "1")
+)
+
+TOKENS_PAIR_PREFIX = "tokens_pair:"
+TOKENS_BLACKLIST_PREFIX = "tokens_blacklist:"
+REVOKED_TOKENS_FEED = "revoked_tokens"
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_expiration(token: str) -> int:
+    return jwt.get_unverified_claims(token)["exp"]
+
+
 class TokensClient:
-    def __init__(self):
-        self._tokens_blacklist = set()
-        self._tokes_pairs = {}
+    def __init__(self, redis_url: str = REDIS_URL, redis_db: str = "1"):
+        self._redis_url = f"{redis_url}/{redis_db}"
+        self._redis_client: redis.asyncio.Redis | None = None
+
+        # In-memory front of the blacklist, gives definite "not revoked" answers
+        self._revoked_tokens_filter = RotatingBloomFilter()
+        self._revoked_tokens_filter_cursor = ""
+        self._revoked_tokens_filter_sync_task: asyncio.Task | None = None
 
     async def connect(self):
-        pass
+        self._redis_client = redis.asyncio.from_url(
+            self._redis_url, decode_responses=True
+        )
+        await self._rebuild_revoked_tokens_filter()
+        self._revoked_tokens_filter_sync_task = asyncio.create_task(
+            self._sync_revoked_tokens_filter()
+        )
 
     async def disconnect(self):
-        pass
+        self._revoked_tokens_filter_sync_task.cancel()
+        try:
+            await self._revoked_tokens_filter_sync_task
+        except asyncio.CancelledError:
+            pass
+        await self._redis_client.aclose()
+        self._redis_client = None
+
+    async def _rebuild_revoked_tokens_filter(self):
+        # Feed position is taken before the scan, so nothing revoked meanwhile is lost
+        last_entries = await self._redis_client.xrevrange(
+            REVOKED_TOKENS_FEED, count=1
+        )
+        if last_entries:
+            self._revoked_tokens_filter_cursor = last_entries[0][0]
+
+        async for key in self._redis_client.scan_iter(
+            match=f"{TOKENS_BLACKLIST_PREFIX}*", count=1000
+        ):
+            self._revoked_tokens_filter.add(key.removeprefix(TOKENS_BLACKLIST_PREFIX))
+
+    async def _sync_revoked_tokens_filter(self):
+        # Picks up tokens revoked by other replicas
+        while True:
+            await asyncio.sleep(REVOKED_TOKENS_FILTER_SYNC_INTERVAL)
+            try:
+                while True:
+                    cursor, revoked_tokens = await self.get_revoked_tokens(
+                        self._revoked_tokens_filter_cursor
+                    )
+                    for revoked_token_hash, _ in revoked_tokens:
+                        self._revoked_tokens_filter.add(revoked_token_hash)
+                    self._revoked_tokens_filter_cursor = cursor
+
+                    if len(revoked_tokens) < REVOKED_TOKENS_FEED_BATCH_SIZE:
+                        break
+            except redis.RedisError as ex:
+                print(f"Can not sync revoked tokens filter : {ex}")
 
-    def __del__(self):
-        pass
-    
     async def __aenter__(self):
         await self.connect()
         return self
-    
+
     async def __aexit__(self, exc_type, exc_value, traceback):
         await self.disconnect()
 
     async def update_tokens_pair(self, access_token: str, refresh_token: str):
-        self._tokes_pairs.update({refresh_token: access_token})
+        now = int(time.time())
+        access_token_expiration = token_expiration(access_token)
 
-    async def _add_access_token_to_blacklist(self, access_token: str):
-        self._tokens_blacklist.add(access_token)
+        await self._redis_client.set(
+            f"{TOKENS_PAIR_PREFIX}{token_hash(refresh_token)}",
+            f"{token_hash(access_token)}:{access_token_expiration}",
+            ex=max(token_expiration(refresh_token) - now, 1),
+        )
 
-    async def _get_access_token(self, refresh_token: str):
-        return self._tokes_pairs.get(refresh_token, None)
+    async def is_access_token_in_black_list(self, access_token: str):
+        access_token_hash = token_hash(access_token)
 
-    async def _remove_tokens_pair(self, refresh_token: str):
-        self._tokes_pairs.pop(refresh_token, None)
+        if access_token_hash not in self._revoked_tokens_filter:
+            return False
 
-    async def is_access_token_in_black_list(self, access_token: str):
-        return access_token in self._tokens_blacklist
+        return bool(
+            await self._redis_client.exists(
+                f"{TOKENS_BLACKLIST_PREFIX}{access_token_hash}"
+            )
+        )
 
     async def block_old_tokens_pair(self, refresh_token: str):
-        old_access_token = await self._get_access_token(refresh_token)
-        await self._add_access_token_to_blacklist(old_access_token)
-        await self._remove_tokens_pair(refresh_token)
+        await self.block_tokens_pair(token_hash(refresh_token))
+
+    async def block_tokens_pair(self, refresh_token_hash: str):
+        tokens_pair = await self._redis_client.getdel(
+            f"{TOKENS_PAIR_PREFIX}{refresh_token_hash}"
+        )
+        if tokens_pair is None:
+            return
+
+        access_token_hash, access_token_expiration = tokens_pair.split(":")
+        now = int(time.time())
+        remaining_lifetime = int(access_token_expiration) - now
+        if remaining_lifetime <= 0:
+            return
+
+        async with self._redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(
+                f"{TOKENS_BLACKLIST_PREFIX}{access_token_hash}",
+                1,
+                ex=remaining_lifetime,
+            )
+            pipe.xadd(
+                REVOKED_TOKENS_FEED,
+                {
+                    "token_hash": access_token_hash,
+                    "expires_at": access_token_expiration,
+                },
+                minid=f"{(now - REVOKED_TOKENS_FEED_RETENTION) * 1000}-0",
+                approximate=True,
+            )
+            await pipe.execute()
+
+        self._revoked_tokens_filter.add(access_token_hash)
+
+    async def get_revoked_tokens(self, cursor: str) -> tuple[str, list[tuple[str, int]]]:
+        entries = await self._redis_client.xrange(
+            REVOKED_TOKENS_FEED,
+            min=f"({cursor}" if cursor else "-",
+            count=REVOKED_TOKENS_FEED_BATCH_SIZE,
+        )
+        if not entries:
+            return cursor, []
 
+        return entries[-1][0], [
+            (fields["token_hash"], int(fields["expires_at"])) for _, fields in entries
+        ]
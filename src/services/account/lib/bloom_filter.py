@@ -0,0 +1,78 @@
+import math
+import os
+import time
+
+
+REVOKED_TOKENS_FILTER_CAPACITY = int(
+    os.environ.get("REVOKED_TOKENS_FILTER_CAPACITY", "1000000")
+)
+REVOKED_TOKENS_FILTER_ERROR_RATE = float(
+    os.environ.get("REVOKED_TOKENS_FILTER_ERROR_RATE", "0.001")
+)
+# Must be not less than the access token lifetime
+REVOKED_TOKENS_FILTER_ROTATION_INTERVAL = float(
+    os.environ.get("REVOKED_TOKENS_FILTER_ROTATION_INTERVAL", "1800")
+)
+
+
+class BloomFilter:
+    # Items are expected to be hex encoded sha256 digests, so their halves are used as hashes
+    def __init__(self, capacity: int, error_rate: float):
+        self._size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self._hash_count = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _positions(self, item_hash: str):
+        first_hash = int(item_hash[:16], 16)
+        second_hash = int(item_hash[16:32], 16) | 1
+        return [
+            (first_hash + ind * second_hash) % self._size
+            for ind in range(self._hash_count)
+        ]
+
+    def add(self, item_hash: str):
+        for position in self._positions(item_hash):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item_hash: str) -> bool:
+        # Positions are computed lazily, most absent items are rejected after a couple of probes
+        bits = self._bits
+        position = int(item_hash[:16], 16) % self._size
+        step = (int(item_hash[16:32], 16) | 1) % self._size
+        for _ in range(self._hash_count):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + step) % self._size
+        return True
+
+
+class RotatingBloomFilter:
+    # Keeps two generations: an item lives for at least one rotation interval after
+    # insertion, after that it is dropped together with its generation
+    def __init__(
+        self,
+        capacity: int = REVOKED_TOKENS_FILTER_CAPACITY,
+        error_rate: float = REVOKED_TOKENS_FILTER_ERROR_RATE,
+        rotation_interval: float = REVOKED_TOKENS_FILTER_ROTATION_INTERVAL,
+    ):
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._rotation_interval = rotation_interval
+
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+
+    def _rotate_if_needed(self):
+        if time.monotonic() - self._rotated_at >= self._rotation_interval:
+            self._previous = self._current
+            self._current = BloomFilter(self._capacity, self._error_rate)
+            self._rotated_at = time.monotonic()
+
+    def add(self, item_hash: str):
+        self._rotate_if_needed()
+        self._current.add(item_hash)
+
+    def __contains__(self, item_hash: str) -> bool:
+        self._rotate_if_needed()
+        return item_hash in self._current or item_hash in self._previous
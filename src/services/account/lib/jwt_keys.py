@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+from jose import jwk
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+ALGORITHM = "RS256"
+
+# Value of the "typ" claim, refresh tokens are not accepted where access tokens are
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
+
+def generate_private_key() -> str:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+
+
+class JwtKeys:
+    # Signing key of the service and the public key set served to token verifiers
+    def __init__(self, private_key: str):
+        self.private_key = private_key
+
+        self.public_key = jwk.construct(private_key, ALGORITHM).public_key().to_dict()
+        self.key_id = hashlib.sha256(self.public_key["n"].encode()).hexdigest()[:16]
+        self.public_key.update({"kid": self.key_id, "use": "sig"})
+
+        self.jwks = json.dumps({"keys": [self.public_key]})
+
+
+def load_jwt_keys(key_path: str) -> JwtKeys:
+    # A key made up on start would invalidate all tokens on restart and between replicas,
+    # so the service does not start without the shared one
+    if not os.path.exists(key_path):
+        raise FileNotFoundError(
+            f"JWT private key not found at {key_path}, create it with python -m lib.jwt_keys"
+        )
+    with open(key_path) as key_file:
+        return JwtKeys(key_file.read())
+
+
+def create_key_file(key_path: str):
+    # An existing key is kept, tokens signed by it stay valid
+    if os.path.exists(key_path):
+        print(f"JWT private key found at {key_path}")
+        return
+
+    os.makedirs(os.path.dirname(key_path) or ".", exist_ok=True)
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as key_file:
+        key_file.write(generate_private_key())
+    print(f"JWT private key created at {key_path}")
+
+
+if __name__ == "__main__":
+    create_key_file(
+        os.environ.get("JWT_PRIVATE_KEY_PATH", "./keys/jwt_private_key.pem")
+    )
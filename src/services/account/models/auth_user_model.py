@@ -1,4 +1,3 @@
-from typing import Optional
 from pydantic import UUID4, BaseModel, ValidationError
 from asyncpg import Record
 
@@ -7,11 +6,16 @@ class AuthUserModel(BaseModel):
     id: UUID4
     username: str
     password: str
-    refresh_token: Optional[str]
 
     @classmethod
     def from_record(cls, data):
+        if data is None:
+            return None
         try:
             return cls.model_validate(dict(data))
         except ValidationError:
             return None
+
+
+class AuthUserWithGroupsModel(AuthUserModel):
+    group_ids: list[UUID4]
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from uuid import UUID
+
+import asyncpg
+
+from common.db.postgres_pool import DATABASE_URL
+
+
+GROUP_PERMISSION_CHANNEL = "group_permission_changed"
+
+GROUP_PERMISSION_INDEX_RECONNECT_INTERVAL = float(
+    os.environ.get("GROUP_PERMISSION_INDEX_RECONNECT_INTERVAL", "5")
+)
+
+
+class GroupPermissionIndex:
+    # Group id -> permission names, kept in memory and reloaded on NOTIFY from Postgres
+    def __init__(self, connection_string: str = DATABASE_URL):
+        self._connection_string = connection_string
+        self._conn: asyncpg.Connection | None = None
+        self._permissions: dict[UUID, frozenset[str]] = {}
+
+        self._reload_task: asyncio.Task | None = None
+        # Set by a notification, cleared when a reload starts
+        self._reload_pending = False
+        self._reconnect_task: asyncio.Task | None = None
+        self._closing = False
+
+    async def connect(self):
+        self._closing = False
+        await self._listen()
+
+    async def disconnect(self):
+        self._closing = True
+        for task in (self._reload_task, self._reconnect_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def _listen(self):
+        self._conn = await asyncpg.connect(self._connection_string)
+        self._conn.add_termination_listener(self._on_termination)
+        # Listening starts before loading, so changes made during the load are not lost
+        await self._conn.add_listener(GROUP_PERMISSION_CHANNEL, self._on_notification)
+        await self.reload()
+
+    async def reload(self):
+        rows = await self._conn.fetch(
+            "SELECT group_permission.group_id, array_agg(permission.name) AS permission_names FROM group_permission JOIN permission ON permission.id = group_permission.permission_id GROUP BY group_permission.group_id"
+        )
+        self._permissions = {
+            row["group_id"]: frozenset(row["permission_names"]) for row in rows
+        }
+
+    def _on_notification(self, conn, pid, channel, payload):
+        # A burst of notifications is served by a single reload, a change committed
+        # after the snapshot of the running reload is served by one more
+        self._reload_pending = True
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload_on_notification())
+
+    async def _reload_on_notification(self):
+        while self._reload_pending:
+            self._reload_pending = False
+            try:
+                await self.reload()
+            except (asyncpg.PostgresError, OSError) as ex:
+                print(f"Can not reload group permission index : {ex}")
+
+    def _on_termination(self, conn):
+        if not self._closing:
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        # Notifications sent while disconnected are lost, so the index is reloaded on reconnect
+        while True:
+            await asyncio.sleep(GROUP_PERMISSION_INDEX_RECONNECT_INTERVAL)
+            try:
+                await self._listen()
+                return
+            except (asyncpg.PostgresError, OSError) as ex:
+                print(f"Can not reconnect group permission index : {ex}")
+
+    def get_permissions(self, group_ids: list[UUID]) -> set[str]:
+        permissions = set()
+        for group_id in group_ids:
+            permissions |= self._permissions.get(group_id, frozenset())
+        return permissions
@@ -1,94 +1,63 @@
-import os
-import asyncpg
-
-from models.auth_user_model import AuthUserModel
-
-DATABASE_URL = (
-    f"postgresql://"
-    f"{os.environ.get("POSTGRES_USER", "postgres")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PASSWORD", "postgres")}"
-    "@"
-    f"{os.environ.get("POSTGRES_HOST", "localhost")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PORT", "5432")}"
-    "/"
-    f"{os.environ.get("POSTGRES_DB", "company")}"
+from common.db.postgres_repository import (
+    NIL_UUID,
+    PostgresRepository,
+    affected_rows,
 )
 
-class UserRepository:
-    def __init__(self, connection_string: str = DATABASE_URL):
-        self._connection_string = connection_string
-        self._db_pool: asyncpg.Pool | None = None
+from models.auth_user_model import AuthUserModel, AuthUserWithGroupsModel
+
 
-    async def connect(self):
-        self._db_pool = await asyncpg.create_pool(self._connection_string)
+GET_AUTH_USER_QUERY = "SELECT account.id, account.username, account.password, coalesce(array_agg(account_group.group_id) FILTER (WHERE account_group.group_id IS NOT NULL), '{}') AS group_ids FROM account LEFT JOIN account_group ON account_group.account_id = account.id WHERE account.username = $1 and account.is_active = TRUE GROUP BY account.id"
+GET_USER_BY_ID_QUERY = "SELECT account.id, account.username, account.password FROM account WHERE id = $1 and is_active = TRUE"
 
-    async def disconnect(self):
-        await self._db_pool.close()
-        self._db_pool = None
 
-    def __del__(self):
-        if self._db_pool is not None:
-            self._db_pool.close()
-    
-    async def __aenter__(self):
-        await self.connect()
-        return self
-    
-    async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.disconnect()
+class UserRepository(PostgresRepository):
+    _warm_up_queries = [
+        (GET_AUTH_USER_QUERY, ("",)),
+        (GET_USER_BY_ID_QUERY, (NIL_UUID,)),
+    ]
 
     async def get_user_by_username(self, username: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                return AuthUserModel.from_record(
-                    await conn.fetchrow(
-                        "SELECT account.id, account.username, account.password, account.refresh_token FROM account WHERE username = $1 and is_active = TRUE",
-                        username,
-                    )
-                )
+        return AuthUserModel.from_record(
+            await self._fetchrow(
+                "SELECT account.id, account.username, account.password FROM account WHERE username = $1 and is_active = TRUE",
+                username,
+            )
+        )
+
+    async def get_auth_user(self, username: str):
+        # One statement, so one round trip for the login
+        return AuthUserWithGroupsModel.from_record(
+            await self._fetchrow(GET_AUTH_USER_QUERY, username)
+        )
 
     async def get_user_by_id(self, user_id: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                return AuthUserModel.from_record(
-                    await conn.fetchrow(
-                        "SELECT account.id, account.username, account.password, account.refresh_token FROM account WHERE id = $1 and is_active = TRUE",
-                        user_id,
-                    )
-                )
-
-    async def remove_user_refresh_token(self, user_id: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                affected_columns = await conn.execute(
-                    "UPDATE company.public.account SET refresh_token = NULL WHERE id = $1 and is_active = TRUE",
+        return AuthUserModel.from_record(
+            await self._fetchrow(GET_USER_BY_ID_QUERY, user_id)
+        )
+
+    async def update_password(self, user_id: str, password: str):
+        return (
+            affected_rows(
+                await self._execute(
+                    "UPDATE company.public.account SET password = $2 WHERE id = $1 and is_active = TRUE",
                     user_id,
+                    password,
                 )
-                return bool(affected_columns.split(" ")[:-1])
-
-    async def update_refresh_token(self, user_id: str, refresh_token: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                affected_columns = await conn.execute(
-                    "UPDATE company.public.account SET refresh_token = $2 WHERE id = $1 and is_active = TRUE",
-                    user_id,
-                    refresh_token,
-                )
-                return bool(affected_columns.split(" ")[:-1])
-
-    async def get_permissions(self, username: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                rows = await conn.fetch(
-                    'SELECT permission.name AS permission_name FROM permission JOIN group_permission ON permission.id = group_permission.permission_id JOIN "group" ON group_permission.group_id = "group".id JOIN account_group ON account_group.group_id = "group".id JOIN account ON account_group.account_id = account.id WHERE account.username = $1 and account.is_active = TRUE',
-                    username,
-                )
-
-                return {row["permission_name"] for row in rows}
+            )
+            > 0
+        )
+
+    async def get_group_ids(self, user_id: str):
+        rows = await self._fetch(
+            "SELECT group_id FROM account_group WHERE account_id = $1",
+            user_id,
+        )
+        return [row["group_id"] for row in rows]
+
+    async def get_permission_names(self) -> list[str]:
+        # New permissions are appended, so bits of existing ones keep their positions
+        rows = await self._fetch(
+            "SELECT name FROM permission GROUP BY name ORDER BY min(created_at), name"
+        )
+        return [row["name"] for row in rows]
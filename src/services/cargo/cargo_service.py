@@ -1,5 +1,6 @@
 import asyncio
 import os
+import uuid
 import grpc
 from grpc import ServicerContext
 
@@ -8,18 +9,26 @@ from grpc_build.cargo_service_pb2_grpc import (
     add_CargoServiceServicer_to_server,
 )
 from repositories.cargo_repository import CargoRepository
+from common.db.postgres_pool import PostgresPool
 from grpc_build.cargo_service_pb2 import (
     CargoDataArray,
     CreateCargoRequest,
     CreateCargoResponse,
     GetCargoRequest,
     GetCargoResponse,
+    BatchGetCargosRequest,
+    BatchGetCargosResponse,
     GetUserCargosRequest,
     GetUserCargosResponse,
     UpdateCargoRequest,
     UpdateCargoResponse,
 )
 from models.cargo_models import CreateCargoModel, UpdateCargoModel
+from common.pagination.cursor import InvalidCursorError
+from common.pagination.stream import batched
+
+
+BATCH_GET_MAX_IDS = int(os.environ.get("BATCH_GET_MAX_IDS", "100"))
 
 
 class CargoService(CargoServiceServicer):
@@ -58,7 +67,7 @@ class CargoService(CargoServiceServicer):
             updating_cargo_model = UpdateCargoModel.from_grpc_message(
                 request.updating_cargo_data
             )
-            if updating_cargo_model is None:
+            if updating_cargo_model is not None:
                 updated_cargo_model = await self._cargo_rep.update_cargo(
                     cargo_id, updating_cargo_model
                 )
@@ -102,6 +111,36 @@ class CargoService(CargoServiceServicer):
         except Exception as ex:
             return GetCargoResponse(code=500, message=f"Error : {ex}, args : {ex.args}")
 
+    async def BatchGetCargos(
+        self, request: BatchGetCargosRequest, context: ServicerContext
+    ) -> BatchGetCargosResponse:
+        if len(request.cargo_ids) > BATCH_GET_MAX_IDS:
+            return BatchGetCargosResponse(
+                code=413, message=f"Batch get is limited to {BATCH_GET_MAX_IDS} ids"
+            )
+
+        try:
+            # Canonical form, so returned ids match the requested ones
+            cargo_ids = [str(uuid.UUID(cargo_id)) for cargo_id in request.cargo_ids]
+        except ValueError:
+            return BatchGetCargosResponse(code=400, message="Invalid cargo id")
+
+        try:
+            cargo_models = await self._cargo_rep.get_cargos_by_ids(cargo_ids)
+
+            return BatchGetCargosResponse(
+                code=200,
+                arr=CargoDataArray(
+                    cargo_data=[
+                        cargo_model.to_CargoData() for cargo_model in cargo_models
+                    ]
+                ),
+            )
+        except Exception as ex:
+            return BatchGetCargosResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
     async def GetUserCargos(
         self, request: GetUserCargosRequest, context: ServicerContext
     ) -> GetUserCargosResponse:
@@ -109,7 +148,13 @@ class CargoService(CargoServiceServicer):
             user_id = request.user_id
             page = request.page
 
-            cargo_models = await self._cargo_rep.get_user_cargos(user_id, page)
+            cursor = None
+            if request.HasField("cursor"):
+                cursor = request.cursor
+
+            cargo_models, next_cursor = await self._cargo_rep.get_user_cargos(
+                user_id, page, cursor
+            )
 
             return GetUserCargosResponse(
                 code=200,
@@ -118,19 +163,51 @@ class CargoService(CargoServiceServicer):
                         cargo_model.to_CargoData() for cargo_model in cargo_models
                     ]
                 ),
+                next_cursor=next_cursor,
             )
 
+        except InvalidCursorError:
+            return GetUserCargosResponse(code=400, message="Invalid cursor")
         except Exception as ex:
             return GetUserCargosResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
+    async def StreamUserCargos(
+        self, request: GetUserCargosRequest, context: ServicerContext
+    ):
+        try:
+            user_id = request.user_id
+
+            cursor = None
+            if request.HasField("cursor"):
+                cursor = request.cursor
+
+            async for cargo_models in batched(
+                self._cargo_rep.stream_user_cargos(user_id, cursor)
+            ):
+                yield GetUserCargosResponse(
+                    code=200,
+                    arr=CargoDataArray(
+                        cargo_data=[
+                            cargo_model.to_CargoData() for cargo_model in cargo_models
+                        ]
+                    ),
+                )
+
+        except InvalidCursorError:
+            yield GetUserCargosResponse(code=400, message="Invalid cursor")
+        except Exception as ex:
+            yield GetUserCargosResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
 
 async def serve():
 
     server = grpc.aio.server()
 
-    async with CargoRepository() as cargo_rep:
+    async with PostgresPool() as db_pool, CargoRepository(db_pool) as cargo_rep:
         add_CargoServiceServicer_to_server(CargoService(cargo_rep), server)
         server.add_insecure_port(f"[::]:{os.environ.get("CARGO_SERVICE_PORT", 50053)}")
         print(
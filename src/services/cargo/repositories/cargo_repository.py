@@ -1,190 +1,193 @@
 import os
-
-import asyncpg
-from pydantic import UUID4
+from typing import AsyncIterator
 
 from models.cargo_models import CargoModel, CreateCargoModel, UpdateCargoModel
+from common.db.postgres_pool import PostgresPool
+from common.db.postgres_repository import NIL_UUID, PostgresRepository
+from common.pagination.cursor import decode_created_at_cursor, encode_created_at_cursor
 
 
-DATABASE_URL = (
-    f"postgresql://"
-    f"{os.environ.get("POSTGRES_USER", "postgres")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PASSWORD", "postgres")}"
-    "@"
-    f"{os.environ.get("POSTGRES_HOST", "localhost")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PORT", "5432")}"
-    "/"
-    f"{os.environ.get("POSTGRES_DB", "company")}"
-)
-
 DB_PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", "1000"))
 
-
-class CargoRepository:
-    def __init__(
-        self, connection_string: str = DATABASE_URL, db_page_size: int = DB_PAGE_SIZE
-    ):
-        self._connection_string = connection_string
-        self._db_pool: asyncpg.Pool | None = None
+GET_CARGO_BY_ID_QUERY = """
+SELECT
+    c.id,
+    c.title,
+    c."type",
+    c."description",
+    c.creator_id,
+    c.weight,
+    d.id AS delivery_id,
+    d.state AS delivery_state
+FROM company.public.cargo c
+LEFT JOIN
+company.public.delivery d ON c.id = d.cargo_id
+WHERE c.id = $1
+"""
+
+GET_CARGOS_BY_IDS_QUERY = """
+SELECT
+    c.id,
+    c.title,
+    c."type",
+    c."description",
+    c.creator_id,
+    c.weight,
+    d.id AS delivery_id,
+    d.state AS delivery_state
+FROM company.public.cargo c
+LEFT JOIN
+company.public.delivery d ON c.id = d.cargo_id
+WHERE c.id = ANY($1::uuid[])
+"""
+
+
+def cargo_from_record(record) -> CargoModel:
+    cargo = dict(record)
+    cargo.pop("created_at", None)
+    delivery_id = cargo.pop("delivery_id")
+    delivery_state = cargo.pop("delivery_state")
+    if delivery_id is not None and delivery_state is not None:
+        return CargoModel.from_record(
+            {
+                **cargo,
+                "delivery": {
+                    "id": delivery_id,
+                    "state": delivery_state,
+                },
+            }
+        )
+    else:
+        return CargoModel.from_record(cargo)
+
+
+class CargoRepository(PostgresRepository):
+    _warm_up_queries = [(GET_CARGO_BY_ID_QUERY, (NIL_UUID,))]
+
+    def __init__(self, db_pool: PostgresPool, db_page_size: int = DB_PAGE_SIZE):
+        super().__init__(db_pool)
         self._db_page_size = db_page_size
 
-    async def connect(self):
-        self._db_pool = await asyncpg.create_pool(self._connection_string)
-
-    async def disconnect(self):
-        await self._db_pool.close()
-        self._db_pool = None
-    
-    def __del__(self):
-        if self._db_pool is not None:
-            self._db_pool.close()
-
-    async def __aenter__(self):
-        await self.connect()
-        return self
-    
-    async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.disconnect()
-
     async def create_cargo(self, create_cargo_model: CreateCargoModel) -> CargoModel:
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                cargo_dmp = create_cargo_model.model_dump(exclude_none=True)
-
-                created_cargo = await conn.fetchrow(
-                    f'INSERT INTO cargo (title, "type", "description", creator_id, weight) VALUES ($1, $2, $3, $4, $5)) RETURNING cargo.id, cargo."type", cargo."description", cargo.creator_id, cargo.weight',
-                    **cargo_dmp.values(),
-                )
-                return CargoModel.from_record(created_cargo)
+        created_cargo = await self._fetchrow(
+            'INSERT INTO cargo (title, "type", "description", creator_id, weight) VALUES ($1, $2, $3, $4, $5) RETURNING cargo.id, cargo.title, cargo."type", cargo."description", cargo.creator_id, cargo.weight',
+            create_cargo_model.title,
+            create_cargo_model.type,
+            create_cargo_model.description,
+            create_cargo_model.creator_id,
+            create_cargo_model.weight,
+        )
+        return CargoModel.from_record(created_cargo)
 
     async def get_cargo_by_id(self, cargo_id: str) -> CargoModel:
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                cargo_record = conn.fetchrow(
-                    """
-                    SELECT
-                        c.id,
-                        c.title,
-                        c.\"type\",
-                        c.\"description\",
-                        c.creator_id,
-                        c.weight,
-                        d.id AS delivery_id,
-                        d.state AS delivery_state
-                    FROM company.public.cargo c 
-                    LEFT JOIN 
-                    company.public.delivery d ON c.id = d.cargo_id
-                    WHERE c.id = $1
-                    """,
-                    cargo_id,
-                )
-                
-                if cargo_record is None:
-                    return cargo_record
-                
-                delivery_id = cargo_record.pop("delivery_id")
-                delivery_state = cargo_record.pop("delivery_state")
-                if delivery_id is not None and delivery_state is not None:
-                    return    CargoModel.from_record(
-                            {
-                                **row,
-                                "delivery": {
-                                    "id": delivery_id,
-                                    "state": delivery_state,
-                                },
-                            }
-                        )
-                    
-                else:
-                    return CargoModel.from_record(cargo_record)
-
-    async def get_user_cargos(self, user_id: str, page: int) -> list[CargoModel]:
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                rows = await conn.fetch(
-                    """
-                    SELECT 
-                        c.id,
-                        c.title,
-                        c.\"type\",
-                        c.\"description\",
-                        c.creator_id,
-                        c.weight,
-                        d.id AS delivery_id,
-                        d.state AS delivery_state
-                    FROM 
-                        company.public.cargo c
-                    LEFT JOIN 
-                        company.public.delivery d ON c.id = d.cargo_id
-                    WHERE 
-                        c.creator_id = $1
-                    LIMIT $2
-                    OFFSET $3
-                    """,
-                    user_id,
-                    self._db_page_size,
-                    page * self._db_page_size,
-                )
-
-                cargos_arr = []
-
-                for row in rows:
-                    row = dict(row)
-                    delivery_id = row.pop("delivery_id")
-                    delivery_state = row.pop("delivery_state")
-                    if delivery_id is not None and delivery_state is not None:
-                        cargos_arr.append(
-                            CargoModel.from_record(
-                                {
-                                    **row,
-                                    "delivery": {
-                                        "id": delivery_id,
-                                        "state": delivery_state,
-                                    },
-                                }
-                            )
-                        )
-                    else:
-                        cargos_arr.append(CargoModel.from_record(row))
-
-                return cargos_arr
+        cargo_record = await self._fetchrow(GET_CARGO_BY_ID_QUERY, cargo_id)
+
+        if cargo_record is None:
+            return cargo_record
+
+        return cargo_from_record(cargo_record)
+
+    async def get_cargos_by_ids(self, cargo_ids: list[str]) -> list[CargoModel]:
+        # Found cargos in the order of cargo_ids, read by one statement
+        cargos = {}
+        for row in await self._fetch(GET_CARGOS_BY_IDS_QUERY, cargo_ids):
+            cargos.setdefault(str(row["id"]), cargo_from_record(row))
+
+        return [
+            cargos[cargo_id]
+            for cargo_id in cargo_ids
+            if cargos.get(cargo_id) is not None
+        ]
+
+    def _user_cargos_query(
+        self,
+        user_id: str,
+        cursor: str | None,
+        page: int = 0,
+        limit: int | None = None,
+    ) -> tuple[str, list]:
+        # Cargos are paged by (created_at, id) keyset on idx_cargo_creator_id_created_at,
+        # offset pages are kept for old clients
+        args = [user_id]
+        keyset = ""
+        offset = ""
+        if cursor:
+            args.extend(decode_created_at_cursor(cursor))
+            keyset = "AND (created_at, id) > ($2, $3)"
+        elif page:
+            args.append(page * self._db_page_size)
+            offset = f"OFFSET ${len(args)}"
+
+        limit_str = ""
+        if limit is not None:
+            args.append(limit)
+            limit_str = f"LIMIT ${len(args)}"
+
+        return (
+            f"""
+            SELECT
+                c.id,
+                c.title,
+                c.\"type\",
+                c.\"description\",
+                c.creator_id,
+                c.weight,
+                c.created_at,
+                d.id AS delivery_id,
+                d.state AS delivery_state
+            FROM (
+                SELECT id, title, \"type\", \"description\", creator_id, weight, created_at
+                FROM company.public.cargo
+                WHERE creator_id = $1 {keyset}
+                ORDER BY created_at, id
+                {limit_str} {offset}
+            ) c
+            LEFT JOIN
+                company.public.delivery d ON c.id = d.cargo_id
+            ORDER BY c.created_at, c.id
+            """,
+            args,
+        )
+
+    async def get_user_cargos(
+        self, user_id: str, page: int, cursor: str | None = None
+    ) -> tuple[list[CargoModel], str | None]:
+        query, args = self._user_cargos_query(user_id, cursor, page, self._db_page_size)
+        rows = await self._fetch(query, *args)
+
+        next_cursor = None
+        if rows and len({row["id"] for row in rows}) == self._db_page_size:
+            next_cursor = encode_created_at_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+        return [cargo_from_record(row) for row in rows], next_cursor
+
+    async def stream_user_cargos(
+        self, user_id: str, cursor: str | None = None
+    ) -> AsyncIterator[CargoModel]:
+        # Every cargo from the cursor on, read by a server side cursor
+        query, args = self._user_cargos_query(user_id, cursor)
+        async for row in self._cursor(query, *args):
+            yield cargo_from_record(row)
 
     async def update_cargo(self, cargo_id: str, cargo: UpdateCargoModel) -> CargoModel:
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                if cargo is not None:
-                    cargo_dmp = cargo.model_dump(exclude_none=True)
-                    update_str = ",".join(
-                        [
-                            f"{key} = ${ind + 2}"
-                            for ind, key in enumerate(cargo_dmp.keys())
-                        ]
-                    )
-
-                    updated_cargo_record = await conn.fetchrow(
-                        f"UPDATE company.public.cargo SET {update_str} WHERE id = $1 RETURNING id, title, \"type\", \"description\", creator_id",
-                        cargo_id,
-                        *cargo_dmp.values(),
-                    )
-
-                    if updated_cargo_record is None:
-                        return None
-
-                    delivery_record = conn.fetchrow(
-                        "SELECT id, state FROM delivery WHERE cargo_id = $1", cargo_id
-                    )
-                    if delivery_record is not None:
-                        CargoModel.from_record(
-                            {**updated_cargo_record, "delivery": {**delivery_record}}
-                        )
-                    else:
-                        return CargoModel.from_record(updated_cargo_record)
-
-                else:
-                    return await self.get_cargo_by_id(cargo_id)
+        if cargo is None:
+            return await self.get_cargo_by_id(cargo_id)
+
+        cargo_dmp = cargo.model_dump(exclude_none=True)
+        if not cargo_dmp:  # Nothing to set, an empty SET is a syntax error
+            return await self.get_cargo_by_id(cargo_id)
+        update_str = ",".join(
+            [f'"{key}" = ${ind + 2}' for ind, key in enumerate(cargo_dmp.keys())]
+        )
+
+        # The delivery is joined by the same statement, no transaction is needed
+        updated_cargo_record = await self._fetchrow(
+            f"WITH updated AS (UPDATE company.public.cargo SET {update_str} WHERE id = $1 RETURNING id, title, \"type\", \"description\", creator_id, weight) SELECT updated.*, d.id AS delivery_id, d.state AS delivery_state FROM updated LEFT JOIN company.public.delivery d ON d.cargo_id = updated.id",
+            cargo_id,
+            *cargo_dmp.values(),
+        )
+
+        if updated_cargo_record is None:
+            return None
+
+        return cargo_from_record(updated_cargo_record)
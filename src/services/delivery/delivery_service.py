@@ -1,9 +1,11 @@
 import asyncio
 import os
+import uuid
 import grpc
 from grpc import ServicerContext
 
 from repositories.delivery_repository import DeliveryRepository
+from common.db.postgres_pool import PostgresPool
 
 from grpc_build.delivery_service_pb2_grpc import (
     DeliveryServiceServicer,
@@ -15,6 +17,8 @@ from grpc_build.delivery_service_pb2 import (
     DeliveryDataArray,
     GetDeliveryRequest,
     GetDeliveryResponse,
+    BatchGetDeliveriesRequest,
+    BatchGetDeliveriesResponse,
     SearchDeliveriesRequest,
     SearchDeliveriesResponse,
     UpdateDeliveryRequest,
@@ -25,6 +29,11 @@ from models.delivery_models import (
     SearchDeliveryModel,
     UpdateDeliveryModel,
 )
+from common.pagination.cursor import InvalidCursorError
+from common.pagination.stream import batched
+
+
+BATCH_GET_MAX_IDS = int(os.environ.get("BATCH_GET_MAX_IDS", "100"))
 
 
 class DeliveryService(DeliveryServiceServicer):
@@ -89,20 +98,90 @@ class DeliveryService(DeliveryServiceServicer):
                 request.searching_delivery_data
             )
 
-            deliveries = await self._delivery_rep.search_deliveries(page, search_model)
+            cursor = None
+            if request.HasField("cursor"):
+                cursor = request.cursor
+
+            deliveries, next_cursor = await self._delivery_rep.search_deliveries(
+                page, search_model, cursor
+            )
 
             return SearchDeliveriesResponse(
                 code=200,
                 deliveries=DeliveryDataArray(
                     arr=[delivery.to_DeliveryData() for delivery in deliveries]
                 ),
+                next_cursor=next_cursor,
             )
 
+        except InvalidCursorError:
+            return SearchDeliveriesResponse(code=400, message="Invalid cursor")
         except Exception as ex:
             return SearchDeliveriesResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
+    async def StreamDeliveries(
+        self,
+        request: SearchDeliveriesRequest,
+        context: ServicerContext,
+    ):
+        try:
+            search_model = SearchDeliveryModel.from_grpc_message(
+                request.searching_delivery_data
+            )
+
+            cursor = None
+            if request.HasField("cursor"):
+                cursor = request.cursor
+
+            async for deliveries in batched(
+                self._delivery_rep.stream_deliveries(search_model, cursor)
+            ):
+                yield SearchDeliveriesResponse(
+                    code=200,
+                    deliveries=DeliveryDataArray(
+                        arr=[delivery.to_DeliveryData() for delivery in deliveries]
+                    ),
+                )
+
+        except InvalidCursorError:
+            yield SearchDeliveriesResponse(code=400, message="Invalid cursor")
+        except Exception as ex:
+            yield SearchDeliveriesResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
+    async def BatchGetDeliveries(
+        self, request: BatchGetDeliveriesRequest, context: ServicerContext
+    ) -> BatchGetDeliveriesResponse:
+        if len(request.delivery_ids) > BATCH_GET_MAX_IDS:
+            return BatchGetDeliveriesResponse(
+                code=413, message=f"Batch get is limited to {BATCH_GET_MAX_IDS} ids"
+            )
+
+        try:
+            # Canonical form, so returned ids match the requested ones
+            delivery_ids = [
+                str(uuid.UUID(delivery_id)) for delivery_id in request.delivery_ids
+            ]
+        except ValueError:
+            return BatchGetDeliveriesResponse(code=400, message="Invalid delivery id")
+
+        try:
+            deliveries = await self._delivery_rep.get_deliveries_by_ids(delivery_ids)
+
+            return BatchGetDeliveriesResponse(
+                code=200,
+                deliveries=DeliveryDataArray(
+                    arr=[delivery.to_DeliveryData() for delivery in deliveries]
+                ),
+            )
+        except Exception as ex:
+            return BatchGetDeliveriesResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
     async def GetDelivery(
         self, request: GetDeliveryRequest, context: ServicerContext
     ) -> GetDeliveryResponse:
@@ -128,7 +207,7 @@ async def serve():
 
     server = grpc.aio.server()
 
-    async with DeliveryRepository() as delivery_rep:
+    async with PostgresPool() as db_pool, DeliveryRepository(db_pool) as delivery_rep:
         add_DeliveryServiceServicer_to_server(DeliveryService(delivery_rep), server)
         server.add_insecure_port(
             f"[::]:{os.environ.get("DELIVERY_SERVICE_PORT", 50054)}"
@@ -1,5 +1,5 @@
 import os
-import asyncpg
+from typing import AsyncIterator
 
 from models.delivery_models import (
     CreateDeliveryModel,
@@ -7,132 +7,134 @@ from models.delivery_models import (
     SearchDeliveryModel,
     UpdateDeliveryModel,
 )
+from common.db.postgres_pool import PostgresPool
+from common.db.postgres_repository import NIL_UUID, PostgresRepository
+from common.pagination.cursor import decode_created_at_cursor, encode_created_at_cursor
 
 
-DATABASE_URL = (
-    f"postgresql://"
-    f"{os.environ.get("POSTGRES_USER", "postgres")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PASSWORD", "postgres")}"
-    "@"
-    f"{os.environ.get("POSTGRES_HOST", "localhost")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PORT", "5432")}"
-    "/"
-    f"{os.environ.get("POSTGRES_DB", "company")}"
-)
-
 DB_PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", "1000"))
 
+GET_DELIVERY_BY_ID_QUERY = "SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id from company.public.delivery WHERE id = $1"
+GET_DELIVERIES_BY_IDS_QUERY = "SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id from company.public.delivery WHERE id = ANY($1::uuid[])"
 
-class DeliveryRepository:
-    def __init__(
-        self, connection_string: str = DATABASE_URL, db_page_size: int = DB_PAGE_SIZE
-    ):
-        self._connection_string = connection_string
-        self._db_pool: asyncpg.Pool | None = None
-        self._db_page_size = db_page_size
-
-    async def connect(self):
-        self._db_pool = await asyncpg.create_pool(self._connection_string)
 
-    async def disconnect(self):
-        await self._db_pool.close()
-        self._db_pool = None
+class DeliveryRepository(PostgresRepository):
+    _warm_up_queries = [(GET_DELIVERY_BY_ID_QUERY, (NIL_UUID,))]
 
-    def __del__(self):
-        if self._db_pool is not None:
-            self._db_pool.close()
-
-    async def __aenter__(self):
-        await self.connect()
-        return self
-    
-    async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.disconnect()
+    def __init__(self, db_pool: PostgresPool, db_page_size: int = DB_PAGE_SIZE):
+        super().__init__(db_pool)
+        self._db_page_size = db_page_size
 
     async def get_delivery_by_id(self, delivery_id: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                delivery_record = await conn.fetchrow(
-                    "SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id from company.public.delivery WHERE id = $1",
-                    delivery_id,
-                )
-                return DeliveryModel.from_record(delivery_record)
+        delivery_record = await self._fetchrow(GET_DELIVERY_BY_ID_QUERY, delivery_id)
+        return DeliveryModel.from_record(delivery_record)
+
+    async def get_deliveries_by_ids(self, delivery_ids: list[str]) -> list[DeliveryModel]:
+        # Found deliveries in the order of delivery_ids, read by one statement
+        deliveries = {
+            str(row["id"]): DeliveryModel.from_record(row)
+            for row in await self._fetch(GET_DELIVERIES_BY_IDS_QUERY, delivery_ids)
+        }
+
+        return [
+            deliveries[delivery_id]
+            for delivery_id in delivery_ids
+            if deliveries.get(delivery_id) is not None
+        ]
 
     async def create_delivery(self, delivery: CreateDeliveryModel):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                crated_delivery = conn.fetchrow(
-                    "INSERT INTO delivery VALUES (state, priority, sender_id, receiver_id, cargo_id) VALUES ('CREATED', $1, $2, $3, $4) RETURNING id, state, priority, sender_id, receiver_id, cargo_id, send_address_id, receive_address_id",
-                    delivery.priority,
-                    delivery.sender_id,
-                    delivery.receiver_id,
-                    delivery.cargo_id,
-                )
-                return DeliveryModel.from_record(crated_delivery)
-
-    async def search_deliveries(self, page: int, delivery: SearchDeliveryModel | None):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                if delivery is not None:
-                    delivery_dmp = delivery.model_dump(exclude_none=True)
-                    search_str = " and ".join(
-                        [
-                            f"{key} = ${ind + 3}"
-                            for ind, key in enumerate(delivery_dmp.keys())
-                        ]
-                    )
-                    if len(search_str):
-                        rows = await conn.fetch(
-                            f"SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id from company.public.delivery WHERE {search_str} LIMIT $1 OFFSET $2",
-                            self._db_page_size,
-                            page * self._db_page_size,
-                            *delivery_dmp.values(),
-                        )
-                    else:
-                        rows = await conn.fetch(
-                            f"SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id from company.public.delivery LIMIT $1 OFFSET $2",
-                            self._db_page_size,
-                            page * self._db_page_size,
-                        )
-                    return [DeliveryModel.from_record(row) for row in rows]
-                else:
-                    rows = await conn.fetch(
-                        f"SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id from company.public.delivery LIMIT $1 OFFSET $2",
-                        self._db_page_size,
-                        page * self._db_page_size,
-                    )
-                    return [DeliveryModel.from_record(row) for row in rows]
+        crated_delivery = await self._fetchrow(
+            "INSERT INTO delivery (state, priority, sender_id, receiver_id, cargo_id, send_address_id, receive_address_id) VALUES ('CREATED', $1, $2, $3, $4, $5, $6) RETURNING id, state, priority, sender_id, receiver_id, cargo_id, send_address_id, receive_address_id",
+            delivery.priority,
+            delivery.sender_id,
+            delivery.receiver_id,
+            delivery.cargo_id,
+            delivery.send_address_id,
+            delivery.receive_address_id,
+        )
+        return DeliveryModel.from_record(crated_delivery)
+
+    def _search_deliveries_query(
+        self,
+        delivery: SearchDeliveryModel | None,
+        cursor: str | None,
+        page: int = 0,
+        limit: int | None = None,
+    ) -> tuple[str, list]:
+        # Paged by (created_at, id) keyset, offset pages are kept for old clients
+        conditions = []
+        args = []
+        if delivery is not None:
+            for key, value in delivery.model_dump(exclude_none=True).items():
+                args.append(value)
+                conditions.append(f"{key} = ${len(args)}")
+
+        offset = ""
+        if cursor:
+            args.extend(decode_created_at_cursor(cursor))
+            conditions.append(f"(created_at, id) > (${len(args) - 1}, ${len(args)})")
+        elif page:
+            args.append(page * self._db_page_size)
+            offset = f"OFFSET ${len(args)}"
+
+        limit_str = ""
+        if limit is not None:
+            args.append(limit)
+            limit_str = f"LIMIT ${len(args)}"
+
+        where = f"WHERE {" and ".join(conditions)}" if conditions else ""
+        return (
+            f"SELECT id, state, priority, sender_id, receiver_id, cargo_id, bill_id, send_address_id, receive_address_id, created_at from company.public.delivery {where} ORDER BY created_at, id {limit_str} {offset}",
+            args,
+        )
+
+    async def search_deliveries(
+        self,
+        page: int,
+        delivery: SearchDeliveryModel | None,
+        cursor: str | None = None,
+    ):
+        query, args = self._search_deliveries_query(
+            delivery, cursor, page, self._db_page_size
+        )
+        rows = await self._fetch(query, *args)
+
+        next_cursor = None
+        if len(rows) == self._db_page_size:
+            next_cursor = encode_created_at_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+        return [DeliveryModel.from_record(row) for row in rows], next_cursor
+
+    async def stream_deliveries(
+        self, delivery: SearchDeliveryModel | None, cursor: str | None = None
+    ) -> AsyncIterator[DeliveryModel]:
+        # Every delivery from the cursor on, read by a server side cursor
+        query, args = self._search_deliveries_query(delivery, cursor)
+        async for row in self._cursor(query, *args):
+            yield DeliveryModel.from_record(row)
 
     async def update_delivery(
         self, delivery_id: str, delivery: UpdateDeliveryModel | None
     ):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                if delivery is not None:
-                    delivery_dmp = delivery.model_dump(exclude_none=True)
-
-                    update_str = ",".join(
-                        [
-                            f"{key} = ${ind + 2}"
-                            for ind, key in enumerate(delivery_dmp.keys())
-                        ]
-                    )
-
-                    if len(update_str):
-                        updated_delivery = await conn.fetchrow(
-                            f"UPDATE company.public.delivery SET {update_str} WHERE id = $1 RETURNING id, state, priority, sender_id, receiver_id, cargo_id, send_address_id, receive_address_id",
-                            delivery_id,
-                            *delivery_dmp.values(),
-                        )
-
-                        return DeliveryModel.from_record(updated_delivery)
-                    else:
-                        return await self.get_delivery_by_id(delivery_id)
-                else:
-                    return await self.get_delivery_by_id(delivery_id)
+        if delivery is not None:
+            delivery_dmp = delivery.model_dump(exclude_none=True)
+
+            update_str = ",".join(
+                [
+                    f"{key} = ${ind + 2}"
+                    for ind, key in enumerate(delivery_dmp.keys())
+                ]
+            )
+
+            if len(update_str):
+                updated_delivery = await self._fetchrow(
+                    f"UPDATE company.public.delivery SET {update_str} WHERE id = $1 RETURNING id, state, priority, sender_id, receiver_id, cargo_id, send_address_id, receive_address_id",
+                    delivery_id,
+                    *delivery_dmp.values(),
+                )
+
+                return DeliveryModel.from_record(updated_delivery)
+            else:
+                return await self.get_delivery_by_id(delivery_id)
+        else:
+            return await self.get_delivery_by_id(delivery_id)
@@ -27,6 +27,10 @@ from grpc_build.payment_service_pb2 import (
 )
 from models.item_models import ItemModel
 from repositories.delivery_repository import DeliveryRepository
+from common.db.postgres_pool import PostgresPool
+from common.db.mongo_client import MongoClient
+from common.pagination.cursor import InvalidCursorError
+from common.pagination.stream import batched
 from models.decimal_models import DecimalModel
 from models.delivery_models import DeliveryModel
 
@@ -171,8 +175,12 @@ class PaymentService(PaymentServiceServicer):
                 for search_string in request.search_strings
             ]
 
-            find_payments = await self._receipt_rep.search_receipts(
-                page, search_strings
+            cursor = None
+            if request.HasField("cursor"):
+                cursor = request.cursor
+
+            find_payments, next_cursor = await self._receipt_rep.search_receipts(
+                page, search_strings, cursor
             )
 
             return SearchPaymentsResponse(
@@ -180,12 +188,44 @@ class PaymentService(PaymentServiceServicer):
                 payments=StringArray(
                     arr=[json.dumps(find_payment) for find_payment in find_payments]
                 ),
+                next_cursor=next_cursor,
             )
+        except InvalidCursorError:
+            return SearchPaymentsResponse(code=400, message="Invalid cursor")
         except Exception as ex:
             return SearchPaymentsResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
+    async def StreamPayments(
+        self, request: SearchPaymentsRequest, context: ServicerContext
+    ):
+        try:
+            search_strings = [
+                ItemModel.from_grpc_message(search_string)
+                for search_string in request.search_strings
+            ]
+
+            cursor = None
+            if request.HasField("cursor"):
+                cursor = request.cursor
+
+            async for find_payments in batched(
+                self._receipt_rep.stream_receipts(search_strings, cursor)
+            ):
+                yield SearchPaymentsResponse(
+                    code=200,
+                    payments=StringArray(
+                        arr=[json.dumps(find_payment) for find_payment in find_payments]
+                    ),
+                )
+        except InvalidCursorError:
+            yield SearchPaymentsResponse(code=400, message="Invalid cursor")
+        except Exception as ex:
+            yield SearchPaymentsResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
     async def AddPaymentRule(
         self, request: AddPaymentRuleRequest, context: ServicerContext
     ) -> AddPaymentRuleResponse:
@@ -210,7 +250,7 @@ async def serve():
 
     server = grpc.aio.server()
 
-    async with PaymentRuleRepository() as payment_rule_rep, ReceiptRepository() as receipt_rep, DeliveryRepository() as delivery_rep:
+    async with PostgresPool() as db_pool, MongoClient() as mongo_client, PaymentRuleRepository(mongo_client) as payment_rule_rep, ReceiptRepository(mongo_client) as receipt_rep, DeliveryRepository(db_pool) as delivery_rep:
 
         add_PaymentServiceServicer_to_server(
             PaymentService(payment_rule_rep, receipt_rep, delivery_rep), server
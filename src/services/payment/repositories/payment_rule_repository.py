@@ -1,40 +1,20 @@
-import os
-from motor.motor_asyncio import (
-    AsyncIOMotorClient,
-    AsyncIOMotorDatabase,
-    AsyncIOMotorCollection,
-)
+from motor.motor_asyncio import AsyncIOMotorCollection
 
+from common.db.mongo_client import MongoClient
 from models.decimal_models import DecimalModel
 from models.cost_rule_models import CostRuleModel
 
-DATABASE_URL = (
-    f"mongodb://"
-    f"{os.environ.get("MONGO_HOST", "localhost")}"
-    ":"
-    f"{os.environ.get("MONGO_PORT", "27017")}"
-)
-
 
 class PaymentRuleRepository:
-    def __init__(self, connection_string: str = DATABASE_URL):
-        self._connection_string = connection_string
-        self._client: AsyncIOMotorClient | None = None
-        self._db: AsyncIOMotorDatabase | None = None
+    def __init__(self, mongo_client: MongoClient):
+        self._mongo_client = mongo_client
         self._collection: AsyncIOMotorCollection | None = None
 
     async def connect(self):
-        self._client = AsyncIOMotorClient(self._connection_string)
-        self._db = self._client["company"]
-        self._collection = self._db["cost_rule"]
+        self._collection = self._mongo_client.get_collection("cost_rule")
 
     async def disconnect(self):
-        self._client.close()
-        self._client = None
-
-    def __del__(self):
-        if self._client is not None:
-            self._client.close()
+        self._collection = None
 
     async def __aenter__(self):
         await self.connect()
@@ -1,42 +1,26 @@
 import os
-from motor.motor_asyncio import (
-    AsyncIOMotorClient,
-    AsyncIOMotorDatabase,
-    AsyncIOMotorCollection,
-)
+from typing import AsyncIterator
+from motor.motor_asyncio import AsyncIOMotorCollection
 import uuid
 
+from common.db.mongo_client import MONGO_CURSOR_BATCH_SIZE, MongoClient
+from common.pagination.cursor import InvalidCursorError, decode_cursor, encode_cursor
 from models.item_models import ItemModel
 
-DATABASE_URL = (
-    f"mongodb://"
-    f"{os.environ.get("MONGO_HOST", "localhost")}"
-    ":"
-    f"{os.environ.get("MONGO_PORT", "27017")}"
-)
 
 DB_PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", "1000"))
 
 class ReceiptRepository:
-    def __init__(self, connection_string: str = DATABASE_URL, page_size: int  = DB_PAGE_SIZE):
-        self._connection_string = connection_string
-        self._client: AsyncIOMotorClient | None = None
-        self._db: AsyncIOMotorDatabase | None = None
+    def __init__(self, mongo_client: MongoClient, page_size: int = DB_PAGE_SIZE):
+        self._mongo_client = mongo_client
         self._collection: AsyncIOMotorCollection | None = None
         self._page_size = page_size
 
     async def connect(self):
-        self._client = AsyncIOMotorClient(self._connection_string)
-        self._db = self._client["company"]
-        self._collection = self._db["receipt"]
+        self._collection = self._mongo_client.get_collection("receipt")
 
     async def disconnect(self):
-        self._client.close()
-        self._client = None
-
-    def __del__(self):
-        if self._client is not None:
-            self._client.close()
+        self._collection = None
 
     async def __aenter__(self):
         await self.connect()
@@ -53,16 +37,53 @@ class ReceiptRepository:
             return True
         return False
     
-    async def search_receipts(self, page: int, search_strings: list[ItemModel]) -> list[dict]:
-
+    @staticmethod
+    def _search_receipts_filter(
+        search_strings: list[ItemModel], cursor: str | None
+    ) -> dict:
         query_object = {
             "$or": [
                 {search_string.field: search_string.value}
                 for search_string in search_strings
             ]
         }
-        
-        resp = await self._collection.find(query_object).limit(page * self._page_size).limit(page).to_list()
-        
-        return resp
+        if cursor:
+            last_id = decode_cursor(cursor)
+            if len(last_id) != 1 or not isinstance(last_id[0], str):
+                raise InvalidCursorError(cursor)
+            query_object = {"$and": [query_object, {"_id": {"$gt": last_id[0]}}]}
+        return query_object
+
+    async def search_receipts(
+        self, page: int, search_strings: list[ItemModel], cursor: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        # Receipts are paged by _id keyset on the default _id index,
+        # skip pages are kept for old clients
+        query_object = self._search_receipts_filter(search_strings, cursor)
+        skip = 0 if cursor else page * self._page_size
+
+        resp = (
+            await self._collection.find(query_object)
+            .sort("_id", 1)
+            .skip(skip)
+            .limit(self._page_size)
+            .to_list()
+        )
+
+        next_cursor = None
+        if len(resp) == self._page_size:
+            next_cursor = encode_cursor([resp[-1]["_id"]])
+
+        return resp, next_cursor
 
+    async def stream_receipts(
+        self, search_strings: list[ItemModel], cursor: str | None = None
+    ) -> AsyncIterator[dict]:
+        # Every receipt from the cursor on, fetched in batches by the Motor cursor
+        query_object = self._search_receipts_filter(search_strings, cursor)
+        async for receipt in (
+            self._collection.find(query_object)
+            .sort("_id", 1)
+            .batch_size(MONGO_CURSOR_BATCH_SIZE)
+        ):
+            yield receipt
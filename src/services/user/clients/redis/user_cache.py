@@ -1,8 +1,16 @@
+import asyncio
+import json
+import math
 import os
-from pydantic import UUID4
+import random
+import struct
+import time
 import redis.asyncio
 
-from models.user_models import UpdateUserModel, UserModel
+from models.user_models import UserModel
+from google.protobuf.message import DecodeError
+from grpc_build.user_service_pb2 import UserData
+from common.cache.lru_cache import LRUCache
 
 
 REDIS_URL = (
@@ -12,21 +20,97 @@ REDIS_URL = (
     f"{os.environ.get("REDIS_PORT", "6379")}"
 )
 
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "300"))
+# Not found results are cached shortly, a created or reactivated user overwrites them
+USER_CACHE_NEGATIVE_TTL = int(os.environ.get("USER_CACHE_NEGATIVE_TTL", "30"))
+
+# In-process tier in front of Redis, short TTL bounds staleness if an invalidation is lost
+USER_LOCAL_CACHE_SIZE = int(os.environ.get("USER_LOCAL_CACHE_SIZE", "10000"))
+USER_LOCAL_CACHE_TTL = float(os.environ.get("USER_LOCAL_CACHE_TTL", "5"))
+
+# Entries are refreshed before expiration with a probability growing towards it (XFetch),
+# larger beta refreshes earlier
+USER_CACHE_EARLY_REFRESH_BETA = float(
+    os.environ.get("USER_CACHE_EARLY_REFRESH_BETA", "1")
+)
+
+# With the lock only one replica refills a key, others wait for it for a short time
+USER_CACHE_REFILL_LOCK = os.environ.get("USER_CACHE_REFILL_LOCK", "false") == "true"
+USER_CACHE_REFILL_LOCK_TTL = float(os.environ.get("USER_CACHE_REFILL_LOCK_TTL", "2"))
+USER_CACHE_REFILL_WAIT = float(os.environ.get("USER_CACHE_REFILL_WAIT", "0.5"))
+USER_CACHE_REFILL_POLL_INTERVAL = 0.05
+
+USER_CACHE_INVALIDATION_CHANNEL = "user_cache_invalidation"
+USER_CACHE_RESUBSCRIBE_INTERVAL = 1
+
+USER_CACHE_DELETE_BATCH_SIZE = 1000
+
+USER_PREFIX = "user:"
+USERNAME_PREFIX = "username:"
+REFILL_LOCK_PREFIX = "refill_lock:"
+
+# User entries start with the time spent to load them and their expiration time
+ENTRY_HEADER = struct.Struct("!dd")
+
+# Stored in place of a user that does not exist or is deactivated
+NOT_FOUND = b""
+
 
 class UserCache:
-    def __init__(self, redis_url: str = REDIS_URL, redis_db: str = "0"):
+    def __init__(
+        self,
+        redis_url: str = REDIS_URL,
+        redis_db: str = "0",
+        ttl: int = USER_CACHE_TTL,
+        negative_ttl: int = USER_CACHE_NEGATIVE_TTL,
+        local_cache_size: int = USER_LOCAL_CACHE_SIZE,
+        local_cache_ttl: float = USER_LOCAL_CACHE_TTL,
+        early_refresh_beta: float = USER_CACHE_EARLY_REFRESH_BETA,
+        refill_lock: bool = USER_CACHE_REFILL_LOCK,
+    ):
         self._redis_url = f"{redis_url}/{redis_db}"
         self._redis_client: redis.asyncio.Redis | None = None
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._early_refresh_beta = early_refresh_beta
+        self._refill_lock = refill_lock
+
+        self._local_cache = LRUCache(local_cache_size, local_cache_ttl)
+        self._invalidation_task: asyncio.Task | None = None
 
     async def connect(self):
         self._redis_client = redis.asyncio.from_url(self._redis_url)
+        self._invalidation_task = asyncio.create_task(self._listen_invalidations())
 
     async def disconnect(self):
-        self._redis_client.close()
+        self._invalidation_task.cancel()
+        try:
+            await self._invalidation_task
+        except asyncio.CancelledError:
+            pass
+        await self._redis_client.aclose()
+        self._redis_client = None
+
+    async def _listen_invalidations(self):
+        while True:
+            try:
+                async with self._redis_client.pubsub() as pubsub:
+                    await pubsub.subscribe(USER_CACHE_INVALIDATION_CHANNEL)
+                    # Invalidations published while unsubscribed are lost
+                    self._local_cache.clear()
+
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            user_id, username = json.loads(message["data"])
+                            self._drop_local_user(user_id, username)
+            except redis.RedisError as ex:
+                print(f"Can not listen user cache invalidations : {ex}")
+                await asyncio.sleep(USER_CACHE_RESUBSCRIBE_INTERVAL)
 
-    def __del__(self):
-        if self._redis_client is not None:
-            self._redis_client.close()
+    def _drop_local_user(self, user_id: str, username: str | None):
+        self._local_cache.pop(f"{USER_PREFIX}{user_id}")
+        if username is not None:
+            self._local_cache.pop(f"{USERNAME_PREFIX}{username}")
 
     async def __aenter__(self):
         await self.connect()
@@ -35,15 +119,218 @@ class UserCache:
     async def __aexit__(self, exc_type, exc_value, traceback):
         await self.disconnect()
 
-    
-    async def get_user_by_id(self, user_id: str):
-        resp = await self._redis_client.get(user_id)
-        if resp is not None:
-            return UserModel(**resp)
-        return None
-    
-    async def add_or_update_user(self, user: UserModel) -> bool:
-        return await self._redis_client.set(str(user.id), user.model_dump())
-    
-    async def del_user(self, user_id: str) -> bool:
-        return await self._redis_client.delete(user_id)
+    @staticmethod
+    def _encode_entry(payload: bytes, load_time: float, ttl: int) -> bytes:
+        return ENTRY_HEADER.pack(load_time, time.time() + ttl) + payload
+
+    @staticmethod
+    def _decode_user(payload: bytes) -> tuple[bool, UserModel | None]:
+        # Returns (is decoded, user), an entry that can not be decoded is not
+        # a cached "not found", callers drop it and read the database
+        if payload == NOT_FOUND:
+            return True, None
+        try:
+            user = UserModel.from_grpc_message(UserData.FromString(payload))
+        except DecodeError:
+            return False, None
+        return user is not None, user
+
+    def _should_refresh_early(self, load_time: float, expires_at: float) -> bool:
+        # 1 - random() is in (0, 1], so the logarithm is defined
+        return (
+            time.time()
+            - load_time * self._early_refresh_beta * math.log(1 - random.random())
+            >= expires_at
+        )
+
+    # Getters return (is cached, user), a cached user can be None if it was not found
+
+    async def get_user_by_id(self, user_id: str) -> tuple[bool, UserModel | None]:
+        key = f"{USER_PREFIX}{user_id}"
+        is_cached, user = self._local_cache.get(key)
+        if is_cached:
+            return True, user
+
+        resp = await self._redis_client.get(key)
+        if resp is None:
+            return False, None
+
+        load_time, expires_at = ENTRY_HEADER.unpack_from(resp)
+        if self._should_refresh_early(load_time, expires_at):
+            # Reported as a miss to this caller only, others keep using the entry
+            return False, None
+
+        is_decoded, user = self._decode_user(resp[ENTRY_HEADER.size :])
+        if not is_decoded:
+            await self._redis_client.delete(key)
+            return False, None
+        self._local_cache.put(key, user)
+        return True, user
+
+    async def get_users_by_ids(
+        self, user_ids: list[str]
+    ) -> dict[str, UserModel | None]:
+        # Cached users by id, local tier first, then one MGET for the rest
+        cached = {}
+        keys = []
+        for user_id in user_ids:
+            key = f"{USER_PREFIX}{user_id}"
+            is_cached, user = self._local_cache.get(key)
+            if is_cached:
+                cached[user_id] = user
+            else:
+                keys.append(key)
+
+        if not keys:
+            return cached
+
+        undecodable_keys = []
+        for key, resp in zip(keys, await self._redis_client.mget(keys)):
+            if resp is None:
+                continue
+            load_time, expires_at = ENTRY_HEADER.unpack_from(resp)
+            if self._should_refresh_early(load_time, expires_at):
+                continue
+
+            is_decoded, user = self._decode_user(resp[ENTRY_HEADER.size :])
+            if not is_decoded:
+                undecodable_keys.append(key)
+                continue
+            self._local_cache.put(key, user)
+            cached[key[len(USER_PREFIX) :]] = user
+
+        if undecodable_keys:
+            await self._redis_client.delete(*undecodable_keys)
+        return cached
+
+    async def wait_for_user_by_id(self, user_id: str) -> tuple[bool, UserModel | None]:
+        # Used when another replica holds the refill lock of the user
+        waited = 0.0
+        key = f"{USER_PREFIX}{user_id}"
+        while True:
+            resp = await self._redis_client.get(key)
+            if resp is not None:
+                is_decoded, user = self._decode_user(resp[ENTRY_HEADER.size :])
+                if not is_decoded:
+                    await self._redis_client.delete(key)
+                return is_decoded, user
+            if waited >= USER_CACHE_REFILL_WAIT:
+                return False, None
+            await asyncio.sleep(USER_CACHE_REFILL_POLL_INTERVAL)
+            waited += USER_CACHE_REFILL_POLL_INTERVAL
+
+    async def acquire_refill_lock(self, user_id: str) -> bool:
+        if not self._refill_lock:
+            return True
+        return bool(
+            await self._redis_client.set(
+                f"{REFILL_LOCK_PREFIX}{USER_PREFIX}{user_id}",
+                1,
+                nx=True,
+                px=int(USER_CACHE_REFILL_LOCK_TTL * 1000),
+            )
+        )
+
+    async def release_refill_lock(self, user_id: str):
+        if self._refill_lock:
+            await self._redis_client.delete(
+                f"{REFILL_LOCK_PREFIX}{USER_PREFIX}{user_id}"
+            )
+
+    async def get_user_by_username(
+        self, username: str
+    ) -> tuple[bool, UserModel | None]:
+        key = f"{USERNAME_PREFIX}{username}"
+        is_cached, user_id = self._local_cache.get(key)
+        if not is_cached:
+            user_id = await self._redis_client.get(key)
+            if user_id is None:
+                return False, None
+            self._local_cache.put(key, user_id)
+
+        if user_id == NOT_FOUND:
+            return True, None
+
+        is_cached, user = await self.get_user_by_id(user_id.decode())
+        # The username key outlives renames, so it is trusted only if it still matches
+        if not is_cached or user is None or user.username != username:
+            return False, None
+        return True, user
+
+    async def add_or_update_user(self, user: UserModel, load_time: float = 0.0):
+        async with self._redis_client.pipeline(transaction=False) as pipe:
+            pipe.set(
+                f"{USER_PREFIX}{user.id}",
+                self._encode_entry(
+                    user.to_UserData().SerializeToString(), load_time, self._ttl
+                ),
+                ex=self._ttl,
+            )
+            pipe.set(f"{USERNAME_PREFIX}{user.username}", str(user.id), ex=self._ttl)
+            await pipe.execute()
+
+    async def add_users_by_ids(
+        self,
+        users: list[UserModel],
+        missing_user_ids: list[str],
+        load_time: float = 0.0,
+    ):
+        # One round trip for the users and the ids not found by a batch get
+        async with self._redis_client.pipeline(transaction=False) as pipe:
+            for user in users:
+                pipe.set(
+                    f"{USER_PREFIX}{user.id}",
+                    self._encode_entry(
+                        user.to_UserData().SerializeToString(), load_time, self._ttl
+                    ),
+                    ex=self._ttl,
+                )
+                pipe.set(
+                    f"{USERNAME_PREFIX}{user.username}", str(user.id), ex=self._ttl
+                )
+            for user_id in missing_user_ids:
+                pipe.set(
+                    f"{USER_PREFIX}{user_id}",
+                    self._encode_entry(NOT_FOUND, load_time, self._negative_ttl),
+                    ex=self._negative_ttl,
+                )
+            await pipe.execute()
+
+    async def add_missing_user_by_id(self, user_id: str, load_time: float = 0.0):
+        await self._redis_client.set(
+            f"{USER_PREFIX}{user_id}",
+            self._encode_entry(NOT_FOUND, load_time, self._negative_ttl),
+            ex=self._negative_ttl,
+        )
+
+    async def add_missing_user_by_username(self, username: str):
+        await self._redis_client.set(
+            f"{USERNAME_PREFIX}{username}", NOT_FOUND, ex=self._negative_ttl
+        )
+
+    async def del_user(self, user_id: str, username: str | None = None) -> bool:
+        keys = [f"{USER_PREFIX}{user_id}"]
+        if username is not None:
+            keys.append(f"{USERNAME_PREFIX}{username}")
+        return bool(await self._redis_client.delete(*keys))
+
+    async def del_usernames(self, usernames: list[str]):
+        # Drops not found entries of imported usernames, local tiers expire them by TTL
+        async with self._redis_client.pipeline(transaction=False) as pipe:
+            for ind in range(0, len(usernames), USER_CACHE_DELETE_BATCH_SIZE):
+                pipe.unlink(
+                    *[
+                        f"{USERNAME_PREFIX}{username}"
+                        for username in usernames[
+                            ind : ind + USER_CACHE_DELETE_BATCH_SIZE
+                        ]
+                    ]
+                )
+            await pipe.execute()
+
+    async def invalidate_user(self, user_id: str, username: str | None = None):
+        # Called after writes, drops the user from the local caches of every replica
+        self._drop_local_user(user_id, username)
+        await self._redis_client.publish(
+            USER_CACHE_INVALIDATION_CHANNEL, json.dumps([user_id, username])
+        )
@@ -15,3 +15,12 @@ class GroupModel(BaseModel):
             return cls.model_validate(dict(data))
         except ValidationError:
             return None
+
+    @classmethod
+    def from_grpc_message(cls, grpc_message: GroupData):
+        try:
+            return cls.model_validate(
+                {desc.name: value for desc, value in grpc_message.ListFields()}
+            )
+        except ValidationError:
+            return None
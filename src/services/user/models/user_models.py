@@ -51,7 +51,13 @@ class CreateUserModel(BaseModel):
             create_user_data = {
                 desc.name: value for desc, value in grpc_message.ListFields()
             }
-            return UserModel(**create_user_data)
+
+            if "birth" in create_user_data:
+                create_user_data["birth"] = grpc_message.birth.ToDatetime()
+
+            create_user_data["groups_ids"] = list(grpc_message.groups_ids)
+
+            return CreateUserModel(**create_user_data)
         except ValidationError:
             return None
 
@@ -98,11 +104,31 @@ class UserModel(BaseModel):
 
     @classmethod
     def from_record(cls, data):
+        if data is None:
+            return None
         try:
             return cls.model_validate(dict(data))
         except ValidationError:
             return None
 
+    @classmethod
+    def from_grpc_message(cls, grpc_message: UserData):
+        try:
+            user_data = {
+                desc.name: value for desc, value in grpc_message.ListFields()
+            }
+
+            if "birth" in user_data:
+                user_data["birth"] = grpc_message.birth.ToDatetime()
+
+            user_data["groups"] = [
+                GroupModel.from_grpc_message(group) for group in grpc_message.groups
+            ]
+
+            return cls.model_validate(user_data)
+        except ValidationError:
+            return None
+
     def to_UserData(self) -> UserData:
         res = self.model_dump(exclude_none=True)
         res["id"] = str(res["id"])
@@ -1,4 +1,8 @@
 import os
+import time
+import uuid
+from datetime import datetime
+from typing import AsyncIterator
 import asyncpg
 
 from models.user_models import (
@@ -7,55 +11,79 @@ from models.user_models import (
     UpdateUserModel,
     UserModel,
 )
-from models.group_models import GroupModel
 from clients.redis.user_cache import UserCache
+from common.concurrency.single_flight import SingleFlight
+from common.db.postgres_pool import PostgresPool
+from common.db.postgres_repository import (
+    NIL_UUID,
+    PostgresRepository,
+    affected_rows,
+)
+from common.pagination.cursor import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+)
 
 
-DATABASE_URL = (
-    f"postgresql://"
-    f"{os.environ.get("POSTGRES_USER", "postgres")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PASSWORD", "postgres")}"
-    "@"
-    f"{os.environ.get("POSTGRES_HOST", "localhost")}"
-    ":"
-    f"{os.environ.get("POSTGRES_PORT", "5432")}"
-    "/"
-    f"{os.environ.get("POSTGRES_DB", "company")}"
+DB_PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", "1000"))
+
+IMPORT_ACCOUNT_COLUMNS = [
+    "import_row",
+    "id",
+    "username",
+    "password",
+    "first_name",
+    "second_name",
+    "patronymic",
+    "birth",
+    "email",
+    "phone",
+]
+
+
+# A user row with its groups aggregated, read by a single statement
+USER_WITH_GROUPS_COLUMNS = (
+    "account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone, "
+    "coalesce((SELECT json_agg(json_build_object('id', \"group\".id, 'name', \"group\".name)) FROM account_group JOIN \"group\" ON \"group\".id = account_group.group_id WHERE account_group.account_id = account.id), '[]') AS groups"
 )
 
-DB_PAGE_SIZE = int(os.environ.get("DB_PAGE_SIZE", "1000"))
+GET_USER_BY_ID_QUERY = f"SELECT {USER_WITH_GROUPS_COLUMNS} FROM account WHERE id = $1 and is_active = TRUE"
+GET_USER_BY_USERNAME_QUERY = f"SELECT {USER_WITH_GROUPS_COLUMNS} FROM account WHERE username = $1 and is_active = TRUE"
+GET_USERS_BY_IDS_QUERY = f"SELECT {USER_WITH_GROUPS_COLUMNS} FROM account WHERE id = ANY($1::uuid[]) and is_active = TRUE"
+
+
+def prefix_upper_bound(prefix: str) -> str | None:
+    # Smallest string greater than every string starting with prefix, in code point order
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    next_char = ord(prefix[-1]) + 1
+    if 0xD800 <= next_char <= 0xDFFF:  # Surrogates are not valid in text
+        next_char = 0xE000
+    return prefix[:-1] + chr(next_char)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 
+class UserRepository(PostgresRepository):
+    _warm_up_queries = [
+        (GET_USER_BY_ID_QUERY, (NIL_UUID,)),
+        (GET_USER_BY_USERNAME_QUERY, ("",)),
+    ]
 
-class UserRepository:
     def __init__(
         self,
-        connection_string: str = DATABASE_URL,
+        db_pool: PostgresPool,
         db_page_size: int = DB_PAGE_SIZE,
         cache_class: UserCache | None = None,
     ):
-        self._connection_string = connection_string
-        self._db_pool: asyncpg.Pool | None = None
+        super().__init__(db_pool)
         self._db_page_size = db_page_size
         self._cache = cache_class
-
-    async def connect(self):
-        self._db_pool = await asyncpg.create_pool(self._connection_string)
-
-    async def disconnect(self):
-        await self._db_pool.close()
-        self._db_pool = None
-
-    def __del__(self):
-        if self._db_pool is not None:
-            self._db_pool.close()
-
-    async def __aenter__(self):
-        await self.connect()
-        return self
-
-    async def __aexit__(self, exc_type, exc_value, traceback):
-        await self.disconnect()
+        self._single_flight = SingleFlight()
 
     async def _get_user_groups_by_user_id(self, conn: asyncpg.Connection, user_id: str):
         return await conn.fetch(
@@ -63,224 +91,424 @@ class UserRepository:
             user_id,
         )
 
-    async def _get_user_groups_by_username(
-        self, conn: asyncpg.Connection, username: str
+    async def _set_user_groups(
+        self, conn: asyncpg.Connection, user_id: str, group_ids: list[str]
     ):
+        # Single statement diff, memberships kept by the user are not touched,
+        # the data-modifying CTEs see the membership as it was before the statement
         return await conn.fetch(
-            'SELECT "group".id, "group".name from "group" join account_group on account_group.group_id = "group".id join account on account_group.account_id = account.id WHERE account.username = $1',
-            username,
+            'WITH removed AS (DELETE FROM account_group WHERE account_id = $1 and group_id <> ALL($2::uuid[])), '
+            "added AS (INSERT INTO account_group (account_id, group_id) SELECT $1, wanted.group_id FROM (SELECT DISTINCT unnest($2::uuid[]) AS group_id) AS wanted WHERE NOT EXISTS (SELECT 1 FROM account_group WHERE account_group.account_id = $1 and account_group.group_id = wanted.group_id)) "
+            'SELECT "group".id, "group".name FROM "group" WHERE "group".id = ANY($2::uuid[])',
+            user_id,
+            group_ids,
         )
 
-    async def search_users(self, page: int, first_name: str, second_name: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
+    def _search_users_query(
+        self,
+        first_name: str,
+        second_name: str,
+        cursor: str | None,
+        page: int = 0,
+        limit: int | None = None,
+    ) -> tuple[str, list]:
+        # Substring (ILIKE) or fuzzy (%) matches, served by the trigram indexes,
+        # ordered by similarity and paged by (rank, id) keyset
+        conditions = ["account.is_active = TRUE"]
+        rank_terms = []
+        args = []
+        for column, value in (("first_name", first_name), ("second_name", second_name)):
+            if value:
+                args.append(value)
+                args.append(f"%{escape_like(value)}%")
+                conditions.append(
+                    f"(account.{column} ILIKE ${len(args)} OR account.{column} % ${len(args) - 1})"
+                )
+                rank_terms.append(f"similarity(account.{column}, ${len(args) - 1})")
+
+        rank = " + ".join(rank_terms) if rank_terms else "0::real"
+
+        keyset = ""
+        offset = ""
+        if cursor:
+            values = decode_cursor(cursor)
+            if (
+                len(values) != 2
+                or isinstance(values[0], bool)
+                or not isinstance(values[0], (int, float))
+                or not isinstance(values[1], str)
+            ):
+                raise InvalidCursorError(cursor)
+            try:
+                last_id = uuid.UUID(values[1])
+            except ValueError as ex:
+                raise InvalidCursorError(cursor) from ex
+            args.extend([float(values[0]), last_id])
+            keyset = f"WHERE rank < ${len(args) - 1} OR (rank = ${len(args) - 1} AND id > ${len(args)}::uuid)"
+        elif page:
+            args.append(page * self._db_page_size)
+            offset = f"OFFSET ${len(args)}"
+
+        limit_str = ""
+        if limit is not None:
+            args.append(limit)
+            limit_str = f"LIMIT ${len(args)}"
+
+        return (
+            f"SELECT id, username, first_name, second_name, rank FROM (SELECT account.id, account.username, account.first_name, account.second_name, {rank} AS rank FROM account WHERE {" and ".join(conditions)}) AS matched {keyset} ORDER BY rank DESC, id {limit_str} {offset}",
+            args,
+        )
 
-                first_name = f"%{first_name}%"
+    async def search_users(
+        self,
+        page: int,
+        first_name: str,
+        second_name: str,
+        cursor: str | None = None,
+    ):
+        query, args = self._search_users_query(
+            first_name, second_name, cursor, page, self._db_page_size
+        )
+        rows = await self._fetch(query, *args)
+
+        next_cursor = None
+        if len(rows) == self._db_page_size:
+            next_cursor = encode_cursor([rows[-1]["rank"], str(rows[-1]["id"])])
+
+        return [BriefUserModel.from_record(row) for row in rows], next_cursor
+
+    async def stream_users(
+        self, first_name: str, second_name: str, cursor: str | None = None
+    ) -> AsyncIterator[BriefUserModel]:
+        # Every match from the cursor on, read by a server side cursor
+        query, args = self._search_users_query(first_name, second_name, cursor)
+        async for row in self._cursor(query, *args):
+            yield BriefUserModel.from_record(row)
+
+    async def suggest_usernames(self, prefix: str, limit: int) -> list[str]:
+        # Range on the text_pattern_ops index instead of LIKE, which can not use it in generic plans
+        upper_bound = prefix_upper_bound(prefix)
+        if upper_bound is None:
+            rows = await self._fetch(
+                "SELECT username FROM account WHERE is_active = TRUE and username ~>=~ $1 ORDER BY username USING ~<~ LIMIT $2",
+                prefix,
+                limit,
+            )
+        else:
+            rows = await self._fetch(
+                "SELECT username FROM account WHERE is_active = TRUE and username ~>=~ $1 and username ~<~ $2 ORDER BY username USING ~<~ LIMIT $3",
+                prefix,
+                upper_bound,
+                limit,
+            )
+        return [row["username"] for row in rows]
+
+    async def get_usernames_updated_since(self, updated_since: datetime):
+        return await self._fetch(
+            "SELECT id, username, is_active, updated_at FROM account WHERE updated_at >= $1 ORDER BY updated_at",
+            updated_since,
+        )
+
+    async def get_user_by_id(self, user_id: str):
+        if self._cache is not None:
+            is_cached, user = await self._cache.get_user_by_id(user_id)
+            if is_cached:
+                return user
+
+        # Concurrent misses of the same user share one database fetch
+        return await self._single_flight.do(
+            f"user:{user_id}", lambda: self._refill_user_by_id(user_id)
+        )
 
-                second_name = f"%{second_name}%"
+    async def get_users_by_ids(self, user_ids: list[str]) -> list[UserModel]:
+        # Found users in the order of user_ids, cache misses are read by one statement
+        users = {}
+        if self._cache is not None:
+            users = await self._cache.get_users_by_ids(user_ids)
 
-                rows = await conn.fetch(
-                    "SELECT account.id, account.username, account.first_name, account.second_name from account WHERE is_active = TRUE and (account.first_name LIKE $3 and account.second_name LIKE $4) LIMIT $1 OFFSET $2",
-                    self._db_page_size,
-                    page * self._db_page_size,
-                    first_name,
-                    second_name,
+        missing_ids = list(
+            dict.fromkeys(user_id for user_id in user_ids if user_id not in users)
+        )
+        if missing_ids:
+            started_at = time.perf_counter()
+            rows = await self._fetch(GET_USERS_BY_IDS_QUERY, missing_ids)
+            load_time = time.perf_counter() - started_at
+
+            fetched = [
+                user
+                for user in (UserModel.from_record(row) for row in rows)
+                if user is not None
+            ]
+            for user in fetched:
+                users[str(user.id)] = user
+
+            if self._cache is not None:
+                await self._cache.add_users_by_ids(
+                    fetched,
+                    [user_id for user_id in missing_ids if user_id not in users],
+                    load_time,
                 )
 
-                return [BriefUserModel.from_record(row) for row in rows]
+        return [users[user_id] for user_id in user_ids if users.get(user_id) is not None]
+
+    async def _refill_user_by_id(self, user_id: str):
+        if self._cache is None:
+            return await self._fetch_user_by_id(user_id)
+
+        is_locked = await self._cache.acquire_refill_lock(user_id)
+        if not is_locked:
+            is_cached, user = await self._cache.wait_for_user_by_id(user_id)
+            if is_cached:
+                return user
+
+        try:
+            started_at = time.perf_counter()
+            user = await self._fetch_user_by_id(user_id)
+            load_time = time.perf_counter() - started_at
+
+            if user is None:
+                await self._cache.add_missing_user_by_id(user_id, load_time)
+            else:
+                await self._cache.add_or_update_user(user, load_time)
+            return user
+        finally:
+            if is_locked:
+                await self._cache.release_refill_lock(user_id)
+
+    async def _fetch_user_by_id(self, user_id: str):
+        return UserModel.from_record(
+            await self._fetchrow(
+                GET_USER_BY_ID_QUERY,
+                user_id,
+            )
+        )
 
-    async def get_user_by_id(self, user_id: str):
+    async def get_user_by_username(self, username: str):
         if self._cache is not None:
-            cache_res = await self._cache.get_user_by_id(user_id)
-            if cache_res is not None:
-                return cache_res
-
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                user_record = await conn.fetchrow(
-                    "SELECT account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone FROM account WHERE id = $1 and is_active = TRUE",
+            is_cached, user = await self._cache.get_user_by_username(username)
+            if is_cached:
+                return user
+
+        return await self._single_flight.do(
+            f"username:{username}", lambda: self._refill_user_by_username(username)
+        )
+
+    async def _refill_user_by_username(self, username: str):
+        started_at = time.perf_counter()
+        user = await self._fetch_user_by_username(username)
+        load_time = time.perf_counter() - started_at
+
+        if self._cache is not None:
+            if user is None:
+                await self._cache.add_missing_user_by_username(username)
+            else:
+                await self._cache.add_or_update_user(user, load_time)
+        return user
+
+    async def _fetch_user_by_username(self, username: str):
+        return UserModel.from_record(
+            await self._fetchrow(
+                GET_USER_BY_USERNAME_QUERY,
+                username,
+            )
+        )
+
+    async def deactivate_user(self, user_id: str):
+        affected_columns = await self._execute(
+            "UPDATE company.public.account SET is_active = FALSE WHERE id = $1 and is_active = TRUE",
+            user_id,
+        )
+        if affected_rows(affected_columns) > 0:
+            if self._cache is not None:
+                await self._cache.add_missing_user_by_id(user_id)
+                await self._cache.invalidate_user(user_id)
+            return True
+        return False
+
+    async def reactivate_user(self, user_id: str):
+        username = await self._fetchval(
+            "UPDATE company.public.account SET is_active = TRUE WHERE id = $1 and is_active = FALSE RETURNING username",
+            user_id,
+        )
+        if username is not None:
+            if self._cache is not None:
+                # Drops not found entries cached while the user was deactivated
+                await self._cache.del_user(user_id, username)
+                await self._cache.invalidate_user(user_id, username)
+            return True
+        return False
+
+    async def update_user(self, user_id: str, user: UpdateUserModel | None):
+        if user is None:  # We dont update fields and can use simple get request
+            return await self.get_user_by_id(user_id)
+
+        async with self._transaction() as conn:
+            usr_dmp = user.model_dump(exclude_none=True)
+
+            groups = usr_dmp.pop("groups", None)
+
+            update_str = ",".join(
+                [
+                    f"{key} = ${ind + 2}"
+                    for ind, key in enumerate(usr_dmp.keys())
+                ]
+            )
+
+            if len(update_str):  # Update fields
+                updated_user = await conn.fetchrow(
+                    f"UPDATE company.public.account SET {update_str} WHERE id = $1 and is_active = TRUE RETURNING id, username, first_name, second_name, patronymic, email, phone",
                     user_id,
+                    *usr_dmp.values(),
                 )
-                groups_records = await self._get_user_groups_by_user_id(conn, user_id)
-                return UserModel.from_record(
-                    {
-                        **user_record,
-                        "groups": [
-                            dict(group_record) for group_record in groups_records
-                        ],
-                    }
+            else:  # Update only groups
+                updated_user = await conn.fetchrow(
+                    "SELECT account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone from company.public.account WHERE id = $1 and is_active = TRUE",
+                    user_id,
                 )
 
-    async def get_user_by_username(self, username: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                user_record = await conn.fetchrow(
-                    "SELECT account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone FROM account WHERE username = $1 and is_active = TRUE",
-                    username,
+            if updated_user is None:
+                return None
+
+            if groups is not None:  # We need update groups
+                groups_records = await self._set_user_groups(
+                    conn, user_id, [str(group["id"]) for group in groups]
                 )
-                groups_records = await self._get_user_groups_by_username(conn, username)
-                return UserModel.from_record(
-                    {
-                        **user_record,
-                        "groups": [
-                            dict(group_record) for group_record in groups_records
-                        ],
-                    }
+            else:  # We dont need update groups
+                groups_records = await self._get_user_groups_by_user_id(
+                    conn, user_id
                 )
 
-    async def deactivate_user(self, user_id: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                affected_columns = await conn.execute(
-                    "UPDATE company.public.account SET is_active = FALSE WHERE id = $1 and is_active = TRUE",
-                    user_id,
-                )
-                if bool(affected_columns.split(" ")[:-1]) is True:
-                    if self._cache is not None:
-                        await self._cache.del_user(user_id)
-                        return True
-                return False
+            updated_user_model = UserModel.from_record(
+                {
+                    **updated_user,
+                    "groups": [
+                        dict(group_record) for group_record in groups_records
+                    ],
+                }
+            )
+
+        # Cached and announced after the commit, so other replicas can not refill
+        # the old row and a rolled back update leaves nothing in the cache
+        if self._cache is not None:
+            await self._cache.add_or_update_user(updated_user_model)
+            await self._cache.invalidate_user(user_id, updated_user_model.username)
+        return updated_user_model
 
-    async def reactivate_user(self, user_id: str):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                affected_columns = await conn.execute(
-                    "UPDATE company.public.account SET is_active = TRUE WHERE id = $1 and is_active = FALSE",
-                    user_id,
+    async def create_user(self, user: CreateUserModel):
+        usr_dmp = user.model_dump(exclude_none=True)
+
+        groups_ids = usr_dmp.pop("groups_ids")
+
+        insert_keys = ",".join(usr_dmp.keys())
+
+        insert_values = ",".join(
+            [f"${ind + 1}" for ind in range(len(usr_dmp.keys()))]
+        )
+
+        if len(insert_keys) == 0 or len(insert_values) == 0:
+            raise ValueError(user)
+
+        async with self._transaction() as conn:
+            created_user = await conn.fetchrow(
+                f"INSERT INTO account ({insert_keys}) VALUES ({insert_values}) RETURNING account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone",
+                *usr_dmp.values(),
+            )
+
+            groups_records = await self._set_user_groups(
+                conn,
+                created_user["id"],
+                [str(group_id) for group_id in groups_ids],
+            )
+
+            created_user_model = UserModel.from_record(
+                {
+                    **created_user,
+                    "groups": [
+                        dict(group_record) for group_record in groups_records
+                    ],
+                }
+            )
+
+        if self._cache is not None:
+            await self._cache.add_or_update_user(created_user_model)
+            await self._cache.invalidate_user(
+                str(created_user_model.id), created_user_model.username
+            )
+        return created_user_model
+
+    async def import_users(
+        self, users: list[tuple[int, CreateUserModel]]
+    ) -> tuple[int, list[tuple[int, str]]]:
+        # Rows are copied into staging tables and merged by a few set-based statements,
+        # rows that can not be imported are reported by their number
+        account_records = []
+        account_group_records = []
+        for row, user in users:
+            account_records.append(
+                (
+                    row,
+                    uuid.uuid4(),
+                    user.username,
+                    user.password,
+                    user.first_name,
+                    user.second_name,
+                    user.patronymic,
+                    user.birth,
+                    None if user.email is None else str(user.email),
+                    user.phone,
                 )
-                if bool(affected_columns.split(" ")[:-1]) is not None:
-                    if self._cache is not None:
-                        await self._cache.add_user(
-                            await self.get_user_by_id(user_id)
-                        )
-                        return True
-                return False
+            )
+            account_group_records.extend(
+                (row, group_id) for group_id in set(user.groups_ids)
+            )
+
+        errors = []
+        async with self._transaction() as conn:
+            await conn.execute(
+                "CREATE TEMP TABLE import_account (import_row int primary key, id uuid not null, username text not null, password text not null, first_name text not null, second_name text not null, patronymic text, birth timestamptz, email text, phone text) ON COMMIT DROP"
+            )
+            await conn.execute(
+                "CREATE TEMP TABLE import_account_group (import_row int not null, group_id uuid not null) ON COMMIT DROP"
+            )
+            await conn.copy_records_to_table(
+                "import_account",
+                records=account_records,
+                columns=IMPORT_ACCOUNT_COLUMNS,
+            )
+            await conn.copy_records_to_table(
+                "import_account_group",
+                records=account_group_records,
+                columns=["import_row", "group_id"],
+            )
+
+            unknown_group_rows = await conn.fetch(
+                'DELETE FROM import_account WHERE import_row IN (SELECT import_account_group.import_row FROM import_account_group LEFT JOIN "group" ON "group".id = import_account_group.group_id WHERE "group".id IS NULL) RETURNING import_row'
+            )
+            errors.extend(
+                (record["import_row"], "Unknown group") for record in unknown_group_rows
+            )
+
+            # Existing usernames, including ones created concurrently, are skipped
+            imported_accounts = await conn.fetch(
+                "INSERT INTO account (id, username, password, first_name, second_name, patronymic, birth, email, phone) SELECT id, username, password, first_name, second_name, patronymic, birth, email, phone FROM import_account ORDER BY import_row ON CONFLICT (username) DO NOTHING RETURNING id, username"
+            )
+            existing_username_rows = await conn.fetch(
+                "SELECT import_account.import_row FROM import_account WHERE import_account.id <> ALL($1::uuid[])",
+                [record["id"] for record in imported_accounts],
+            )
+            errors.extend(
+                (record["import_row"], "User with specified username already exist")
+                for record in existing_username_rows
+            )
+
+            await conn.execute(
+                "INSERT INTO account_group (account_id, group_id) SELECT import_account.id, import_account_group.group_id FROM import_account_group JOIN import_account ON import_account.import_row = import_account_group.import_row WHERE import_account.id = ANY($1::uuid[])",
+                [record["id"] for record in imported_accounts],
+            )
 
-    async def update_user(self, user_id: str, user: UpdateUserModel | None):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                if user is not None:  # If we have fields for update
-                    usr_dmp = user.model_dump(exclude_none=True)
-
-                    groups = usr_dmp.pop("groups", None)
-
-                    update_str = ",".join(
-                        [
-                            f"{key} = ${ind + 2}"
-                            for ind, key in enumerate(usr_dmp.keys())
-                        ]
-                    )
-
-                    if len(update_str):  # Update fields
-                        updated_user = await conn.fetchrow(
-                            f"UPDATE company.public.account SET {update_str} WHERE id = $1 and is_active = TRUE RETURNING id, username, first_name, second_name, patronymic, email, phone",
-                            user_id,
-                            *usr_dmp.values(),
-                        )
-                    else:  # Update only groups
-                        updated_user = await conn.fetchrow(
-                            "SELECT account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone from company.public.account WHERE id = $1 and is_active = TRUE",
-                            user_id,
-                        )
-
-                    if updated_user is None:
-                        return None
-
-                    if groups is not None:  # We need update groups
-                        await conn.execute(
-                            "DELETE FROM account_group WHERE account_id = $1", user_id
-                        )
-                        group_records = []
-                        for group in groups:
-                            updated_account_group = await conn.fetchrow(
-                                f'INSERT INTO account_group (account_id, group_id) VALUES ($1, $2) RETURNING account_group.id, (SELECT "group".name from "group" WHERE "group".id = account_group.id) as name'
-                            )
-                            if updated_account_group is None:
-                                raise ValueError(user)
-                            else:
-                                group_records.append(updated_account_group)
-
-                        updated_user_model = UserModel.from_record(
-                            {
-                                **updated_user,
-                                "group": [
-                                    dict(group_record)
-                                    for group_record in groups_records
-                                ],
-                            }
-                        )
-                        if self._cache is not None:
-                            await self._cache.add_or_update_user(
-                                updated_user_model
-                            )
-                        return updated_user_model
-
-                    else:  # We dont need update groups
-                        groups_records = await self._get_user_groups_by_user_id(
-                            conn, user_id
-                        )
-                        updated_user_model = UserModel.from_record(
-                            {
-                                **updated_user,
-                                "groups": [
-                                    dict(group_record)
-                                    for group_record in groups_records
-                                ],
-                            }
-                        )
-                        if self._cache is not None:
-                            self._cache.add_or_update_user(updated_user_model)
-                        return updated_user_model
-
-                else:  # We dont update fields and can use simple get request
-
-                    user_model = await self.get_user_by_id(user_id)
-                    if self._cache is not None:
-                        self._cache.add_or_update_user(user_model)
-                    return user_model
+        if self._cache is not None:
+            await self._cache.del_usernames(
+                [record["username"] for record in imported_accounts]
+            )
 
-    async def create_user(self, user: CreateUserModel):
-        async with self._db_pool.acquire() as conn:
-            conn: asyncpg.Connection
-            async with conn.transaction():
-                usr_dmp = user.model_dump(exclude_none=True)
-
-                groups_ids = usr_dmp.pop("groups_ids")
-
-                insert_keys = ",".join(usr_dmp.keys())
-
-                insert_values = ",".join(range(1, len(usr_dmp.keys())))
-
-                if len(insert_keys) == 0 or len(insert_values) == 0:
-                    raise ValueError(user)
-                else:
-                    created_user = await conn.fetchrow(
-                        f"INSERT INTO account ({insert_keys}) VALUES ({insert_values}) RETURNING account.id, account.username, account.first_name, account.second_name, account.patronymic, account.email, account.phone",
-                        **usr_dmp.values(),
-                    )
-
-                    group_models = []
-                    for group_id in groups_ids:
-                        created_account_group = await conn.fetchrow(
-                            f'INSERT INTO account_group (account_id, group_id) VALUES ($1, $2) RETURNING account_group.id, (SELECT "group".name from "group" WHERE "group".id = account_group.id) as name',
-                            created_user.id,
-                            group_id,
-                        )
-                        if created_account_group is None:
-                            raise ValueError(user)
-                        else:
-                            group_models.append(
-                                GroupModel.from_record(created_account_group)
-                            )
-
-                    created_user_model = UserModel.from_record(created_user)
-                    created_user_model.groups = group_models
-                    if self._cache is not None:
-                        self._cache.add_or_update_user(created_user_model)
-                    return created_user_model
+        return len(imported_accounts), errors
@@ -0,0 +1,90 @@
+import asyncio
+import bisect
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import asyncpg
+
+from repositories.user_repository import UserRepository
+
+
+USERNAME_INDEX_SYNC_INTERVAL = float(os.environ.get("USERNAME_INDEX_SYNC_INTERVAL", "1"))
+# Transactions commit out of updated_at order, so every sync rereads this window
+USERNAME_INDEX_SYNC_OVERLAP = timedelta(
+    seconds=float(os.environ.get("USERNAME_INDEX_SYNC_OVERLAP", "10"))
+)
+USERNAME_INDEX_REBUILD_THRESHOLD = 1000
+
+
+class UsernameIndex:
+    # Sorted usernames of active accounts, kept in memory for prefix suggestions
+    def __init__(self, user_rep: UserRepository):
+        self._user_rep = user_rep
+        self._usernames: list[str] = []
+        self._usernames_by_id: dict[UUID, str] = {}
+        self._synced_until = datetime.fromtimestamp(0, timezone.utc)
+        self._sync_task: asyncio.Task | None = None
+
+    async def connect(self):
+        await self.sync()
+        self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def disconnect(self):
+        self._sync_task.cancel()
+        try:
+            await self._sync_task
+        except asyncio.CancelledError:
+            pass
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    def _remove(self, username: str):
+        position = bisect.bisect_left(self._usernames, username)
+        if position < len(self._usernames) and self._usernames[position] == username:
+            del self._usernames[position]
+
+    async def sync(self):
+        rows = await self._user_rep.get_usernames_updated_since(
+            self._synced_until - USERNAME_INDEX_SYNC_OVERLAP
+        )
+        # Sorting everything is cheaper than many single inserts into a large list
+        rebuild = len(rows) > USERNAME_INDEX_REBUILD_THRESHOLD
+
+        for row in rows:
+            old_username = self._usernames_by_id.pop(row["id"], None)
+            if old_username is not None and not rebuild:
+                self._remove(old_username)
+
+            if row["is_active"]:
+                self._usernames_by_id[row["id"]] = row["username"]
+                if not rebuild:
+                    bisect.insort(self._usernames, row["username"])
+
+            self._synced_until = max(self._synced_until, row["updated_at"])
+
+        if rebuild:
+            self._usernames = sorted(self._usernames_by_id.values())
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(USERNAME_INDEX_SYNC_INTERVAL)
+            try:
+                await self.sync()
+            except (asyncpg.PostgresError, OSError) as ex:
+                print(f"Can not sync username index : {ex}")
+
+    def suggest(self, prefix: str, limit: int) -> list[str]:
+        # Python compares strings by code points, the same order as ~<~ in UTF-8 databases
+        position = bisect.bisect_left(self._usernames, prefix)
+        suggestions = []
+        for username in self._usernames[position : position + limit]:
+            if not username.startswith(prefix):
+                break
+            suggestions.append(username)
+        return suggestions
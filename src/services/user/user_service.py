@@ -1,9 +1,12 @@
 import asyncio
 import os
+import uuid
 import grpc
 from grpc import ServicerContext
 
 from repositories.user_repository import UserRepository
+from repositories.username_index import UsernameIndex
+from common.db.postgres_pool import PostgresPool
 
 from grpc_build.user_service_pb2_grpc import (
     UserServiceServicer,
@@ -15,6 +18,9 @@ from grpc_build.user_service_pb2 import (
     CreateUserResponse,
     GetUserDataRequest,
     GetUserDataResponse,
+    BatchGetUsersRequest,
+    BatchGetUsersResponse,
+    UserArray,
     UpdateUserDataRequest,
     UpdateUserDataResponse,
     ReactivateUserRequest,
@@ -26,20 +32,44 @@ from grpc_build.user_service_pb2 import (
     SearchUsersRequest,
     SearchUsersResponse,
     BriefUserArray,
+    SuggestUsernamesRequest,
+    SuggestUsernamesResponse,
+    UsernameArray,
+    ImportUsersRequest,
+    ImportUsersResponse,
+    ImportUsersResult,
+    ImportUserError,
 )
 from models.user_models import UpdateUserModel, UserModel, CreateUserModel
 
-from passlib.context import CryptContext
-
 from models.group_models import GroupModel
 from clients.redis.user_cache import UserCache
+from common.crypto.password_hasher import PasswordHasher, PasswordHasherOverloadedError
+from common.pagination.cursor import InvalidCursorError
+from common.pagination.stream import batched
+
+
+# Serves suggestions from memory instead of the database, costs memory for every username
+USERNAME_INDEX = os.environ.get("USERNAME_INDEX", "false") == "true"
+
+SUGGEST_USERNAMES_DEFAULT_LIMIT = 10
+SUGGEST_USERNAMES_MAX_LIMIT = 50
+
+USER_IMPORT_MAX_ROWS = int(os.environ.get("USER_IMPORT_MAX_ROWS", "200000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BATCH_GET_MAX_IDS = int(os.environ.get("BATCH_GET_MAX_IDS", "100"))
 
 
 class UserService(UserServiceServicer):
-    def __init__(self, user_rep: UserRepository):
+    def __init__(
+        self,
+        user_rep: UserRepository,
+        password_hasher: PasswordHasher,
+        username_index: UsernameIndex | None = None,
+    ):
         self._user_rep = user_rep
+        self._password_hasher = password_hasher
+        self._username_index = username_index
 
     async def GetUserData(
         self, request: GetUserDataRequest, context: ServicerContext
@@ -59,6 +89,31 @@ class UserService(UserServiceServicer):
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
+    async def BatchGetUsers(
+        self, request: BatchGetUsersRequest, context: ServicerContext
+    ) -> BatchGetUsersResponse:
+        if len(request.user_ids) > BATCH_GET_MAX_IDS:
+            return BatchGetUsersResponse(
+                code=413, message=f"Batch get is limited to {BATCH_GET_MAX_IDS} ids"
+            )
+
+        try:
+            # Canonical form, so cache keys and returned ids match the requested ones
+            user_ids = [str(uuid.UUID(user_id)) for user_id in request.user_ids]
+        except ValueError:
+            return BatchGetUsersResponse(code=400, message="Invalid user id")
+
+        try:
+            users = await self._user_rep.get_users_by_ids(user_ids)
+
+            return BatchGetUsersResponse(
+                code=200, users=UserArray(arr=[user.to_UserData() for user in users])
+            )
+        except Exception as ex:
+            return BatchGetUsersResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
     async def SearchUsers(
         self, request: SearchUsersRequest, context: ServicerContext
     ) -> SearchUsersResponse:
@@ -72,19 +127,85 @@ class UserService(UserServiceServicer):
         if request.HasField("second_name"):
             second_name = request.second_name
 
+        cursor = None
+        if request.HasField("cursor"):
+            cursor = request.cursor
+
         try:
-            users = await self._user_rep.search_users(page, first_name, second_name)
+            users, next_cursor = await self._user_rep.search_users(
+                page, first_name, second_name, cursor
+            )
 
             return SearchUsersResponse(
                 code=200,
                 users=BriefUserArray(arr=[user.to_BriefUserData() for user in users]),
+                next_cursor=next_cursor,
             )
 
+        except InvalidCursorError:
+            return SearchUsersResponse(code=400, message="Invalid cursor")
         except Exception as ex:
             return SearchUsersResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
+    async def StreamUsers(
+        self, request: SearchUsersRequest, context: ServicerContext
+    ):
+        first_name = ""
+        if request.HasField("first_name"):
+            first_name = request.first_name
+
+        second_name = ""
+        if request.HasField("second_name"):
+            second_name = request.second_name
+
+        cursor = None
+        if request.HasField("cursor"):
+            cursor = request.cursor
+
+        try:
+            async for users in batched(
+                self._user_rep.stream_users(first_name, second_name, cursor)
+            ):
+                yield SearchUsersResponse(
+                    code=200,
+                    users=BriefUserArray(arr=[user.to_BriefUserData() for user in users]),
+                )
+
+        except InvalidCursorError:
+            yield SearchUsersResponse(code=400, message="Invalid cursor")
+        except Exception as ex:
+            yield SearchUsersResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
+    async def SuggestUsernames(
+        self, request: SuggestUsernamesRequest, context: ServicerContext
+    ) -> SuggestUsernamesResponse:
+        limit = request.limit or SUGGEST_USERNAMES_DEFAULT_LIMIT
+        if limit < 0 or limit > SUGGEST_USERNAMES_MAX_LIMIT:
+            return SuggestUsernamesResponse(
+                code=400,
+                message=f"Limit must be between 1 and {SUGGEST_USERNAMES_MAX_LIMIT}",
+            )
+
+        try:
+            if self._username_index is not None:
+                usernames = self._username_index.suggest(request.prefix, limit)
+            else:
+                usernames = await self._user_rep.suggest_usernames(
+                    request.prefix, limit
+                )
+
+            return SuggestUsernamesResponse(
+                code=200, usernames=UsernameArray(arr=usernames)
+            )
+        except Exception as ex:
+            return SuggestUsernamesResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
     async def GetUserDataByUsername(
         self, request: GetUserDataByUsernameRequest, context: ServicerContext
     ) -> GetUserDataByUsernameResponse:
@@ -93,13 +214,15 @@ class UserService(UserServiceServicer):
             user = await self._user_rep.get_user_by_username(username)
 
             if user:
-                return GetUserDataResponse(code=200, user_data=user.to_UserData())
+                return GetUserDataByUsernameResponse(
+                    code=200, user_data=user.to_UserData()
+                )
             else:
-                return GetUserDataResponse(
+                return GetUserDataByUsernameResponse(
                     code=404, message="User not found or deactivated"
                 )
         except Exception as ex:
-            return GetUserDataResponse(
+            return GetUserDataByUsernameResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
@@ -108,10 +231,10 @@ class UserService(UserServiceServicer):
     ) -> CreateUserResponse:
         creating_user_data = request.creating_user_data
 
-        if len(creating_user_data.groups.arr) == 0:
+        if len(creating_user_data.groups_ids) == 0:
             return CreateUserResponse(code=400, message="Missing user group list")
         try:
-            exist_user = self._user_rep.get_user_by_username(
+            exist_user = await self._user_rep.get_user_by_username(
                 creating_user_data.username
             )
             if exist_user is not None:
@@ -123,8 +246,12 @@ class UserService(UserServiceServicer):
                 creating_user_model = CreateUserModel.from_grpc_message(
                     creating_user_data
                 )
+                if creating_user_model is None:
+                    return CreateUserResponse(
+                        code=400, message="Received user data is incorrect"
+                    )
 
-                creating_user_model.password = pwd_context.hash(
+                creating_user_model.password = await self._password_hasher.hash(
                     creating_user_model.password
                 )
 
@@ -138,11 +265,64 @@ class UserService(UserServiceServicer):
                     )
                 else:
                     return CreateUserResponse(code=400, message="Can not create user")
+        except PasswordHasherOverloadedError:
+            return CreateUserResponse(code=503, message="Service overloaded, try later")
         except Exception as ex:
             return CreateUserResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
             )
 
+    async def ImportUsers(
+        self, request_iterator, context: ServicerContext
+    ) -> ImportUsersResponse:
+        errors = []
+        users = []
+        usernames = set()
+        try:
+            async for request in request_iterator:
+                request: ImportUsersRequest
+                for import_row in request.rows:
+                    if len(users) + len(errors) >= USER_IMPORT_MAX_ROWS:
+                        return ImportUsersResponse(
+                            code=413,
+                            message=f"Import is limited to {USER_IMPORT_MAX_ROWS} rows",
+                        )
+
+                    user = CreateUserModel.from_grpc_message(import_row.user_data)
+                    if user is None:
+                        errors.append((import_row.row, "Received user data is incorrect"))
+                    elif len(user.groups_ids) == 0:
+                        errors.append((import_row.row, "Missing user group list"))
+                    elif user.username in usernames:
+                        errors.append((import_row.row, "Duplicate username in import"))
+                    else:
+                        usernames.add(user.username)
+                        users.append((import_row.row, user))
+
+            hashed_passwords = await self._password_hasher.hash_many(
+                [user.password for _, user in users]
+            )
+            for (_, user), hashed_password in zip(users, hashed_passwords):
+                user.password = hashed_password
+
+            imported, import_errors = await self._user_rep.import_users(users)
+            errors.extend(import_errors)
+
+            return ImportUsersResponse(
+                code=200,
+                result=ImportUsersResult(
+                    imported=imported,
+                    errors=[
+                        ImportUserError(row=row, message=message)
+                        for row, message in sorted(errors)
+                    ],
+                ),
+            )
+        except Exception as ex:
+            return ImportUsersResponse(
+                code=500, message=f"Error : {ex}, args : {ex.args}"
+            )
+
     async def UpdateUserData(
         self, request: UpdateUserDataRequest, context: ServicerContext
     ) -> UpdateUserDataResponse:
@@ -152,7 +332,7 @@ class UserService(UserServiceServicer):
             updating_user_model = UpdateUserModel.from_grpc_message(updating_user_data)
             if updating_user_model is not None:
                 if updating_user_model.password is not None:
-                    updating_user_model.password = pwd_context.hash(
+                    updating_user_model.password = await self._password_hasher.hash(
                         updating_user_model.password
                     )
 
@@ -169,6 +349,10 @@ class UserService(UserServiceServicer):
                     code=400,
                     message="Failed to update user. Not found user or received data is incorrect.",
                 )
+        except PasswordHasherOverloadedError:
+            return UpdateUserDataResponse(
+                code=503, message="Service overloaded, try later"
+            )
         except Exception as ex:
             return UpdateUserDataResponse(
                 code=500, message=f"Error : {ex}, args : {ex.args}"
@@ -195,7 +379,7 @@ class UserService(UserServiceServicer):
     ) -> DeactivateUserResponse:
         user_id = request.user_id
         try:
-            if await self._user_rep.reactivate_user(user_id):
+            if await self._user_rep.deactivate_user(user_id):
                 return DeactivateUserResponse(code=200)
             else:
                 return DeactivateUserResponse(
@@ -211,10 +395,17 @@ async def serve():
 
     server = grpc.aio.server()
 
-    async with UserCache() as user_cache, UserRepository(
-        cache_class=user_cache
-    ) as user_rep:
-        add_UserServiceServicer_to_server(UserService(user_rep), server)
+    async with PostgresPool() as db_pool, UserCache() as user_cache, UserRepository(
+        db_pool, cache_class=user_cache
+    ) as user_rep, PasswordHasher() as password_hasher:
+        username_index = None
+        if USERNAME_INDEX:
+            username_index = UsernameIndex(user_rep)
+            await username_index.connect()
+
+        add_UserServiceServicer_to_server(
+            UserService(user_rep, password_hasher, username_index), server
+        )
         server.add_insecure_port(f"[::]:{os.environ.get("USER_SERVICE_PORT", 50052)}")
         print(
             f"Async gRPC Server started at port {os.environ.get("USER_SERVICE_PORT", 50052)}"
@@ -224,6 +415,9 @@ async def serve():
             await server.wait_for_termination()
         except asyncio.CancelledError:
             pass
+        finally:
+            if username_index is not None:
+                await username_index.disconnect()
 
 
 if __name__ == "__main__":